@@ -0,0 +1,5 @@
+#!/usr/bin/env sh
+
+# Runs the performance benchmarks in src/benchmarks.py
+# Pass benchmark names to run only some of them, e.g. ./bench.sh block_parser
+python3 src/benchmarks.py "$@"
@@ -1,4 +1,7 @@
 #!/bin/bash
 # Replace YOUR_GITHUB_REPO_NAME with the actual name of your repository (e.g., if your repo URL is github.com/jdoe/mysite, the name is mysite).
 # Replace 'BuildaStaticWebsiteGenerator' with your specific repo name
+# Compiled modules are kept with the build caches, so a restored .cache/
+# skips compiling them too
+export PYTHONPYCACHEPREFIX="${PYTHONPYCACHEPREFIX:-.cache/pycache}"
 python3 src/main.py "/BuildingaStaticSiteGenerator/"
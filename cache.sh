@@ -0,0 +1,5 @@
+#!/usr/bin/env sh
+
+# Manages the build's parse cache (see src/parse_cache.py)
+# e.g. ./cache.sh prune, or ./cache.sh prune --max-size 64
+python3 src/parse_cache.py "$@"
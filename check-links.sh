@@ -0,0 +1,6 @@
+#!/usr/bin/env sh
+
+# Checks the external links of content/ (see src/link_checker.py);
+# results are cached in .cache/links.json for --ttl hours
+# e.g. ./check-links.sh, or ./check-links.sh --ttl 0 --rate 1
+python3 src/link_checker.py "$@"
@@ -0,0 +1,5 @@
+#!/usr/bin/env sh
+
+# Keeps the site warm and renders pages on request (see src/daemon.py)
+# e.g. ./daemon.sh --socket /tmp/site.sock, or ./daemon.sh --port 8765
+python3 src/daemon.py "$@"
@@ -1,3 +1,6 @@
 #!/usr/bin/env sh
+# Compiled modules are kept with the build caches, so a restored .cache/
+# skips compiling them too
+export PYTHONPYCACHEPREFIX="${PYTHONPYCACHEPREFIX:-.cache/pycache}"
 python3 src/main.py
 cd public && python3 -m http.server 8888
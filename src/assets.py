@@ -0,0 +1,89 @@
+import json
+import os
+from typing import Dict, Iterable, Optional
+
+from events import EventLog
+from filesystem import DISK, FileSystem, copy_file
+from images import file_hash
+
+# Assets that are referenced by a fixed name from the template and
+# therefore need a content hash in their url to be cached for long
+FINGERPRINT_EXTENSIONS = (".css", ".js")
+
+MANIFEST_NAME = "asset-manifest.json"
+
+
+def fingerprinted_name(rel_path: str, digest: str) -> str:
+    # index.css -> index.1a2b3c4d5e.css
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest[:10]}{ext}"
+
+
+def fingerprint_assets(
+        static_dir: str,
+        dest_dir: str,
+        cache_dir: Optional[str] = None,
+        extensions: Iterable[str] = FINGERPRINT_EXTENSIONS,
+        fs: FileSystem = DISK,
+        out: FileSystem = DISK,
+        events: Optional[EventLog] = None
+) -> Dict[str, str]:
+    """
+    Writes a content-hashed copy of every fingerprintable static file into
+    dest_dir and returns the manifest {"/index.css": "/index.<hash>.css"}.
+    The manifest is also written to dest_dir/asset-manifest.json.
+
+    Each asset is hashed at most once per build. The incremental manifest in
+    cache_dir remembers size, mtime and hash, so unchanged files are not
+    even read again.
+
+    Assets are read from fs; the copies, manifest and cache go to out.
+    """
+    extensions = tuple(extensions)
+    previous: Dict[str, dict] = {}
+    state_file = None
+    if cache_dir is not None:
+        state_file = os.path.join(cache_dir, "assets.json")
+        if out.exists(state_file):
+            with out.open(state_file) as f:
+                previous = json.load(f)
+
+    state: Dict[str, dict] = {}
+    manifest: Dict[str, str] = {}
+    cache_hits = 0
+    for root, _dirs, files in fs.walk(static_dir):
+        for filename in files:
+            if not filename.endswith(extensions):
+                continue
+            source_path = os.path.join(root, filename)
+            rel_path = os.path.relpath(source_path, static_dir).replace(os.sep, "/")
+            stat = fs.stat(source_path)
+
+            entry = previous.get(rel_path)
+            if entry is None or entry["size"] != stat.size or entry["mtime_ns"] != stat.mtime_ns:
+                entry = {"size": stat.size, "mtime_ns": stat.mtime_ns, "hash": file_hash(source_path, fs)}
+            else:
+                cache_hits += 1
+            state[rel_path] = entry
+
+            hashed_path = fingerprinted_name(rel_path, entry["hash"])
+            dest_path = os.path.join(dest_dir, hashed_path)
+            out.makedirs(os.path.dirname(dest_path))
+            copy_file(fs, source_path, out, dest_path)
+            manifest["/" + rel_path] = "/" + hashed_path
+
+    out.makedirs(dest_dir)
+    with out.open(os.path.join(dest_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if state_file is not None:
+        out.makedirs(cache_dir)
+        with out.open(state_file, "w") as f:
+            json.dump(state, f)
+
+    if events is not None:
+        misses = len(manifest) - cache_hits
+        events.emit("assets", assets=len(manifest), cache_hits=cache_hits, cache_misses=misses)
+        events.metrics.inc("cache_hits_total", cache_hits, help="Build cache hits.", cache="assets")
+        events.metrics.inc("cache_misses_total", misses, help="Build cache misses.", cache="assets")
+    return manifest
+
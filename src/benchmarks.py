@@ -0,0 +1,299 @@
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from markdown_blocks import markdown_to_html_node
+
+
+def best_of(func: Callable[[], object], repeat: int = 3) -> float:
+    """
+    Runs func a few times and returns the fastest wall-clock time in seconds.
+    The minimum is the least noisy estimate on a busy machine.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def nested_list_markdown(depth: int, items_per_level: int = 2) -> str:
+    """
+    A list nested `depth` levels deep, with a few siblings on every level.
+    """
+    lines = []
+    for level in range(depth):
+        indent = "  " * level
+        for i in range(items_per_level):
+            lines.append(f"{indent}- item {level}.{i} with **bold** text")
+    return "\n".join(lines)
+
+
+def flat_markdown(sections: int) -> str:
+    """
+    A long document made of headings, paragraphs, quotes and lists.
+    """
+    parts = []
+    for i in range(sections):
+        parts.append(f"## Section {i}")
+        parts.append(f"Paragraph {i} with _italic_ and `code`\nspanning two lines.")
+        parts.append(f"> quoted {i}")
+        parts.append(f"- one\n- two\n  - nested {i}\n\n  continued")
+    return "\n\n".join(parts)
+
+
+def bench_block_parser() -> None:
+    """
+    Parse time per input character should stay flat as documents
+    grow longer and as lists nest deeper; a growing ratio means
+    something went quadratic.
+    """
+    print("block parser: flat documents")
+    base = None
+    for sections in (500, 1000, 2000, 4000):
+        markdown = flat_markdown(sections)
+        seconds = best_of(lambda: markdown_to_html_node(markdown))
+        per_char = seconds / len(markdown)
+        base = base or per_char
+        print(f"  {sections:>6} sections {len(markdown):>9} chars "
+              f"{seconds * 1000:8.1f} ms  x{per_char / base:.2f} per char")
+
+    print("block parser: nested lists")
+    base = None
+    for depth in (50, 100, 200, 400):
+        markdown = nested_list_markdown(depth)
+        seconds = best_of(lambda: markdown_to_html_node(markdown))
+        per_char = seconds / len(markdown)
+        base = base or per_char
+        print(f"  depth {depth:>5} {len(markdown):>9} chars "
+              f"{seconds * 1000:8.1f} ms  x{per_char / base:.2f} per char")
+
+
+def api_reference_markdown(size: int) -> str:
+    """
+    About `size` bytes of generated API reference: a heading, a paragraph,
+    a signature in a code block and a parameter list per function.
+    """
+    parts = ["# API Reference"]
+    length = 0
+    i = 0
+    while length < size:
+        part = (
+            f"## module.compute{i}\n\n"
+            f"Returns the **result** of step {i}, see `compute{i + 1}` and [the guide](/guide/{i}).\n\n"
+            f"```python\ndef compute{i}(value: int, *, strict: bool = False) -> int:\n    ...\n```\n\n"
+            f"- `value`: the input\n- `strict`: fail on _bad_ input\n"
+        )
+        parts.append(part)
+        length += len(part) + 2
+        i += 1
+    return "\n\n".join(parts)
+
+
+def _ingest_child(mode: str, path: str) -> None:
+    # Runs in a fresh process, so its peak RSS belongs to this page alone
+    import resource
+    import mapped_markdown
+    from generate_page import generate_page
+
+    mapped_markdown.MMAP_THRESHOLD = 0 if mode == "mmap" else float("inf")
+    dest = path + f".{mode}.html"
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    generate_page(path, "", dest, "/", template_content="<title>{{ Title }}</title>{{ Content }}")
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": seconds, "rss_kb": peak - before}))
+
+
+def bench_ingest() -> None:
+    """
+    One big page, read into a string vs memory-mapped and decoded line
+    by line. Every run is a fresh process; RSS is the growth of its peak
+    while generating the page (Linux reports it in KiB).
+    """
+    print("ingest: multi-megabyte pages, read vs mmap")
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        for megabytes in (4, 16):
+            path = os.path.join(tmp, f"api-{megabytes}.md")
+            with open(path, "w") as f:
+                f.write(api_reference_markdown(megabytes << 20))
+            for mode in ("read", "mmap"):
+                output = subprocess.run(
+                    [sys.executable, "-c", f"import benchmarks; benchmarks._ingest_child({mode!r}, {path!r})"],
+                    cwd=here, check=True, capture_output=True, text=True,
+                ).stdout
+                run = json.loads(output)
+                print(f"  {megabytes:>4} MB {mode:>5} {run['seconds'] * 1000:9.1f} ms "
+                      f"{megabytes / run['seconds']:6.2f} MB/s  peak RSS +{run['rss_kb'] / 1024:7.1f} MB")
+
+
+def multilingual_site(pages: int, languages: List[str], translated: float) -> Dict[str, str]:
+    """
+    A site of `pages` API reference pages in languages[0], and a share of
+    them translated into every other language: the prose is, the code
+    samples and parameter lists are not (as with real translations).
+    """
+    files = {"template.html": '<html lang="{{ Lang }}"><head>{{ Alternates }}</head>{{ Content }}</html>'}
+    every = max(1, round(1 / translated)) if translated else pages + 1
+    for i in range(pages):
+        markdown = api_reference_markdown(8 << 10).replace("# API Reference", f"# Page {i}")
+        files[f"content/docs/page{i}.md"] = markdown
+        if i % every == 0:
+            for lang in languages[1:]:
+                files[f"content/{lang}/docs/page{i}.md"] = markdown.replace("Returns the", f"[{lang}] Returns the")
+    return files
+
+
+def bench_locales() -> None:
+    """
+    A site in one language against the same site in five, with a fifth of
+    the pages translated: parsing is shared between the languages, so the
+    five-language build should cost well under five single ones.
+    """
+    from builder import BuildConfig, build
+    from filesystem import MemoryFileSystem
+
+    print("locales: 200 pages, one language vs five (20% translated)")
+    languages = ["en", "fr", "de", "es", "ja"]
+    single = MemoryFileSystem(multilingual_site(200, languages[:1], 0))
+    multi = MemoryFileSystem(multilingual_site(200, languages, 0.2))
+    one = best_of(lambda: build(BuildConfig(fs=single, cache_dir=None, search=False)))
+    five = best_of(lambda: build(BuildConfig(fs=multi, cache_dir=None, search=False, languages=languages)))
+    print(f"  1 language  {one * 1000:8.1f} ms")
+    print(f"  5 languages {five * 1000:8.1f} ms  x{five / one:.2f}")
+
+
+def article_markdown(sections: int) -> str:
+    """
+    Article prose: sentences with quotes, apostrophes, dashes and an
+    ellipsis here and there, and some emphasis, code and links.
+    """
+    parts = []
+    for i in range(sections):
+        parts.append(f"## Part {i}: what \"fast\" means")
+        parts.append(
+            "The build reads every page once and writes it out again, so the time it takes grows with the "
+            "size of the site. It's the parser that does most of the work -- splitting each block into "
+            "**bold**, _italic_ and `code` spans -- and a long page should take no longer than the same "
+            f"text split into many pages. As [the guide](/guide/{i}) says, \"measure first\"... then "
+            "change one thing at a time."
+        )
+        parts.append("> Don't trust a benchmark you haven't run on a quiet machine.")
+        parts.append("- Pages are parsed once per build\n- Unchanged pages come from the cache\n"
+                     "- Output is written only when it changed")
+    return "\n\n".join(parts)
+
+
+def bench_typography() -> None:
+    """
+    The typography extension against the inline parsing it follows: the
+    time the parser spends on a page's inline Markdown (text_to_children:
+    splitting the text into spans and rendering them), and the time
+    smarten spends on the same page's prose spans in one batch. It should
+    stay under 10%, bar prose with punctuation for smarten in every
+    sentence (the article). Parse times of the whole page, without and
+    with the extension, are for scale.
+    """
+    from extensions import EXTENSIONS, parser_with_extensions, smarten
+    from inline_markdown import text_to_textnodes
+
+    print("typography: smart punctuation vs inline parsing")
+    plain = parser_with_extensions(list(EXTENSIONS))
+    smart = parser_with_extensions(list(EXTENSIONS) + ["typography"])
+    pages = {
+        "flat": flat_markdown(1000),
+        "api reference": api_reference_markdown(256 << 10),
+        "article": article_markdown(500),
+    }
+    for name, markdown in pages.items():
+        # Every text the block parser hands to the inline parser, and the
+        # batch of prose spans the text transforms get
+        texts: List[str] = []
+        batches: List[Tuple[List[str], List[str]]] = []
+        recorder = parser_with_extensions(list(EXTENSIONS))
+        recorder.text_to_textnodes = lambda text: texts.append(text) or text_to_textnodes(text, recorder.inline_steps)
+        recorder.add_text_transform(lambda spans, joins: batches.append((spans, list(joins))) or spans)
+        recorder.parse(markdown)
+        spans, joins = batches[0]
+
+        # Taking turns, without the garbage collector, which would land
+        # in one or the other
+        times = {"inline": float("inf"), "typography": float("inf"), "before": float("inf"), "after": float("inf")}
+        runs = {
+            "inline": lambda: [plain.text_to_children(text) for text in texts],
+            "typography": lambda: smarten(spans, joins),
+            "before": lambda: plain.parse(markdown),
+            "after": lambda: smart.parse(markdown),
+        }
+        gc.disable()
+        try:
+            for _ in range(15):
+                for key, run in runs.items():
+                    start = time.perf_counter()
+                    run()
+                    times[key] = min(times[key], time.perf_counter() - start)
+        finally:
+            gc.enable()
+        inline, typography, before, after = times["inline"], times["typography"], times["before"], times["after"]
+        print(f"  {name:>14} {len(spans):>6} spans  inline {inline * 1000:6.1f} ms  "
+              f"typography {typography * 1000:5.1f} ms ({typography / inline:5.1%})  "
+              f"parse {before * 1000:6.1f} -> {after * 1000:6.1f} ms")
+
+
+def bench_drafts() -> None:
+    """
+    A site where a third of the pages are drafts or scheduled, built with
+    them (a preview) and without: leaving them out should save nearly a
+    third of the build (fixed costs are the rest), and finding them (reading every page's front
+    matter) should cost next to nothing.
+    """
+    from builder import BuildConfig, build
+    from filesystem import MemoryFileSystem
+    from generate_page import collect_pages
+    from publishing import filter_publishable
+
+    print("drafts: 300 pages, a third drafts or scheduled")
+    files = {"template.html": "{{ Content }}"}
+    # Two in six skipped; published pages with and without front matter
+    headers = ["---\ndraft: true\n---\n", "---\ndate: 2999-01-01\n---\n", "---\ndate: 2020-01-01\n---\n", "", "", ""]
+    for i in range(300):
+        header = headers[i % len(headers)]
+        files[f"content/blog/post{i}.md"] = header + f"# Post {i}\n\n" + flat_markdown(40)
+    fs = MemoryFileSystem(files)
+    preview = best_of(lambda: build(BuildConfig(fs=fs, cache_dir=None, search=False, drafts=True, future=True)))
+    published = best_of(lambda: build(BuildConfig(fs=fs, cache_dir=None, search=False)))
+    pages = collect_pages("content", "docs", fs)
+    scan = best_of(lambda: filter_publishable(pages, fs))
+    print(f"  with drafts    {preview * 1000:8.1f} ms")
+    print(f"  without        {published * 1000:8.1f} ms  x{published / preview:.2f}")
+    print(f"  header scan    {scan * 1000:8.1f} ms  ({scan / published:.1%} of the build)")
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "block_parser": bench_block_parser,
+    "ingest": bench_ingest,
+    "locales": bench_locales,
+    "typography": bench_typography,
+    "drafts": bench_drafts,
+}
+
+
+def main() -> None:
+    # Run every benchmark, or only the ones named on the command line
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise Exception(f"Unknown benchmark: {name}")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,525 @@
+import copy
+import datetime
+import functools
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from assets import fingerprint_assets
+from events import EventLog, Metrics
+from extensions import EXTENSIONS, parser_with_extensions
+from filesystem import DISK, DiskFileSystem, FileSystem, copy_tree
+from generate_page import collect_pages, generate_pages, PageError, PageIndex, PageResult
+from generations import Generations
+from images import build_image_index, ImageInfo, ImagesExtension
+from layouts import Layouts
+from locales import Locales
+from markdown_blocks import MarkdownParser
+from page_diff import PageChanges
+from parse_cache import DEFAULT_MAX_BYTES, ParseCache, ParseMemo, parser_version
+from publishing import filter_publishable, SkippedPage
+from routes import redirect_page, route_pages, RouteTable
+from search_index import page_url, SearchIndex
+from sharding import select_shard, Shard, shard_name, write_shard_manifest
+
+
+class BuildConfig:
+    """
+    Everything a build needs to know. The defaults match the command line:
+    content/ + static/ + template.html on disk, built into docs/.
+
+    fs is where sources are read from, out is where the site and caches
+    are written; either can be a MemoryFileSystem. Progress goes to the
+    events log (quiet unless it was given a stream).
+
+    Pages use template_path unless their front matter (`layout: blog`) or
+    their directory selects a layout from layouts_dir; see Layouts.
+
+    With keep_going, a page that fails does not stop the build: every
+    failure is collected in result.errors and the failed pages keep their
+    output from the previous build. jobs > 1 also renders pages in that
+    many worker processes.
+
+    With atomic ("symlink" or "rename"), the site is built into a new
+    generation next to dest_dir and switched in only once it is complete,
+    seeded with hardlinks to unchanged files of the live one; the last
+    keep_generations generations are kept for rollback. Needs out on disk.
+
+    With shard=(i, N), only the pages that hash to shard i of N are built
+    (plus every static file), with a partial manifest for merge_shards.
+
+    Parsed pages are kept in cache_dir between builds, so unchanged pages
+    are not parsed again; parse_cache_size caps that cache in bytes
+    (None turns it off).
+
+    The hash of every page's output is kept there too, and with changes
+    (a path, written to out) the build reports which urls changed, were
+    added or were removed since the last build; diff_blocks adds which of
+    a changed page's blocks changed (see PageChanges).
+
+    With languages (e.g. ["en", "fr"], the first is the default) the site
+    is built once per language from content/<lang>/ and *.<lang>.md
+    sources, into dest_dir/<lang>/ (the default language into dest_dir),
+    each language with its own search index. Untranslated pages fall back
+    to the default language; pages with the same Markdown in several
+    languages are parsed once. See Locales.
+
+    Pages with `draft: true` in their front matter, or a `date:` after
+    now (default: the time of the build), are left out, found from their
+    front matter alone before any page is parsed, and listed in
+    result.skipped. drafts (or future) builds them too, e.g. for previews.
+
+    Pages are routed once per build (see route_pages): blog/post.md is
+    served at /blog/post.html, or at /blog/post/ with pretty_urls, a
+    `slug:` in its front matter renames it, and `aliases:` (old urls,
+    comma-separated) get redirect stubs. Every root-relative link of a
+    page and its template is resolved through the route table while the
+    page is rendered, so content can link to /blog/post.md, or to the
+    page's url in either layout.
+
+    Without keep_html, result.pages do not hold each page's HTML or
+    outline (they are only written out), so a build's memory does not
+    grow with the size of its pages; the command line builds that way.
+    """
+
+    def __init__(
+            self,
+            basepath: str = "/",
+            content_dir: str = "content",
+            static_dir: str = "static",
+            template_path: str = "template.html",
+            layouts_dir: Optional[str] = "layouts",
+            dest_dir: str = "docs",
+            cache_dir: Optional[str] = ".cache",
+            fs: FileSystem = DISK,
+            out: Optional[FileSystem] = None,
+            extensions: Optional[Iterable[str]] = None,
+            image_widths: Iterable[int] = (),
+            jobs: Optional[int] = None,
+            fingerprint: bool = True,
+            search: bool = True,
+            page_index: bool = False,
+            index_outline: bool = False,
+            clean: bool = True,
+            keep_going: bool = False,
+            atomic: Optional[str] = None,
+            keep_generations: int = 3,
+            shard: Optional[Shard] = None,
+            parse_cache_size: Optional[int] = DEFAULT_MAX_BYTES,
+            changes: Optional[str] = None,
+            diff_blocks: bool = False,
+            languages: Iterable[str] = (),
+            pretty_urls: bool = False,
+            drafts: bool = False,
+            future: bool = False,
+            now: Optional[datetime.datetime] = None,
+            keep_html: bool = True,
+            events: Optional[EventLog] = None
+    ) -> None:
+        self.basepath = basepath
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.layouts_dir = layouts_dir
+        self.dest_dir = dest_dir
+        self.cache_dir = cache_dir
+        self.fs = fs
+        self.out = out if out is not None else fs
+        # Every default extension (not the optional ones) unless told otherwise
+        self.extensions = list(extensions) if extensions is not None else list(EXTENSIONS)
+        self.image_widths = list(image_widths)
+        self.jobs = jobs
+        self.fingerprint = fingerprint
+        self.search = search
+        self.page_index = page_index or index_outline
+        self.index_outline = index_outline
+        self.clean = clean
+        self.keep_going = keep_going
+        self.atomic = atomic
+        self.keep_generations = keep_generations
+        self.shard = shard
+        self.parse_cache_size = parse_cache_size
+        self.changes = changes
+        self.diff_blocks = diff_blocks
+        self.languages = list(languages)
+        self.pretty_urls = pretty_urls
+        self.drafts = drafts
+        self.future = future
+        self.now = now
+        self.keep_html = keep_html
+        self.events = events
+
+
+class BuildResult:
+    """
+    The outcome of a build: one PageResult per page, counters in stats,
+    the filesystem the site was written to (result.files), the
+    asset manifest pages were linked against, the build's metrics,
+    for keep_going builds, the pages that failed (result.errors), the
+    drafts and scheduled pages that were left out (result.skipped),
+    the route table of the site (of its default language's tree), and
+    the pages of every language of a multilingual site (result.locales).
+    """
+
+    def __init__(
+            self,
+            pages: List[PageResult],
+            stats: Dict[str, object],
+            files: FileSystem,
+            dest_dir: str,
+            assets: Optional[Dict[str, str]] = None,
+            metrics: Optional[Metrics] = None,
+            errors: Optional[List[PageError]] = None,
+            skipped: Optional[List[SkippedPage]] = None,
+            routes: Optional[RouteTable] = None,
+            locales: Optional[Locales] = None
+    ) -> None:
+        self.pages = pages
+        self.stats = stats
+        self.files = files
+        self.dest_dir = dest_dir
+        self.assets = assets
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.errors = errors or []
+        self.skipped = skipped or []
+        self.routes = routes
+        self.locales = locales
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def page(self, source: str) -> Optional[PageResult]:
+        for page in self.pages:
+            if page.source == source:
+                return page
+        return None
+
+    def __repr__(self) -> str:
+        return f"BuildResult({len(self.pages)} pages, {self.stats})"
+
+
+def make_parser(
+        extensions: Iterable[str],
+        images: Optional[Dict[str, ImageInfo]] = None,
+        basepath: str = "/",
+        inline_cache: bool = False
+) -> MarkdownParser:
+    """
+    The parser every page is rendered with. Module-level, so page workers
+    can build their own copy from plain data.
+    """
+    parser = parser_with_extensions(extensions)
+    parser.register(ImagesExtension(images or {}, basepath))
+    if inline_cache:
+        parser.inline_cache = {}
+    return parser
+
+
+def _clean_for_keep_going(out: FileSystem, dest: str, keep: Iterable[str]) -> None:
+    # Everything goes except the pages that will be generated again:
+    # a page that then fails still has its previous output
+    keep = set(keep)
+    for root, _dirs, files in list(out.walk(dest)):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if path not in keep:
+                out.remove(path)
+
+
+def _language_runs(
+        config: BuildConfig,
+        locales: Optional[Locales],
+        pages: List[Tuple[str, str]],
+        dest: str,
+        cache_dir: Optional[str],
+        routes: Optional[RouteTable],
+        assets: Optional[Dict[str, str]],
+        out: FileSystem
+) -> Iterator[Tuple[List[Tuple[str, str]], Optional[SearchIndex], RouteTable, Optional[dict]]]:
+    """
+    The page generation runs of a build: (pages, search index, route
+    table, placeholders) for each language, or the one run of a site
+    in a single language (with its routes). Pages of other languages link
+    to their own language's pages (see Locales.routes) and keep their
+    search state apart in cache_dir/locales/<lang>/.
+    """
+    if locales is None:
+        search_index = SearchIndex(dest, config.basepath, cache_dir, fs=out) if config.search else None
+        if assets:
+            routes.add_assets(assets)
+        yield pages, search_index, routes, None
+        return
+    selected = set(pages)
+    for lang in locales.languages:
+        run_pages = [(page.source, page.dest_path) for page in locales.pages_of(lang)]
+        run_pages = [page for page in run_pages if page in selected]
+        search_index = None
+        if config.search:
+            basepath = config.basepath if lang == locales.default else f"{config.basepath}{lang}/"
+            state_dir = cache_dir
+            if cache_dir is not None and lang != locales.default:
+                state_dir = os.path.join(cache_dir, "locales", lang)
+            search_index = SearchIndex(locales.dest_dir_of(lang), basepath, state_dir, fs=out)
+        run_routes = locales.routes(lang, config.basepath, assets)
+        yield run_pages, search_index, run_routes, locales.placeholders(lang, config.basepath)
+
+
+class Builder:
+    """
+    Builds sites with one warm parser. A long-lived process (e.g. a preview
+    service) keeps a Builder around, so extensions are set up only once
+    and not per build.
+    """
+
+    def __init__(self, extensions: Optional[Iterable[str]] = None) -> None:
+        self.extensions = list(extensions) if extensions is not None else list(EXTENSIONS)
+        self.parser = make_parser(self.extensions)
+        # The image index changes per build; the extension is registered once
+        self.images = next(extension for extension in self.parser.extensions
+                           if isinstance(extension, ImagesExtension))
+        self.builds = 0
+
+    def build(self, config: BuildConfig) -> BuildResult:
+        if config.extensions != self.extensions:
+            raise ValueError(
+                f"This builder parses with {self.extensions}, the config asks for {config.extensions}"
+            )
+        events = config.events if config.events is not None else EventLog()
+        events.emit("build_start", content_dir=config.content_dir, dest_dir=config.dest_dir,
+                    basepath=config.basepath)
+        started = time.perf_counter()
+        try:
+            result = self._build(config, events)
+        except Exception as e:
+            events.emit("error", error=f"{type(e).__name__}: {e}", seconds=round(time.perf_counter() - started, 6))
+            events.metrics.inc("build_errors_total", help="Builds that failed.")
+            raise
+        seconds = time.perf_counter() - started
+        result.stats["seconds"] = seconds
+        events.metrics.set("build_seconds", seconds, help="Duration of the last build.")
+        events.emit("build_end", **result.stats)
+        self.builds += 1
+        return result
+
+    def _build(self, config: BuildConfig, events: EventLog) -> BuildResult:
+        if config.atomic is None:
+            return self._build_into(config, events)
+
+        out = config.out
+        if not isinstance(out, DiskFileSystem):
+            raise ValueError("Atomic builds need the output on disk (a DiskFileSystem)")
+        generations = Generations(out.local_path(config.dest_dir), config.keep_generations, config.atomic)
+        generation, staging = generations.new_staging()
+        previous = generations.live_dir()
+
+        # The same build, pointed at the staging directory
+        staged = copy.copy(config)
+        staged.dest_dir = os.path.relpath(staging, out.root) if out.root else staging
+        staged.out = DiskFileSystem(out.root, seed=(staged.dest_dir, previous) if previous else None)
+        result = self._build_into(staged, events, previous)
+
+        generations.publish(generation, staging)
+        events.emit("publish", dest=config.dest_dir, generation=generation)
+        result.stats["generation"] = generation
+        result.stats["linked_files"] = staged.out.linked
+        for page in result.pages:
+            page.dest_path = os.path.join(config.dest_dir, os.path.relpath(page.dest_path, staged.dest_dir))
+        result.dest_dir = config.dest_dir
+        return result
+
+    def _build_into(self, config: BuildConfig, events: EventLog, previous: Optional[str] = None) -> BuildResult:
+        fs, out, dest = config.fs, config.out, config.dest_dir
+        stats: Dict[str, object] = {}
+
+        # Step 1: Clean slate, then the static files. Drafts and
+        # scheduled pages are dropped here, having read only their front
+        # matter, which routing reads too
+        locales = None
+        routes = None
+        headers: Dict[str, Dict[str, str]] = {}
+        # Pages whose front matter is wrong are left out here and when routed
+        errors: Optional[List[PageError]] = [] if config.keep_going else None
+        pages, skipped = filter_publishable(
+            collect_pages(config.content_dir, dest, fs), fs, config.now, config.drafts, config.future, headers, errors
+        )
+        for page in skipped:
+            events.emit("page_skipped", **page.to_dict())
+            events.metrics.inc("pages_skipped_total", help="Drafts and scheduled pages left out.", reason=page.reason)
+        stats["skipped"] = {reason: sum(page.reason == reason for page in skipped) for reason in ("draft", "scheduled")}
+        if config.languages:
+            # A draft translation falls back to the default language's page
+            locales = Locales(
+                config.languages, config.content_dir, dest, fs, pages, headers, config.pretty_urls, errors
+            )
+            pages = [(page.source, page.dest_path) for page in locales.all_pages()]
+        else:
+            # Every route before any page is built, so pages link to any
+            # other page (even one of another shard) by its final url
+            pages, routes = route_pages(
+                pages, config.content_dir, dest, config.basepath, config.pretty_urls, headers, fs, errors
+            )
+        if errors:
+            if config.shard is not None:
+                # Every shard reads every header: each reports its own pages
+                errors = [error for error in errors
+                          if select_shard([(error.source, "")], config.content_dir, config.shard)]
+            for error in errors:
+                events.emit("page_error", **error.to_dict())
+                events.metrics.inc("page_errors_total", help="Pages that failed to build.")
+        cache_dir = config.cache_dir
+        if config.shard is not None:
+            pages = select_shard(pages, config.content_dir, config.shard)
+            stats["shard"] = "{}/{}".format(*config.shard)
+            # Shards may build side by side on one machine: no shared caches
+            if cache_dir is not None:
+                cache_dir = os.path.join(cache_dir, shard_name(config.shard))
+        if out.exists(dest) and (config.keep_going or not config.clean):
+            # Output kept from an atomic build's generation: never written
+            # through the docs link, since generations are rollback targets
+            out.detach(dest)
+        if config.clean and out.exists(dest):
+            if config.keep_going:
+                _clean_for_keep_going(out, dest, (dest_path for _source, dest_path in pages))
+            else:
+                out.rmtree(dest)
+        out.makedirs(dest)
+        stats["static_files"] = 0
+        if fs.exists(config.static_dir):
+            stats["static_files"] = copy_tree(fs, config.static_dir, out, dest)
+
+        # Step 2: Image sizes (and optional responsive variants)
+        images = {}
+        if fs.exists(config.static_dir):
+            images = build_image_index(
+                config.static_dir, dest, config.image_widths, cache_dir, config.jobs, fs, out, events
+            )
+        self.images.index = images
+        self.images.basepath = config.basepath
+        stats["images"] = len(images)
+
+        # Step 3: Content-hashed copies of CSS/JS
+        assets = None
+        if config.fingerprint and fs.exists(config.static_dir):
+            assets = fingerprint_assets(config.static_dir, dest, cache_dir, fs=fs, out=out, events=events)
+            stats["assets"] = len(assets)
+
+        # Step 4: Every page, with the indexes filled in on the way; a
+        # multilingual site one language at a time (see _language_runs)
+        page_index = None
+        if config.page_index:
+            page_index = PageIndex(dest, config.basepath, include_outline=config.index_outline)
+        parse_cache = None
+        if cache_dir is not None and config.parse_cache_size is not None:
+            version = parser_version(self.extensions, images, config.basepath)
+            parse_cache = ParseCache(cache_dir, version, config.parse_cache_size, fs=out)
+        parse_memo = None
+        self.parser.inline_cache = None
+        if locales is not None:
+            parse_memo = ParseMemo()
+            self.parser.inline_cache = {}
+        layouts = Layouts(config.template_path, config.layouts_dir, config.content_dir, fs, config.languages)
+        parser_factory = functools.partial(
+            make_parser, self.extensions, images, config.basepath, locales is not None
+        )
+        results: List[PageResult] = []
+        search_indexes: List[SearchIndex] = []
+        # (dest path, href) of every redirect stub written
+        redirects: List[Tuple[str, str]] = []
+        for run_pages, search_index, run_routes, placeholders in _language_runs(
+                config, locales, pages, dest, cache_dir, routes, assets, out):
+            if routes is None:
+                routes = run_routes
+            if search_index is not None:
+                search_indexes.append(search_index)
+            run_errors: Optional[List[PageError]] = [] if errors is not None else None
+            results.extend(generate_pages(
+                run_pages, config.template_path, config.basepath,
+                self.parser, page_index, None, search_index,
+                fs=fs, out=out, layouts=layouts, events=events, dest_root=dest, errors=run_errors, jobs=config.jobs,
+                parser_factory=parser_factory, parse_cache=parse_cache, block_hashes=config.diff_blocks,
+                parse_memo=parse_memo, placeholders=placeholders, routes=run_routes, keep_html=config.keep_html
+            ))
+            if errors is not None:
+                # A page that fails in every language is one error
+                failed = {error.source for error in errors}
+                errors.extend(error for error in run_errors if error.source not in failed)
+            # Renamed pages' old urls (of this shard's pages only)
+            for stub_path in run_routes.write_redirects(out, (source for source, _dest in run_pages)):
+                redirects.append((stub_path, run_routes.redirects[stub_path]))
+        self.parser.inline_cache = None
+        stats["pages"] = len(results)
+        stats["redirects"] = len(redirects)
+        stats["page_bytes"] = sum(page.size for page in results)
+        stats["errors"] = len(errors or [])
+        stats["layouts"] = len(layouts.compiled)
+        if locales is not None:
+            stats["locales"] = {
+                "languages": len(locales.languages),
+                "translated": locales.translated(),
+                "fallbacks": len(pages) - locales.translated(),
+                "shared_parses": parse_memo.hits,
+            }
+        # Where the failed pages go (in every language)
+        dest_paths: Dict[str, List[str]] = {error.source: [] for error in errors or []}
+        for source, dest_path in pages:
+            if source in dest_paths:
+                dest_paths[source].append(dest_path)
+        changes = None
+        if cache_dir is not None or config.changes is not None:
+            changes = PageChanges(cache_dir, fs=out)
+            for page in results:
+                changes.add_digest(page.url, page.digest, page.blocks)
+            for stub_path, href in redirects:
+                changes.add(page_url(dest, stub_path, config.basepath), redirect_page(href))
+            for error in errors or []:
+                for dest_path in dest_paths[error.source]:
+                    changes.keep(page_url(dest, dest_path, config.basepath))
+        if errors and previous is not None:
+            # Atomic keep-going builds start empty: bring the failed
+            # pages' previous output over from the live generation
+            for error in errors:
+                for dest_path in dest_paths[error.source]:
+                    old = os.path.join(previous, os.path.relpath(dest_path, dest))
+                    if os.path.exists(old) and not out.exists(dest_path):
+                        out.copy_local(old, dest_path)
+
+        # Step 5: The indexes
+        if search_indexes:
+            search: Dict[str, int] = {}
+            for search_index in search_indexes:
+                for name, count in search_index.write().items():
+                    search[name] = search.get(name, 0) + count
+            stats["search"] = search
+            hits = search["pages"] - search["changed"]
+            events.metrics.inc("cache_hits_total", hits, help="Build cache hits.", cache="search")
+            events.metrics.inc("cache_misses_total", search["changed"], help="Build cache misses.", cache="search")
+        if parse_cache is not None:
+            parse_cache.save()
+            stats["parse_cache"] = dict(parse_cache.stats, bytes=parse_cache.size())
+            hits, misses = parse_cache.stats["hits"], parse_cache.stats["misses"]
+            events.metrics.inc("cache_hits_total", hits, help="Build cache hits.", cache="parse")
+            events.metrics.inc("cache_misses_total", misses, help="Build cache misses.", cache="parse")
+        if changes is not None:
+            report = changes.write(config.changes, out)
+            stats["changes"] = {kind: len(report[kind]) for kind in ("changed", "added", "removed")}
+        if page_index is not None:
+            page_index.write(f"{dest}/page-index.json", out)
+        if config.shard is not None:
+            search_dirs = [os.path.relpath(os.path.join(index.dest_root, "search"), dest) for index in search_indexes]
+            write_shard_manifest(out, dest, config.shard, results, errors, search_dirs)
+
+        return BuildResult(results, stats, out, dest, assets, events.metrics, errors, skipped, routes, locales)
+
+
+def build(config: Optional[BuildConfig] = None) -> BuildResult:
+    """
+    Builds a site in one call:
+
+        result = build(BuildConfig(fs=MemoryFileSystem({...}), cache_dir=None))
+        result.page("content/index.md").html
+
+    Use a Builder instead to keep the parser warm across builds.
+    """
+    config = config or BuildConfig()
+    return Builder(config.extensions).build(config)
@@ -0,0 +1,331 @@
+import argparse
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from builder import BuildConfig, Builder, BuildResult
+from frontmatter import split_front_matter
+from generate_page import render_page
+from layouts import Layouts
+from main import add_site_arguments, site_config
+from locales import locale_of
+from routes import page_path, RouteTable
+from search_index import page_url
+from toc import Outline
+
+
+class SiteDaemon:
+    """
+    Keeps a site warm between requests: the parser (with its extensions),
+    the compiled layouts, the last build's pages, asset manifest and (for
+    a multilingual site) each language's routes and locale placeholders,
+    and a cache of rendered pages keyed by the hash of their Markdown.
+
+    Requests are plain dicts, so any transport can feed handle():
+
+        {"op": "render", "source": "content/index.md"}
+        {"op": "render", "url": "/blog/tom/", "markdown": "# Unsaved draft"}
+        {"op": "rebuild"}
+        {"op": "stats"}
+    """
+
+    def __init__(self, config: BuildConfig, cache_size: int = 256) -> None:
+        self.config = config
+        self.builder = Builder(config.extensions)
+        self.cache_size = cache_size
+        # (markdown hash, layout path, layouts version, language, locale placeholders) -> (title, html)
+        self.renders: "OrderedDict[tuple, Tuple[str, str]]" = OrderedDict()
+        self.layouts: Optional[Layouts] = None
+        self.template_version = 0
+        self.result: Optional[BuildResult] = None
+        self.sources_by_url: Dict[str, str] = {}
+        # Multilingual sites: the language of every page's url, and each
+        # language's route table and placeholders (by dest path)
+        self.langs_by_url: Dict[str, str] = {}
+        self.locales: Dict[str, Tuple[RouteTable, Dict[str, Dict[str, str]]]] = {}
+        self.started = time.time()
+        self.counters = {"renders": 0, "render_hits": 0, "render_misses": 0, "template_loads": 0, "rebuilds": 0}
+        self.last_render_ms = 0.0
+
+    def handle(self, request: dict) -> dict:
+        ops = {"render": self.render, "rebuild": self.rebuild, "stats": self.stats}
+        request = dict(request)
+        op = request.pop("op", None)
+        if op not in ops:
+            return {"ok": False, "error": f"Unknown op: {op}"}
+        try:
+            return dict(ops[op](**request), ok=True)
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    def rebuild(self) -> dict:
+        """
+        A full build; refreshes the page list, asset manifest and routes
+        and drops rendered pages, since their links may have changed.
+        """
+        config = self.config
+        self.result = self.builder.build(config)
+        self.sources_by_url = {page.url: page.source for page in self.result.pages}
+        self.langs_by_url, self.locales = {}, {}
+        locales = self.result.locales
+        if locales is not None:
+            for lang in locales.languages:
+                routes = locales.routes(lang, config.basepath, self.result.assets)
+                self.locales[lang] = (routes, locales.placeholders(lang, config.basepath))
+                self.langs_by_url.update(
+                    (page_url(routes.dest_dir, dest_path, config.basepath), lang) for dest_path in routes.pages.values()
+                )
+        self.renders.clear()
+        # New layout files are picked up too
+        self.layouts = None
+        self.counters["rebuilds"] += 1
+        stats = self.result.stats
+        return {"pages": stats["pages"], "seconds": stats["seconds"]}
+
+    def _load_layouts(self) -> Layouts:
+        # One stat per layout per render; they are only read again when one changed
+        config = self.config
+        if self.layouts is None or self.layouts.changed():
+            self.layouts = Layouts(
+                config.template_path, config.layouts_dir, config.content_dir, config.fs, config.languages
+            )
+            self.template_version += 1
+            self.counters["template_loads"] += 1
+        return self.layouts
+
+    def _routes(self, lang: Optional[str]) -> Optional[RouteTable]:
+        if lang is not None:
+            return self.locales[lang][0] if lang in self.locales else None
+        return self.result.routes if self.result is not None else None
+
+    def _placeholders(self, source: str, lang: Optional[str]) -> Optional[Dict[str, str]]:
+        # {{ Lang }} and {{ Alternates }} of the page in lang's tree, as the
+        # last build filled them; a new page has no translations yet
+        if lang is None:
+            return None
+        if lang in self.locales:
+            routes, placeholders = self.locales[lang]
+            if source in routes.pages and routes.pages[source] in placeholders:
+                return placeholders[routes.pages[source]]
+        return {"{{ Lang }}": lang, "{{ Alternates }}": ""}
+
+    def _page_url(self, source: str, meta: Dict[str, str], lang: Optional[str]) -> str:
+        config = self.config
+        routes = self._routes(lang)
+        if routes is not None and source in routes.pages:
+            return page_url(routes.dest_dir, routes.pages[source], config.basepath)
+        # A page the last build did not have: where it would be routed
+        rel_path = os.path.relpath(source, config.content_dir).replace(os.sep, "/")
+        dest_dir = config.dest_dir
+        if lang is not None:
+            _lang, rel_path = locale_of(rel_path, config.languages, config.languages[0])
+            if lang != config.languages[0]:
+                dest_dir = os.path.join(dest_dir, lang)
+        dest_path = os.path.join(dest_dir, page_path(rel_path, meta, config.pretty_urls))
+        return page_url(config.dest_dir, dest_path, config.basepath)
+
+    def _check_source(self, source: str) -> None:
+        # A source comes from a request: only Markdown files of the site's
+        # content may be read, whatever the path says (.., symlinks)
+        config = self.config
+        content_dir, path = os.path.normpath(config.content_dir), os.path.normpath(source)
+        local_dir, local_path = config.fs.local_path(content_dir), config.fs.local_path(path)
+        if local_dir is not None and local_path is not None:
+            content_dir, path = os.path.realpath(local_dir), os.path.realpath(local_path)
+        if (
+                not path.endswith(".md")
+                or os.path.isabs(path) != os.path.isabs(content_dir)
+                or os.path.commonpath([content_dir, path]) != content_dir
+        ):
+            raise ValueError(f"Not a page of the site: {source}")
+
+    def render(self, source: Optional[str] = None, url: Optional[str] = None, markdown: Optional[str] = None) -> dict:
+        """
+        Renders one page, from its source file or from the markdown given
+        (e.g. an unsaved draft). Nothing is written to the output. Sources
+        outside the content directory, or that are not Markdown, are refused.
+        """
+        started = time.perf_counter()
+        config = self.config
+        lang = None
+        if source is not None:
+            self._check_source(source)
+            if config.languages:
+                rel_path = os.path.relpath(source, config.content_dir)
+                lang, _key = locale_of(rel_path, config.languages, config.languages[0])
+        else:
+            if url is None:
+                raise ValueError("render needs a source or a url")
+            if url not in self.sources_by_url:
+                raise KeyError(f"No page at {url}")
+            # A fallback page's source is the default language's
+            source, lang = self.sources_by_url[url], self.langs_by_url.get(url)
+        if markdown is None:
+            markdown = self.config.fs.read_text(source)
+        layouts = self._load_layouts()
+        meta, markdown_body = split_front_matter(markdown)
+        layout = layouts.path_for(source, meta)
+        template = layouts.compile(layout)
+
+        # A page links within its language's tree, and its placeholders are its own
+        placeholders = self._placeholders(source, lang)
+        locale = tuple(placeholders.values()) if placeholders is not None else None
+        key = (hashlib.sha256(markdown.encode()).hexdigest(), layout, self.template_version, lang, locale)
+        cached = key in self.renders
+        if cached:
+            self.renders.move_to_end(key)
+            title, html = self.renders[key]
+            self.counters["render_hits"] += 1
+        else:
+            outline = Outline() if "{{ TOC }}" in template else None
+            assets = self.result.assets if self.result is not None else None
+            title, html = render_page(
+                markdown_body, template, config.basepath, self.builder.parser, assets, outline,
+                routes=self._routes(lang), placeholders=placeholders
+            )
+            self.renders[key] = (title, html)
+            if len(self.renders) > self.cache_size:
+                self.renders.popitem(last=False)
+            self.counters["render_misses"] += 1
+        self.counters["renders"] += 1
+
+        self.last_render_ms = (time.perf_counter() - started) * 1000
+        return {
+            "source": source,
+            "url": self._page_url(source, meta, lang),
+            "title": title,
+            "html": html,
+            "cached": cached,
+            "ms": self.last_render_ms,
+        }
+
+    def stats(self) -> dict:
+        return dict(
+            self.counters,
+            cached_pages=len(self.renders),
+            cache_size=self.cache_size,
+            site_pages=len(self.sources_by_url),
+            last_render_ms=self.last_render_ms,
+            uptime_seconds=time.time() - self.started,
+        )
+
+
+class _JSONLinesHandler(socketserver.StreamRequestHandler):
+    # One JSON request per line, one JSON response per line;
+    # a client may send any number of requests over one connection
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.site.handle(json.loads(line))
+            except json.JSONDecodeError as e:
+                response = {"ok": False, "error": f"Bad request: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class UnixSocketServer(socketserver.UnixStreamServer):
+    def __init__(self, path: str, site: SiteDaemon) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+        self.site = site
+        super().__init__(path, _JSONLinesHandler)
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    # GET /stats, GET /render?source=... or ?url=...,
+    # POST /render and POST /rebuild with an optional JSON body.
+    # A rebuild is POST only: a page on any site can make the browser GET
+    def _respond(self, request: dict) -> None:
+        self._send(self.server.site.handle(request))
+
+    def _send(self, response: dict, status: Optional[int] = None, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(response).encode()
+        self.send_response(status if status is not None else 200 if response["ok"] else 400)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        parsed = urlparse(self.path)
+        request = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        op = parsed.path.strip("/")
+        if op == "rebuild":
+            self._send({"ok": False, "error": "rebuild needs a POST"}, 405, {"Allow": "POST"})
+            return
+        self._respond(dict(request, op=op))
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            self._send({"ok": False, "error": f"Bad request: {e}"})
+            return
+        self._respond(dict(request, op=urlparse(self.path).path.strip("/")))
+
+    def log_message(self, format: str, *args) -> None:
+        # Quiet: a preview flow makes a request per keystroke
+        pass
+
+
+class LocalHTTPServer(HTTPServer):
+    def __init__(self, port: int, site: SiteDaemon) -> None:
+        self.site = site
+        super().__init__(("127.0.0.1", port), _HTTPHandler)
+
+
+def request(socket_path: str, payload: dict) -> dict:
+    """
+    Sends one request to a daemon's Unix socket and returns its response.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Keep the site warm and render pages on request.")
+    add_site_arguments(parser)
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument("--socket", help="listen on this Unix domain socket")
+    transport.add_argument("--port", type=int, default=8765, help="listen on localhost:PORT (default 8765)")
+    parser.add_argument("--cache-size", type=int, default=256, help="rendered pages kept in memory")
+    args = parser.parse_args()
+
+    site = SiteDaemon(site_config(args), args.cache_size)
+    built = site.rebuild()
+    print(f"Built {built['pages']} pages in {built['seconds']:.2f}s")
+
+    if args.socket:
+        server = UnixSocketServer(args.socket, site)
+        print(f"Listening on {args.socket}")
+    else:
+        server = LocalHTTPServer(args.port, site)
+        print(f"Listening on http://127.0.0.1:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
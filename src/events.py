@@ -0,0 +1,135 @@
+import bisect
+import json
+import time
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+
+from filesystem import DISK, FileSystem
+
+# Upper bounds (seconds) of the duration histogram buckets
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms, rendered in the Prometheus text
+    exposition format. Every metric name gets the prefix, e.g. ssg_pages_total.
+    """
+
+    def __init__(self, prefix: str = "ssg") -> None:
+        self.prefix = prefix
+        # name -> (type, help text)
+        self.kinds: Dict[str, Tuple[str, str]] = {}
+        self.values: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def _declare(self, name: str, kind: str, help: str) -> str:
+        name = f"{self.prefix}_{name}"
+        if name not in self.kinds:
+            self.kinds[name] = (kind, help)
+        elif self.kinds[name][0] != kind:
+            raise ValueError(f"{name} is a {self.kinds[name][0]}, not a {kind}")
+        return name
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels: object) -> None:
+        series = self.values.setdefault(self._declare(name, "counter", help), {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, help: str = "", **labels: object) -> None:
+        self.values.setdefault(self._declare(name, "gauge", help), {})[_labels(labels)] = value
+
+    def observe(
+            self,
+            name: str,
+            value: float,
+            help: str = "",
+            buckets: Sequence[float] = DURATION_BUCKETS,
+            **labels: object
+    ) -> None:
+        series = self.histograms.setdefault(self._declare(name, "histogram", help), {})
+        key = _labels(labels)
+        if key not in series:
+            series[key] = Histogram(buckets)
+        series[key].observe(value)
+
+    def value(self, name: str, **labels: object) -> float:
+        """
+        The current value of a counter or gauge (0 if never touched).
+        """
+        return self.values.get(f"{self.prefix}_{name}", {}).get(_labels(labels), 0)
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        for name in sorted(self.kinds):
+            kind, help = self.kinds[name]
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for labels, histogram in sorted(self.histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        bucket_labels = labels + (("le", _format_number(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            else:
+                for labels, value in sorted(self.values[name].items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, fs: FileSystem = DISK) -> None:
+        fs.write_text(path, self.to_prometheus())
+
+
+class EventLog:
+    """
+    The build's structured event stream: one JSON object per line,
+    {"ts": ..., "event": "page", ...}. Quiet by default: without a stream,
+    events are dropped and only the metrics are kept.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, metrics: Optional[Metrics] = None) -> None:
+        self.stream = stream
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    def emit(self, event: str, **fields: object) -> None:
+        if self.stream is None:
+            return
+        record = {"ts": round(time.time(), 6), "event": event}
+        record.update(fields)
+        self.stream.write(json.dumps(record, separators=(",", ":")) + "\n")
@@ -0,0 +1,394 @@
+import codecs
+import re
+from enum import Enum
+from typing import Callable, List, Optional
+
+from htmlnode import HTMLNode, LeafNode, ParentNode
+from markdown_blocks import Block, DocumentParser, MarkdownParser, END_OF_LINE, SPAN_BREAK, SPAN_GAP, SPAN_JOIN
+from textnode import TextNode, TextType
+from toc import SlugRegistry, node_text
+
+
+class Extension:
+    """
+    Base class for parser extensions.
+    Subclasses register their hooks on the parser in extend().
+    """
+    name = "extension"
+
+    def extend(self, parser: MarkdownParser) -> None:
+        raise NotImplementedError("extend method not implemented")
+
+
+class ExtensionTextType(Enum):
+    """
+    Inline types added by the bundled extensions.
+    TextType stays closed; extensions bring their own Enum members.
+    """
+    FOOTNOTE_REF = "footnote_ref"
+
+
+def page_slugs(doc: DocumentParser) -> SlugRegistry:
+    """
+    The slug registry of the document being parsed (shared by extensions).
+    When the page records an outline, its slugs are used so anchors match the TOC.
+    """
+    if doc.outline is not None:
+        return doc.outline.slugs
+    registry = doc.state.get("slugs")
+    if registry is None:
+        registry = SlugRegistry()
+        doc.state["slugs"] = registry
+    return registry
+
+
+# --- Heading anchors ---------------------------------------------------------
+
+class HeadingAnchorsExtension(Extension):
+    """
+    Gives every heading an `id` derived from its text, e.g. <h2 id="introduction">.
+    """
+    name = "heading_anchors"
+
+    def extend(self, parser: MarkdownParser) -> None:
+        parser.add_node_hook(("h1", "h2", "h3", "h4", "h5", "h6"), self._add_id)
+
+    @staticmethod
+    def _add_id(doc: DocumentParser, node: HTMLNode) -> None:
+        props = dict(node.props) if node.props else {}
+        if "id" not in props:
+            props["id"] = page_slugs(doc).unique(node_text(node))
+        node.props = props
+
+
+# --- Tables --------------------------------------------------------------------
+
+_DELIMITER_CELL = re.compile(r"^:?-+:?$")
+
+
+def split_table_row(line: str) -> List[str]:
+    """
+    Splits a table row into stripped cells.
+    Outer pipes are optional and `\\|` is a literal pipe.
+    """
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    cells = re.split(r"(?<!\\)\|", line)
+    return [cell.strip().replace("\\|", "|") for cell in cells]
+
+
+def _alignment(cell: str) -> Optional[str]:
+    if cell.startswith(":") and cell.endswith(":"):
+        return "center"
+    if cell.endswith(":"):
+        return "right"
+    if cell.startswith(":"):
+        return "left"
+    return None
+
+
+class TablesExtension(Extension):
+    """
+    GitHub-flavoured tables: a header row, a delimiter row such as
+    `| --- | :-: |`, then body rows until the paragraph ends.
+    """
+    name = "tables"
+
+    def extend(self, parser: MarkdownParser) -> None:
+        parser.add_paragraph_hook(self._build_table)
+
+    @staticmethod
+    def _build_table(doc: DocumentParser, lines: List[str]) -> Optional[HTMLNode]:
+        # Cheap rejection first: most paragraphs are not tables
+        if len(lines) < 2 or "|" not in lines[0] or "-" not in lines[1]:
+            return None
+        delimiters = split_table_row(lines[1])
+        if not all(_DELIMITER_CELL.match(cell) for cell in delimiters):
+            return None
+        header = split_table_row(lines[0])
+        if len(header) != len(delimiters):
+            return None
+
+        alignments = [_alignment(cell) for cell in delimiters]
+
+        def row(cells: List[str], tag: str) -> ParentNode:
+            # Body rows are padded or cut to the header's width
+            cells = (cells + [""] * len(alignments))[:len(alignments)]
+            html_cells = []
+            for cell, align in zip(cells, alignments):
+                props = {"align": align} if align else None
+                html_cells.append(ParentNode(tag, doc.text_to_children(cell) if cell else [], props))
+            return ParentNode("tr", html_cells)
+
+        children: List[HTMLNode] = [ParentNode("thead", [row(header, "th")])]
+        body = [row(split_table_row(line), "td") for line in lines[2:]]
+        if body:
+            children.append(ParentNode("tbody", body))
+        return ParentNode("table", children)
+
+
+# --- Footnotes -------------------------------------------------------------------
+
+_FOOTNOTE_DEFINITION = re.compile(r"\[\^([^\]\s]+)\]:[ ]?")
+_FOOTNOTE_REFERENCE = re.compile(r"\[\^([^\]\s]+)\]")
+
+
+def split_nodes_footnote_ref(old_nodes: List[TextNode]) -> List[TextNode]:
+    new_nodes = []
+    for node in old_nodes:
+        if node.text_type != TextType.TEXT:
+            new_nodes.append(node)
+            continue
+
+        last = 0
+        for match in _FOOTNOTE_REFERENCE.finditer(node.text):
+            if match.start() > last:
+                new_nodes.append(TextNode(node.text[last:match.start()], TextType.TEXT))
+            new_nodes.append(TextNode(match.group(1), ExtensionTextType.FOOTNOTE_REF))
+            last = match.end()
+        if last < len(node.text):
+            new_nodes.append(TextNode(node.text[last:], TextType.TEXT))
+
+    return new_nodes
+
+
+class FootnotesExtension(Extension):
+    """
+    Footnote references `[^label]` and definitions `[^label]: text`.
+    Definitions may continue on lines indented by four spaces and are
+    collected into a <section class="footnotes"> at the end of the page.
+    """
+    name = "footnotes"
+
+    def extend(self, parser: MarkdownParser) -> None:
+        parser.add_block_start("[", self._start_definition)
+        parser.add_block_builder("footnote", self._build_definition)
+        parser.add_finish_hook(self._append_section)
+        # After code spans (a reference inside backticks stays code),
+        # before styling
+        parser.add_inline_step("footnote_ref", "[^", split_nodes_footnote_ref, before="bold")
+        parser.add_inline_renderer(ExtensionTextType.FOOTNOTE_REF, self._render_reference)
+
+    @staticmethod
+    def _start_definition(doc: DocumentParser, line: str, pos: int, p: int, matched: int) -> Optional[int]:
+        match = _FOOTNOTE_DEFINITION.match(line, p)
+        if match is None:
+            return None
+        doc.prepare(matched)
+        block = doc.open("footnote")
+        block.info = match.group(1)
+        block.offset = 4
+        end = match.end()
+        return end if end < len(line) else END_OF_LINE
+
+    @staticmethod
+    def _build_definition(doc: DocumentParser, block: Block) -> Optional[HTMLNode]:
+        # Definitions render at the end of the page, not where they are written
+        doc.state.setdefault("footnotes", []).append((block.info, block.children))
+        return None
+
+    @staticmethod
+    def _render_reference(text_node: TextNode) -> LeafNode:
+        label = text_node.text
+        return LeafNode("sup", f'<a href="#fn-{label}">{label}</a>', {"id": f"fnref-{label}"})
+
+    @staticmethod
+    def _append_section(doc: DocumentParser, children: List[HTMLNode]) -> None:
+        footnotes = doc.state.get("footnotes")
+        if not footnotes:
+            return
+        items = []
+        for label, content in footnotes:
+            backref = LeafNode("a", "&#8617;", {"href": f"#fnref-{label}"})
+            if content and content[-1].tag == "p" and isinstance(content[-1], ParentNode):
+                content[-1].children.append(LeafNode(None, " "))
+                content[-1].children.append(backref)
+            else:
+                content.append(backref)
+            items.append(ParentNode("li", content, {"id": f"fn-{label}"}))
+        children.append(ParentNode("section", [ParentNode("ol", items)], {"class": "footnotes"}))
+
+
+# --- Typography --------------------------------------------------------------
+
+# An opening quote follows the start of a block, a space, an opening
+# bracket, a dash or a tag, possibly with the end of a span in between;
+# every other quote closes (or is an apostrophe). Every pattern starts with
+# its literal character and looks behind from there, so the regex engine
+# only stops at candidates.
+_OPENS = r"[\s\x00(\[{>\u2013\u2014-]"
+_OPENING_DOUBLE = re.compile(rf'"(?:(?<={_OPENS}")|(?<={_OPENS}\x02"))')
+_OPENING_SINGLE = re.compile(rf"'(?:(?<={_OPENS}')|(?<={_OPENS}\x02'))(?!\d\ds\b)")
+_EM_DASH = re.compile("---")
+_EN_DASH = re.compile("--")
+_ELLIPSIS = re.compile(r"\.\.\.")
+# The space between a number and its unit. A regex that stops at every
+# digit costs as much as all the other passes together, so candidates are
+# looked for in a copy with every digit turned into one byte, which the
+# regex engine finds like a plain string
+_UNIT_SPACE = re.compile(r"[0-9] (?=(?:k[gm]|[cm]m|[MG]B|%)(?!\w))")
+_UNIT_SPACE_CANDIDATE = re.compile(b"\x10 (?=k[gm]|[cm]m|[MG]B|%)")
+_MARK_DIGITS = bytes.maketrans(b"0123456789\x10", b"\x10" * 10 + b"\x11")
+
+# Opening and closing double quotes, opening and closing single quotes,
+# em and en dashes, ellipsis. They go in as placeholders of one byte, so
+# every pass works on a Latin-1 string, and come out in one charmap decode
+# that widens the string once (and turns every span separator into
+# SPAN_BREAK to split on). A closing quote's placeholder is the quote
+# itself: what is left after the opening ones are replaced. Text that is
+# not Latin-1, has a placeholder of its own or has tags (whose quotes
+# stay) takes the marks directly.
+_MARKS = "“”‘’—–…"
+_PLACEHOLDERS = "\x03\"\x05'\x07\x08\x0e"
+# The ones that are not quotes: text with any of them already in it
+# cannot take placeholders
+_CONTROL_PLACEHOLDERS = "".join(mark for mark in _PLACEHOLDERS if mark not in "\"'")
+_DECODING_TABLE = "".join(chr(i) for i in range(256)).translate(
+    str.maketrans(_PLACEHOLDERS + SPAN_GAP + SPAN_JOIN, _MARKS + SPAN_BREAK * 2)
+)
+
+# Inline HTML in the text: its attributes keep their straight quotes
+_TAG = re.compile(r"(<[^<>\x00-\x02]*>)")
+
+
+def _smart_quotes(text: str, marks: str = _MARKS) -> str:
+    if '"' in text:
+        text = _OPENING_DOUBLE.sub(marks[0], text).replace('"', marks[1])
+    if "'" in text:
+        text = _OPENING_SINGLE.sub(marks[2], text).replace("'", marks[3])
+    return text
+
+
+def _smart_dashes(text: str, marks: str = _MARKS) -> str:
+    text = _unit_spaces(text)
+    if "--" in text:
+        text = _EN_DASH.sub(marks[5], _EM_DASH.sub(marks[4], text))
+    if "..." in text:
+        text = _ELLIPSIS.sub(marks[6], text)
+    return text
+
+
+def _unit_spaces(text: str) -> str:
+    # One byte per character, whatever the text, so positions carry over
+    marked = text.encode("latin-1", "replace").translate(_MARK_DIGITS)
+    spaces = [match.start() + 1 for match in _UNIT_SPACE_CANDIDATE.finditer(marked)
+              if _UNIT_SPACE.match(text, match.start())]
+    if not spaces:
+        return text
+    pieces = []
+    pos = 0
+    for space in spaces:
+        pieces.append(text[pos:space])
+        pos = space + 1
+    pieces.append(text[pos:])
+    return "\u00a0".join(pieces)
+
+
+def _keep_tags(original: str, changed: str) -> str:
+    # Puts the tags of original back into changed, a copy of the same length
+    if "<" not in original:
+        return changed
+    pieces = []
+    pos = 0
+    for match in _TAG.finditer(original):
+        pieces.append(changed[pos:match.start()])
+        pieces.append(match.group())
+        pos = match.end()
+    pieces.append(changed[pos:])
+    return "".join(pieces)
+
+
+def _outside_tags(transform: Callable[[str], str], text: str) -> str:
+    if "<" not in text:
+        return transform(text)
+    pieces = _TAG.split(text)
+    pieces[::2] = [transform(piece) for piece in pieces[::2]]
+    return "".join(pieces)
+
+
+def smarten(texts: List[str], joins: List[str]) -> List[str]:
+    """
+    Smart punctuation for a document's prose spans, all at once: the
+    spans go into one string, each after its join, so a quote sees the
+    spans around it and where its block starts; the regexes run once over
+    that string, and it is split back into spans.
+    """
+    parts: List[str] = [""] * (2 * len(texts))
+    parts[::2] = joins
+    parts[1::2] = texts
+    joined = "".join(parts)
+    if "<" not in joined and _latin1(joined) and not any(mark in joined for mark in _CONTROL_PLACEHOLDERS):
+        data = _smart_text(joined, _PLACEHOLDERS).encode("latin-1")
+        smart = codecs.charmap_decode(data, "strict", _DECODING_TABLE)[0]
+    else:
+        smart = _smart_text(joined).replace(SPAN_GAP, SPAN_BREAK).replace(SPAN_JOIN, SPAN_BREAK)
+    spans = smart.split(SPAN_BREAK)
+    if len(spans) != len(texts) + 1:
+        # The text itself has a separator (a control character in the
+        # Markdown): one span at a time instead
+        return [_smart_text(SPAN_BREAK + text)[1:] for text in texts]
+    return spans[1:]
+
+
+def _latin1(text: str) -> bool:
+    if text.isascii():
+        return True
+    try:
+        text.encode("latin-1")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def _smart_text(text: str, marks: str = _MARKS) -> str:
+    # Quotes keep every length, so the tags can be put back by position;
+    # dashes and ellipses do not, and run between the tags
+    quoted = _smart_quotes(text, marks)
+    if "<" in text:
+        quoted = _keep_tags(text, quoted)
+        return _outside_tags(lambda piece: _smart_dashes(piece, marks), quoted)
+    return _smart_dashes(quoted, marks)
+
+
+class TypographyExtension(Extension):
+    """
+    Smart punctuation in prose: “curly” quotes and apostrophes, -- and
+    --- as en and em dashes, ... as an ellipsis and a non-breaking space
+    between a number and its unit (5 kg, 10 MB, 50 %). Code spans and
+    blocks, urls and the attributes of inline HTML are left alone. Every
+    prose span of a page goes through one batch of precompiled regexes
+    (see add_text_transform) rather than a loop per span.
+    """
+    name = "typography"
+
+    def extend(self, parser: MarkdownParser) -> None:
+        parser.add_text_transform(smarten)
+
+
+# Extensions by name, e.g. for configuration files and the command line;
+# builds use every one of EXTENSIONS unless told otherwise, and the
+# OPTIONAL_EXTENSIONS only when asked for, since they change the text
+EXTENSIONS = {
+    HeadingAnchorsExtension.name: HeadingAnchorsExtension,
+    TablesExtension.name: TablesExtension,
+    FootnotesExtension.name: FootnotesExtension,
+}
+OPTIONAL_EXTENSIONS = {
+    TypographyExtension.name: TypographyExtension,
+}
+
+
+def parser_with_extensions(names: List[str]) -> MarkdownParser:
+    """
+    Builds a MarkdownParser with the named bundled extensions installed.
+    """
+    extensions = []
+    for name in names:
+        extension = EXTENSIONS.get(name) or OPTIONAL_EXTENSIONS.get(name)
+        if extension is None:
+            raise ValueError(f"Unknown extension: {name}")
+        extensions.append(extension())
+    return MarkdownParser(extensions)
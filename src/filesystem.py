@@ -0,0 +1,347 @@
+import errno
+import io
+import os
+import posixpath
+import shutil
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+
+class FileStat(NamedTuple):
+    size: int
+    mtime_ns: int
+
+
+class FileSystem:
+    """
+    The file operations a build needs. Paths are "/"-separated and relative
+    to the filesystem's root (e.g. "content/index.md").
+
+    Subclasses implement the primitives; the read/write helpers are shared.
+    """
+
+    def open(self, path: str, mode: str = "r"):
+        raise NotImplementedError
+
+    def exists(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def isfile(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def isdir(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def listdir(self, path: str) -> List[str]:
+        raise NotImplementedError
+
+    def makedirs(self, path: str) -> None:
+        raise NotImplementedError
+
+    def remove(self, path: str) -> None:
+        raise NotImplementedError
+
+    def rmtree(self, path: str) -> None:
+        raise NotImplementedError
+
+    def stat(self, path: str) -> FileStat:
+        raise NotImplementedError
+
+    def detach(self, path: str) -> None:
+        """
+        Makes the directory at path one of its own if it is a link to
+        another (an atomic build's generation), by putting a copy of it in
+        the link's place, so writing there leaves the original alone.
+        """
+
+    def local_path(self, path: str) -> Optional[str]:
+        """
+        The path on the real disk, for tools that cannot work on file
+        objects (e.g. worker processes). None when there is no such path.
+        """
+        return None
+
+    def walk(self, top: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """
+        Like os.walk: yields (dir path, subdirectory names, file names).
+        """
+        # Top-down with a stack, not recursion, so depth costs nothing
+        stack = [top]
+        while stack:
+            root = stack.pop()
+            dirs, files = [], []
+            for name in sorted(self.listdir(root)):
+                (files if self.isfile(posixpath.join(root, name)) else dirs).append(name)
+            yield root, dirs, files
+            # As with os.walk, callers may prune dirs before it goes on
+            stack.extend(posixpath.join(root, name) for name in reversed(dirs))
+
+    def read_text(self, path: str) -> str:
+        with self.open(path, "r") as f:
+            return f.read()
+
+    def read_bytes(self, path: str) -> bytes:
+        with self.open(path, "rb") as f:
+            return f.read()
+
+    def write_text(self, path: str, text: str) -> None:
+        with self.open(path, "w") as f:
+            f.write(text)
+
+    def write_bytes(self, path: str, data: bytes) -> None:
+        with self.open(path, "wb") as f:
+            f.write(data)
+
+
+class DiskFileSystem(FileSystem):
+    """
+    The real disk, with relative paths resolved against root.
+
+    With a seed (dest_dir, previous_dir), files copied into dest_dir are
+    hardlinked from previous_dir instead when the copy there has the same
+    size and mtime as the source. Copies keep their source's mtime, so
+    unchanged files keep matching from one build to the next.
+    """
+
+    def __init__(self, root: str = "", seed: Optional[Tuple[str, str]] = None) -> None:
+        self.root = root
+        self.seed = seed
+        # Files hardlinked from the seed instead of copied
+        self.linked = 0
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.root, path) if self.root else path
+
+    def open(self, path: str, mode: str = "r"):
+        return open(self._path(path), mode)
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(self._path(path))
+
+    def isfile(self, path: str) -> bool:
+        return os.path.isfile(self._path(path))
+
+    def isdir(self, path: str) -> bool:
+        return os.path.isdir(self._path(path))
+
+    def listdir(self, path: str) -> List[str]:
+        return os.listdir(self._path(path))
+
+    def makedirs(self, path: str) -> None:
+        if path:
+            os.makedirs(self._path(path), exist_ok=True)
+
+    def remove(self, path: str) -> None:
+        os.remove(self._path(path))
+
+    def rmtree(self, path: str) -> None:
+        # A symlinked output (an atomic build's generation) is unlinked,
+        # never emptied: the generation it points at stays for rollback
+        if os.path.islink(self._path(path)):
+            os.remove(self._path(path))
+        else:
+            shutil.rmtree(self._path(path))
+
+    def stat(self, path: str) -> FileStat:
+        stat = os.stat(self._path(path))
+        return FileStat(stat.st_size, stat.st_mtime_ns)
+
+    def detach(self, path: str) -> None:
+        link = self._path(path)
+        if not os.path.islink(link):
+            return
+        # A real copy, not hardlinks: files are rewritten in place
+        copy = link + ".detaching"
+        if os.path.lexists(copy):
+            shutil.rmtree(copy)
+        shutil.copytree(os.path.realpath(link), copy, symlinks=True)
+        os.remove(link)
+        os.rename(copy, link)
+
+    def local_path(self, path: str) -> Optional[str]:
+        return self._path(path)
+
+    def copy_local(self, source: str, dest: str) -> None:
+        """
+        Copies a file from the real disk to dest (relative to our root).
+        """
+        target = self._path(dest)
+        if self.seed is not None:
+            seed_dest, previous_dir = self.seed
+            rel_path = os.path.relpath(dest, seed_dest)
+            if not rel_path.startswith(".."):
+                previous = os.path.join(previous_dir, rel_path)
+                try:
+                    wanted, have = os.stat(source), os.stat(previous)
+                    if wanted.st_size == have.st_size and wanted.st_mtime_ns == have.st_mtime_ns:
+                        if os.path.lexists(target):
+                            os.remove(target)
+                        os.link(previous, target)
+                        self.linked += 1
+                        return
+                except OSError:
+                    # No previous copy, or no hardlinks here: copy instead
+                    pass
+            # Never write through a link: that would change the previous build too
+            if os.path.lexists(target):
+                os.remove(target)
+        shutil.copy2(source, target)
+
+    def walk(self, top: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+        for root, dirs, files in os.walk(self._path(top)):
+            # Hand back paths relative to our root, like every other method takes
+            yield os.path.relpath(root, self.root) if self.root else root, dirs, files
+
+
+class _MemoryWriter(io.BytesIO):
+    # Stores its contents in the filesystem when closed, like a real file
+    def __init__(self, fs: "MemoryFileSystem", path: str) -> None:
+        super().__init__()
+        self.fs = fs
+        self.path = path
+
+    def close(self) -> None:
+        if not self.closed:
+            self.fs._store(self.path, self.getvalue())
+        super().close()
+
+
+def _normalize(path: str) -> str:
+    path = posixpath.normpath(path.replace(os.sep, "/")).lstrip("/")
+    return "" if path == "." else path
+
+
+class MemoryFileSystem(FileSystem):
+    """
+    A filesystem held in a dict, for builds without any disk I/O:
+
+        fs = MemoryFileSystem({"content/index.md": "# Hi", "template.html": "..."})
+
+    Modification times are a counter bumped on every write, so they
+    change on every write even within the same clock tick.
+    """
+
+    def __init__(self, files: Optional[Dict[str, object]] = None) -> None:
+        self.files: Dict[str, bytes] = {}
+        self.mtimes: Dict[str, int] = {}
+        # dir -> names of its entries; "" is the root
+        self.children: Dict[str, Set[str]] = {"": set()}
+        self.clock = 0
+        for path, content in (files or {}).items():
+            if isinstance(content, str):
+                content = content.encode()
+            self._store(_normalize(path), content)
+
+    def _store(self, path: str, data: bytes) -> None:
+        if path in self.children:
+            raise IsADirectoryError(errno.EISDIR, "Is a directory", path)
+        parent, name = posixpath.split(path)
+        self.makedirs(parent)
+        self.children[parent].add(name)
+        self.files[path] = data
+        self.clock += 1
+        self.mtimes[path] = self.clock
+
+    def open(self, path: str, mode: str = "r"):
+        path = _normalize(path)
+        if "w" in mode:
+            parent = posixpath.dirname(path)
+            if parent not in self.children:
+                raise FileNotFoundError(errno.ENOENT, "No such file or directory", path)
+            writer = _MemoryWriter(self, path)
+            return writer if "b" in mode else io.TextIOWrapper(writer, encoding="utf-8")
+        if path not in self.files:
+            raise FileNotFoundError(errno.ENOENT, "No such file or directory", path)
+        reader = io.BytesIO(self.files[path])
+        return reader if "b" in mode else io.TextIOWrapper(reader, encoding="utf-8")
+
+    def exists(self, path: str) -> bool:
+        path = _normalize(path)
+        return path in self.files or path in self.children
+
+    def isfile(self, path: str) -> bool:
+        return _normalize(path) in self.files
+
+    def isdir(self, path: str) -> bool:
+        return _normalize(path) in self.children
+
+    def listdir(self, path: str) -> List[str]:
+        path = _normalize(path)
+        if path not in self.children:
+            raise FileNotFoundError(errno.ENOENT, "No such file or directory", path)
+        return sorted(self.children[path])
+
+    def makedirs(self, path: str) -> None:
+        path = _normalize(path)
+        # Up to the nearest existing directory, linking each new one into
+        # its parent on the way
+        name = None
+        while path not in self.children:
+            if path in self.files:
+                raise FileExistsError(errno.EEXIST, "File exists", path)
+            self.children[path] = {name} if name is not None else set()
+            path, name = posixpath.split(path)
+        if name is not None:
+            self.children[path].add(name)
+
+    def remove(self, path: str) -> None:
+        path = _normalize(path)
+        if path not in self.files:
+            raise FileNotFoundError(errno.ENOENT, "No such file or directory", path)
+        del self.files[path]
+        del self.mtimes[path]
+        parent, name = posixpath.split(path)
+        self.children[parent].discard(name)
+
+    def rmtree(self, path: str) -> None:
+        path = _normalize(path)
+        if path not in self.children:
+            raise FileNotFoundError(errno.ENOENT, "No such file or directory", path)
+        # Files first, then the directories, deepest last in, first out
+        dirs = []
+        for root, _dirs, files in self.walk(path):
+            dirs.append(root)
+            for name in files:
+                self.remove(posixpath.join(root, name) if root else name)
+        for root in reversed(dirs):
+            if root:
+                del self.children[root]
+                parent, name = posixpath.split(root)
+                self.children[parent].discard(name)
+            else:
+                self.children[root].clear()
+
+    def stat(self, path: str) -> FileStat:
+        path = _normalize(path)
+        if path not in self.files:
+            raise FileNotFoundError(errno.ENOENT, "No such file or directory", path)
+        return FileStat(len(self.files[path]), self.mtimes[path])
+
+
+# The default for every function that takes an optional filesystem
+DISK = DiskFileSystem()
+
+
+def copy_file(fs: FileSystem, source: str, out: FileSystem, dest: str) -> None:
+    """
+    Copies a file between two (possibly different) filesystems,
+    letting the OS do it when both ends are on disk.
+    """
+    local_source = fs.local_path(source)
+    if local_source is not None and isinstance(out, DiskFileSystem):
+        out.copy_local(local_source, dest)
+    else:
+        out.write_bytes(dest, fs.read_bytes(source))
+
+
+def copy_tree(fs: FileSystem, source_dir: str, out: FileSystem, dest_dir: str) -> int:
+    """
+    Copies a directory tree between filesystems. Returns the number of files copied.
+    """
+    copied = 0
+    for root, _dirs, files in fs.walk(source_dir):
+        target = os.path.join(dest_dir, os.path.relpath(root, source_dir))
+        out.makedirs(target)
+        for filename in files:
+            copy_file(fs, os.path.join(root, filename), out, os.path.join(target, filename))
+            copied += 1
+    return copied
@@ -0,0 +1,91 @@
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+FENCE = "---"
+
+_FIELD = re.compile(r"^([A-Za-z_][\w-]*)\s*:\s*(.*)$")
+
+
+class FieldError(ValueError):
+    """
+    A front matter field whose value makes no sense, e.g. `draft: maybe`.
+    """
+
+    def __init__(self, field: str, message: str) -> None:
+        super().__init__(f"{field}: {message}")
+        self.field = field
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def parse_front_matter(lines: Iterable[str]) -> Tuple[Dict[str, str], int]:
+    """
+    Reads a page's optional front matter from its first lines:
+
+        ---
+        layout: blog
+        title: "Hello"
+        ---
+        # Hello
+
+    Returns the fields and how many lines (fences included) they span, or
+    ({}, 0) for a page without front matter. Only flat `key: value` lines
+    are allowed between the fences; anything else means there is no front
+    matter (a leading `---` stays Markdown). Stops at the closing fence,
+    so the rest of a file never needs to be read.
+    """
+    lines = iter(lines)
+    if next(lines, "").rstrip() != FENCE:
+        return {}, 0
+    fields: Dict[str, str] = {}
+    count = 1
+    for line in lines:
+        count += 1
+        line = line.rstrip()
+        if line == FENCE:
+            return fields, count
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        match = _FIELD.match(line)
+        if match is None:
+            return {}, 0
+        fields[match.group(1)] = _unquote(match.group(2).strip())
+    # No closing fence
+    return {}, 0
+
+
+def field_line(lines: Iterable[str], field: str) -> Optional[int]:
+    """
+    The 1-based line of a field in the front matter at the start of
+    lines, to point at when its value is wrong; None if there is none.
+    """
+    lines = iter(lines)
+    if next(lines, "").rstrip() != FENCE:
+        return None
+    for number, line in enumerate(lines, 2):
+        line = line.rstrip()
+        if line == FENCE:
+            break
+        match = _FIELD.match(line)
+        if match is not None and match.group(1) == field:
+            return number
+    return None
+
+
+def split_front_matter(markdown: str) -> Tuple[Dict[str, str], str]:
+    """
+    Splits a page's front matter (see parse_front_matter) from its Markdown.
+    The body keeps one empty line per front matter line, so line numbers
+    in Markdown errors still match the file.
+    """
+    if not markdown.startswith(FENCE):
+        return {}, markdown
+    lines = markdown.split("\n")
+    fields, count = parse_front_matter(lines)
+    if not count:
+        return {}, markdown
+    return fields, "\n" * count + "\n".join(lines[count:])
@@ -1,69 +1,707 @@
+import functools
+import hashlib
+import json
 import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 
-from markdown_blocks import markdown_to_html_node, extract_title
+from events import EventLog
+from filesystem import DISK, FileSystem
+from frontmatter import split_front_matter
+from layouts import Layouts
+from mapped_markdown import MappedMarkdown, mappable_path
+from markdown_blocks import markdown_to_html_node, markdown_lines_to_html, markdown_lines_to_html_node, \
+    extract_title, MarkdownParser
+from page_diff import block_hash, page_hash
+from page_errors import PageError
+from parse_cache import ParseCache, ParseMemo, Parsed
+from routes import RouteTable, url_slots
+from search_index import SearchIndex, page_url
+from sharding import select_shard, Shard
+from toc import Outline
 
 
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath: str):
+class PageIndex:
+    """
+    Collects one entry (url, title, source) per generated page and writes
+    them to a JSON file. With include_outline, every entry also carries
+    the page's headings as recorded while its tree was built.
+    """
+
+    def __init__(self, dest_root: str, basepath: str = "/", include_outline: bool = False) -> None:
+        self.dest_root = dest_root
+        self.basepath = basepath
+        self.include_outline = include_outline
+        self.pages: List[Dict[str, object]] = []
+
+    def add(self, source: str, dest_path: str, title: str, outline: Optional[Outline]) -> None:
+        url = page_url(self.dest_root, dest_path, self.basepath)
+        entry: Dict[str, object] = {"url": url, "title": title, "source": source}
+        if self.include_outline and outline is not None:
+            entry["outline"] = outline.to_list()
+        self.pages.append(entry)
+
+    def write(self, path: str, fs: FileSystem = DISK) -> None:
+        self.pages.sort(key=lambda page: page["url"])
+        with fs.open(path, "w") as f:
+            json.dump({"pages": self.pages}, f, indent=2)
+
+
+class PageResult:
+    """
+    What building one page produced: where it came from and went,
+    its url and title, the final HTML and outline (None if they were not
+    kept), its size in bytes, the hash of its output and how long it took,
+    and the hashes of its top-level blocks if they were asked for.
+    """
+    # One per page, a million of them for a big site: no per-result __dict__
+    __slots__ = ("source", "dest_path", "url", "title", "html", "outline", "seconds", "size", "blocks", "digest")
+
+    def __init__(
+            self,
+            source: str,
+            dest_path: str,
+            url: str,
+            title: str,
+            html: Optional[str],
+            outline: Optional[Outline] = None,
+            seconds: float = 0.0,
+            size: int = 0,
+            blocks: Optional[List[str]] = None,
+            digest: Optional[str] = None
+    ) -> None:
+        self.source = source
+        self.dest_path = dest_path
+        self.url = url
+        self.title = title
+        self.html = html
+        self.outline = outline
+        self.seconds = seconds
+        self.size = size
+        self.blocks = blocks
+        self.digest = digest
+
+    def __repr__(self) -> str:
+        return f"PageResult({self.source}, {self.url}, {self.title})"
+
+
+def collect_pages(dir_path_content: str, dest_dir_path: str, fs: FileSystem = DISK) -> List[Tuple[str, str]]:
+    """
+    Every Markdown file under the content directory, paired with the
+    HTML path it is generated to in the plain url layout, e.g.
+    (content/blog/index.md, docs/blog/index.html). See route_pages for
+    pretty urls and slugs.
+    """
+    pages = []
+    # A stack of the directories being listed, rather than recursion, so
+    # any depth works; pages come in the same order: sorted, depth first
+    stack = [(dir_path_content, dest_dir_path, iter(sorted(fs.listdir(dir_path_content))))]
+    while stack:
+        from_dir, to_dir, entries = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
+        from_path = os.path.join(from_dir, entry)
+        to_path = os.path.join(to_dir, entry)
+        if not fs.isfile(from_path):
+            stack.append((from_path, to_path, iter(sorted(fs.listdir(from_path)))))
+        elif from_path.endswith(".md"):
+            # e.g., content/blog/index.md -> public/blog/index.html
+            pages.append((from_path, to_path[:-len(".md")] + ".html"))
+    return pages
+
+
+def generate_pages_recursive(
+        dir_path_content,
+        template_path,
+        dest_dir_path,
+        basepath: str,
+        parser: Optional[MarkdownParser] = None,
+        page_index: Optional[PageIndex] = None,
+        assets: Optional[Dict[str, str]] = None,
+        search_index: Optional[SearchIndex] = None,
+        shard: Optional[Shard] = None,
+        **options
+) -> List[PageResult]:
     """
     Crawls the content directory and generates HTML pages for every Markdown file found.
     Preserves the directory structure in the destination.
+    With shard=(i, N), only the pages of shard i of N (see shard_of).
+    Takes the same keyword options as generate_pages.
     """
-    for entry in os.listdir(dir_path_content):
-        # Construct full paths
-        from_path = os.path.join(dir_path_content, entry)
-        to_path = os.path.join(dest_dir_path, entry)
-
-        # Logic Gate: File vs Directory
-        if os.path.isfile(from_path):
-            # We only care about markdown files
-            if from_path.endswith(".md"):
-                # Calculate the destination HTML path
-                # e.g., content/blog/index.md -> public/blog/index.html
-                dest_html_path = to_path.replace(".md", ".html")
-
-                # Generate the page using our existing logic (refactored or called directly)
-                #generate_page(from_path, template_path, dest_html_path)
-                generate_page(from_path, template_path, dest_html_path, basepath)
+    options.setdefault("dest_root", dest_dir_path)
+    pages = collect_pages(dir_path_content, dest_dir_path, options.get("fs", DISK))
+    if shard is not None:
+        pages = select_shard(pages, dir_path_content, shard)
+    return generate_pages(pages, template_path, basepath, parser, page_index, assets, search_index, **options)
+
+
+def generate_pages(
+        pages: List[Tuple[str, str]],
+        template_path: str,
+        basepath: str,
+        parser: Optional[MarkdownParser] = None,
+        page_index: Optional[PageIndex] = None,
+        assets: Optional[Dict[str, str]] = None,
+        search_index: Optional[SearchIndex] = None,
+        *,
+        fs: FileSystem = DISK,
+        out: FileSystem = DISK,
+        template_content: Optional[str] = None,
+        layouts: Optional[Layouts] = None,
+        events: Optional[EventLog] = None,
+        dest_root: Optional[str] = None,
+        errors: Optional[List[PageError]] = None,
+        jobs: Optional[int] = None,
+        parser_factory: Optional[Callable[[], MarkdownParser]] = None,
+        parse_cache: Optional[ParseCache] = None,
+        block_hashes: bool = False,
+        parse_memo: Optional[ParseMemo] = None,
+        placeholders: Optional[Dict[str, Dict[str, str]]] = None,
+        routes: Optional[RouteTable] = None,
+        keep_html: bool = True
+) -> List[PageResult]:
+    """
+    Generates the given (source, dest) pages and returns their results.
+    One parser (with its extensions) is shared by every page,
+    and the template is read only once. With layouts, every page gets the
+    layout its front matter or directory selects, each compiled once.
+
+    With an errors list, a page that fails is recorded there and the
+    others are still generated; its previous output is left as it was.
+    Without one, the first failure is raised.
+
+    With jobs > 1 and a parser_factory (a picklable callable that builds
+    the parser), pages are rendered in that many worker processes. Files
+    are still read and written here, so any filesystem works.
+
+    With a parse_cache, pages whose source did not change since it last
+    saw them are not parsed at all (see ParseCache). With block_hashes,
+    every result carries the hashes of its page's blocks (see page_diff).
+    With a parse_memo, pages with the same Markdown as one parsed before
+    (in this call or another one given the same memo) are not parsed again.
+
+    placeholders maps a page's dest path to extra placeholders of its
+    template and their values, e.g. {"{{ Lang }}": "fr"}; values are
+    final HTML, their urls are left as they are.
+
+    Every root-relative href and src of a page and its template is
+    resolved through routes (see RouteTable), by default a table of
+    just the basepath and the assets manifest.
+
+    Without keep_html, results do not hold on to the pages' HTML (nor
+    their outlines) once they are written: page.html is None, and
+    page.digest still tells versions apart. What a call keeps per page
+    is then a few short strings.
+    """
+    if template_content is None and layouts is None:
+        template_content = fs.read_text(template_path)
+    if routes is None:
+        routes = RouteTable(dest_root if dest_root is not None else "", basepath, assets)
+    if jobs is not None and jobs > 1 and parser_factory is not None and len(pages) > 1:
+        return _generate_pages_parallel(
+            pages, template_path, template_content, layouts, basepath, page_index, routes, search_index,
+            fs, out, events, dest_root, errors, jobs, parser_factory, parse_cache, block_hashes, parse_memo,
+            placeholders, keep_html
+        )
+
+    results = []
+    for from_path, dest_path in pages:
+        try:
+            results.append(generate_page(
+                from_path, template_path, dest_path, basepath, parser, page_index, assets, search_index,
+                fs=fs, out=out, template_content=template_content, layouts=layouts, events=events,
+                dest_root=dest_root, parse_cache=parse_cache, block_hashes=block_hashes, parse_memo=parse_memo,
+                placeholders=placeholders.get(dest_path) if placeholders is not None else None, routes=routes,
+                keep_html=keep_html
+            ))
+        except Exception as e:
+            _page_failed(from_path, e, errors, search_index, events)
+    return results
+
+
+def _page_failed(
+        from_path: str,
+        error: Exception,
+        errors: Optional[List[PageError]],
+        search_index: Optional[SearchIndex],
+        events: Optional[EventLog]
+) -> None:
+    if errors is None:
+        error.add_note(f"while generating {from_path}")
+        raise error
+    page_error = PageError.from_exception(from_path, error)
+    errors.append(page_error)
+    # Its old output stays, so its old search entry stays too
+    if search_index is not None:
+        search_index.keep(from_path)
+    if events is not None:
+        events.emit("page_error", **page_error.to_dict())
+        events.metrics.inc("page_errors_total", help="Pages that failed to build.")
+
+
+def render_page(
+        markdown_content: Union[str, MappedMarkdown],
+        template_content: str,
+        basepath: str,
+        parser: Optional[MarkdownParser] = None,
+        assets: Optional[Dict[str, str]] = None,
+        outline: Optional[Outline] = None,
+        text_sink: Optional[List[str]] = None,
+        routes: Optional[RouteTable] = None,
+        placeholders: Optional[Dict[str, str]] = None
+) -> Tuple[str, str]:
+    """
+    Turns Markdown into a finished page, without touching any files.
+    Links resolve through routes if given, else to the basepath and assets;
+    placeholders fills more of the template (e.g. {{ Lang }}).
+    Returns (title, html).
+    """
+    title, html_content = parse_page(markdown_content, parser, outline, text_sink)
+    if routes is None:
+        routes = RouteTable(basepath=basepath, assets=assets)
+    return title, _fill_template(title, url_slots(html_content), template_content, routes, outline, placeholders)
+
+
+def parse_page(
+        markdown_content: Union[str, MappedMarkdown],
+        parser: Optional[MarkdownParser] = None,
+        outline: Optional[Outline] = None,
+        text_sink: Optional[List[str]] = None,
+        blocks: Optional[List[str]] = None
+) -> Tuple[str, str]:
+    """
+    The part of rendering that depends on the Markdown alone (and so can
+    be cached): (title, HTML of the content), before the template.
+    With a blocks list, the hash of every top-level block is added to it.
+    """
+    if isinstance(markdown_content, MappedMarkdown):
+        if blocks is None:
+            html_content = markdown_lines_to_html(markdown_content.lines(), parser, outline, text_sink)
+            return markdown_content.title(), html_content
+        node = markdown_lines_to_html_node(markdown_content.lines(), parser, outline, text_sink, render_blocks=True)
+        title = markdown_content.title()
+    else:
+        node = markdown_to_html_node(markdown_content, parser, outline, text_sink)
+
+        # Extract the Title
+        title = extract_title(markdown_content)
+    if blocks is None:
+        return title, node.to_html()
+    # The same HTML, one block at a time
+    parts = [child.to_html() for child in node.children]
+    blocks.extend(block_hash(part) for part in parts)
+    return title, f"<{node.tag}>{''.join(parts)}</{node.tag}>"
+
+
+# {{ Title }}, {{ Content }} and the like
+_PLACEHOLDER = re.compile(r"\{\{ \w+ \}\}")
+
+# What the pieces of a compiled template are
+_LITERAL, _URL, _FILL = 0, 1, 2
+
+
+@functools.lru_cache(maxsize=64)
+def compile_template(template_content: str) -> Tuple[Tuple[int, str], ...]:
+    """
+    A template split once into its pieces: literal HTML, root-relative
+    urls (resolved per route table) and placeholders, so a page is filled
+    in with one join, without a pass over the finished page.
+    """
+    pieces = []
+    slots = url_slots(template_content)
+    for index, slot in enumerate(slots):
+        if index % 2:
+            pieces.append((_URL, slot))
+            continue
+        pos = 0
+        for match in _PLACEHOLDER.finditer(slot):
+            pieces.append((_LITERAL, slot[pos:match.start()]))
+            pieces.append((_FILL, match.group()))
+            pos = match.end()
+        pieces.append((_LITERAL, slot[pos:]))
+    return tuple(piece for piece in pieces if piece[1])
+
+
+def _fill_template(
+        title: str,
+        content_slots: List[str],
+        template_content: str,
+        routes: RouteTable,
+        outline: Optional[Outline],
+        placeholders: Optional[Dict[str, str]] = None
+) -> str:
+    # Placeholders get their values as they are; the urls of the content
+    # and of the template go through the route table (e.g. /index.css to
+    # {basepath}index.<hash>.css, /blog/post.md to the post's url)
+    values = {"{{ Title }}": title, "{{ Content }}": routes.resolve_slots(content_slots)}
+    if outline is not None:
+        values["{{ TOC }}"] = outline.to_html()
+    if placeholders:
+        values.update(placeholders)
+    resolve = routes.resolve
+    parts = []
+    for kind, text in compile_template(template_content):
+        if kind == _LITERAL:
+            parts.append(text)
+        elif kind == _URL:
+            parts.append(resolve(text))
+        else:
+            parts.append(values.get(text, text))
+    return "".join(parts)
+
+
+def _page_template(
+        from_path: str,
+        meta: Dict[str, str],
+        template_path: str,
+        template_content: Optional[str],
+        layouts: Optional[Layouts]
+) -> Tuple[str, str]:
+    """
+    Which template a page is rendered with: (template path, template).
+    """
+    if layouts is not None:
+        path = layouts.path_for(from_path, meta)
+        return path, layouts.compile(path)
+    return template_path, template_content
+
+
+def _page_needs(
+        from_path: str,
+        markdown_content: Union[str, MappedMarkdown],
+        template_content: str,
+        page_index: Optional[PageIndex],
+        search_index: Optional[SearchIndex],
+        parse_cache: Optional[ParseCache] = None,
+        parse_memo: Optional[ParseMemo] = None
+) -> Tuple[bool, Optional[str], bool]:
+    """
+    What to collect while parsing a page: (outline?, content hash, span texts?).
+    """
+    # Headings are only recorded when someone will read the outline
+    want_outline = "{{ TOC }}" in template_content or (page_index is not None and page_index.include_outline)
+    # The search index only needs the span texts of pages that changed
+    content_hash = None
+    want_text = False
+    if search_index is not None or parse_cache is not None or parse_memo is not None:
+        if isinstance(markdown_content, MappedMarkdown):
+            content_hash = markdown_content.content_hash()
         else:
-            # Recursion Step: It's a directory
-            # Ensure the destination directory exists
-            os.makedirs(to_path, exist_ok=True)
-            #generate_pages_recursive(from_path, template_path, to_path)
-            generate_pages_recursive(from_path, template_path, to_path, basepath)
+            content_hash = hashlib.sha256(markdown_content.encode()).hexdigest()
+    if search_index is not None:
+        want_text = search_index.needs_text(from_path, content_hash)
+    return want_outline, content_hash, want_text
+
+
+def generate_page(
+        from_path: str,
+        template_path: str,
+        dest_path: str,
+        basepath: str,
+        parser: Optional[MarkdownParser] = None,
+        page_index: Optional[PageIndex] = None,
+        assets: Optional[Dict[str, str]] = None,
+        search_index: Optional[SearchIndex] = None,
+        *,
+        fs: FileSystem = DISK,
+        out: FileSystem = DISK,
+        template_content: Optional[str] = None,
+        layouts: Optional[Layouts] = None,
+        events: Optional[EventLog] = None,
+        dest_root: Optional[str] = None,
+        parse_cache: Optional[ParseCache] = None,
+        block_hashes: bool = False,
+        parse_memo: Optional[ParseMemo] = None,
+        placeholders: Optional[Dict[str, str]] = None,
+        routes: Optional[RouteTable] = None,
+        keep_html: bool = True
+) -> PageResult:
+    """
+    Renders one Markdown file (read from fs) through the template
+    and writes the page (to out), reporting it to events if given.
+    """
+    if routes is None:
+        routes = RouteTable(dest_root if dest_root is not None else "", basepath, assets)
+    started = time.perf_counter()
 
+    # 1. Read the Markdown file; big ones are mapped instead (see MappedMarkdown)
+    source = None
+    local_path = mappable_path(fs, from_path)
+    if local_path is not None:
+        source = MappedMarkdown(local_path)
+        meta = source.meta
+    else:
+        with fs.open(from_path, "r") as f:
+            markdown_content = f.read()
+        meta, markdown_body = split_front_matter(markdown_content)
 
-def generate_page(from_path: str, template_path: str, dest_path: str, basepath: str) -> None:
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
+    try:
+        # 2. Read the Template file, unless the caller already did
+        # (or pick the page's layout)
+        if template_content is None and layouts is None:
+            with fs.open(template_path, "r") as f:
+                template_content = f.read()
+        _path, template_content = _page_template(from_path, meta, template_path, template_content, layouts)
+
+        # 3. Convert Markdown to HTML (4. title, 5. placeholders: see render_page)
+        want_outline, content_hash, want_text = _page_needs(
+            from_path, source if source is not None else markdown_content, template_content,
+            page_index, search_index, parse_cache, parse_memo
+        )
+        parsed = _cached_parse(parse_cache, parse_memo, content_hash, want_outline, want_text, block_hashes)
+        if parsed is None:
+            outline = Outline() if want_outline else None
+            text_sink = [] if want_text else None
+            blocks = [] if block_hashes else None
+            title, html_content = parse_page(
+                source if source is not None else markdown_body, parser, outline, text_sink, blocks
+            )
+            content_slots = url_slots(html_content)
+            _store_parse(parse_cache, parse_memo, content_hash, (title, content_slots, outline, text_sink, blocks))
+        else:
+            title, content_slots, outline, text_sink, blocks = parsed
+        full_html = _fill_template(title, content_slots, template_content, routes, outline, placeholders)
+    finally:
+        if source is not None:
+            source.close()
+
+    return _finish_page(
+        from_path, dest_path, basepath, title, full_html, outline, text_sink, content_hash,
+        page_index, search_index, out, events, dest_root, time.perf_counter() - started, blocks, keep_html
+    )
 
-    # 1. Read the Markdown file
-    with open(from_path, "r") as f:
-        markdown_content = f.read()
 
-    # 2. Read the Template file
-    with open(template_path, "r") as f:
-        template_content = f.read()
+def _cached_parse(
+        parse_cache: Optional[ParseCache],
+        parse_memo: Optional[ParseMemo],
+        content_hash: Optional[str],
+        want_outline: bool,
+        want_text: bool,
+        want_blocks: bool
+) -> Optional[Parsed]:
+    # This build's parses first, then earlier builds'
+    if parse_memo is not None:
+        parsed = parse_memo.get(content_hash, want_outline, want_text, want_blocks)
+        if parsed is not None:
+            return parsed
+    if parse_cache is None:
+        return None
+    parsed = parse_cache.get(content_hash, want_outline, want_text, want_blocks)
+    if parsed is not None and parse_memo is not None:
+        parse_memo.put(content_hash, parsed)
+    return parsed
 
-    # 3. Convert Markdown to HTML
-    node = markdown_to_html_node(markdown_content)
-    html_content = node.to_html()
 
-    # 4. Extract the Title
-    title = extract_title(markdown_content)
+def _store_parse(
+        parse_cache: Optional[ParseCache],
+        parse_memo: Optional[ParseMemo],
+        content_hash: Optional[str],
+        parsed: Parsed
+) -> None:
+    if parse_cache is not None:
+        parse_cache.put(content_hash, *parsed)
+    if parse_memo is not None:
+        parse_memo.put(content_hash, parsed)
 
-    # 5. Replace Placeholders
-    full_html = template_content.replace("{{ Title }}", title)
-    full_html = full_html.replace("{{ Content }}", html_content)
 
-    # Logic to fix links for GitHub Pages deployment
-    # We replace absolute paths like href="/..." with href="{basepath}..."
-    full_html = full_html.replace('href="/', f'href="{basepath}')
-    full_html = full_html.replace('src="/', f'src="{basepath}')
+def _finish_page(
+        from_path: str,
+        dest_path: str,
+        basepath: str,
+        title: str,
+        full_html: str,
+        outline: Optional[Outline],
+        text_sink: Optional[List[str]],
+        content_hash: Optional[str],
+        page_index: Optional[PageIndex],
+        search_index: Optional[SearchIndex],
+        out: FileSystem,
+        events: Optional[EventLog],
+        dest_root: Optional[str],
+        seconds: float,
+        blocks: Optional[List[str]] = None,
+        keep_html: bool = True
+) -> PageResult:
+    started = time.perf_counter()
+    if page_index is not None:
+        page_index.add(from_path, dest_path, title, outline)
+    if search_index is not None:
+        search_index.add_page(from_path, dest_path, title, content_hash, text_sink)
 
     # 6. Ensure the destination directory exists
     dest_dir_path = os.path.dirname(dest_path)
     if dest_dir_path != "":
-        os.makedirs(dest_dir_path, exist_ok=True)
+        out.makedirs(dest_dir_path)
 
     # 7. Write the final HTML file
-    with open(dest_path, "w") as f:
-        f.write(full_html)
\ No newline at end of file
+    data = full_html.encode()
+    with out.open(dest_path, "wb") as f:
+        f.write(data)
+
+    url = page_url(dest_root if dest_root is not None else os.path.dirname(dest_path), dest_path, basepath)
+    seconds += time.perf_counter() - started
+    if events is not None:
+        events.emit("page", source=from_path, dest=dest_path, url=url, bytes=len(data), ms=round(seconds * 1000, 3))
+        events.metrics.inc("pages_total", help="Pages generated.")
+        events.metrics.inc("page_bytes_total", len(data), help="Bytes of HTML written.")
+        events.metrics.observe("page_seconds", seconds, help="Time to read, render and write one page.")
+    return PageResult(
+        from_path, dest_path, url, title, full_html if keep_html else None, outline if keep_html else None,
+        seconds, len(data), blocks, page_hash(data)
+    )
+
+
+# --- Parallel rendering ----------------------------------------------------
+
+# Set up once per worker process by _init_render_worker
+_worker: Dict[str, object] = {}
+
+# Pages read and sent to the workers at a time (per worker process): the
+# pool is fed one window while the one before it is written, so a build
+# holds a few windows of Markdown and HTML at most, however big the site
+PARALLEL_WINDOW = 64
+
+
+def _init_render_worker(parser_factory: Callable[[], MarkdownParser]) -> None:
+    _worker.update(parser=parser_factory())
+
+
+def _render_in_worker(task: Tuple[Optional[str], Optional[str], bool, bool, bool]):
+    """
+    Parses one page in a worker, from its Markdown or, for a big file,
+    by mapping it. Returns (title, content slots, outline, text_sink,
+    blocks, seconds), or the exception, so one bad page does not stop
+    the pool. The template is filled in by the caller, which has the
+    templates and the route table.
+    """
+    started = time.perf_counter()
+    markdown_body, mapped_path, want_outline, want_text, want_blocks = task
+    outline = Outline() if want_outline else None
+    text_sink = [] if want_text else None
+    blocks = [] if want_blocks else None
+    try:
+        if mapped_path is not None:
+            with MappedMarkdown(mapped_path) as source:
+                title, html_content = parse_page(source, _worker["parser"], outline, text_sink, blocks)
+        else:
+            title, html_content = parse_page(markdown_body, _worker["parser"], outline, text_sink, blocks)
+        content_slots = url_slots(html_content)
+    except Exception as e:
+        return e
+    return title, content_slots, outline, text_sink, blocks, time.perf_counter() - started
+
+
+def _generate_pages_parallel(
+        pages: List[Tuple[str, str]],
+        template_path: str,
+        template_content: Optional[str],
+        layouts: Optional[Layouts],
+        basepath: str,
+        page_index: Optional[PageIndex],
+        routes: RouteTable,
+        search_index: Optional[SearchIndex],
+        fs: FileSystem,
+        out: FileSystem,
+        events: Optional[EventLog],
+        dest_root: Optional[str],
+        errors: Optional[List[PageError]],
+        jobs: int,
+        parser_factory: Callable[[], MarkdownParser],
+        parse_cache: Optional[ParseCache],
+        block_hashes: bool,
+        parse_memo: Optional[ParseMemo],
+        placeholders: Optional[Dict[str, Dict[str, str]]],
+        keep_html: bool = True
+) -> List[PageResult]:
+    # Reading (and compiling layouts) happens here, so workers never
+    # need to see the filesystem; big local files are only mapped here
+    # for their front matter and hash, and the worker maps them again
+    # rather than being sent their text. Pages found in the parse cache
+    # (or memo) never go to a worker, nor do pages with the same Markdown
+    # as one already sent: they wait for its result.
+    # (content hash, outline?) -> (texts?, blocks?) of the page sent
+    queued: Dict[Tuple[str, bool], Tuple[bool, bool]] = {}
+    failed: Dict[Tuple[str, bool], Exception] = {}
+
+    def send(window: List[Tuple[str, str]]) -> Tuple[list, Iterator]:
+        tasks, todo = [], []
+        for from_path, dest_path in window:
+            try:
+                mapped_path = mappable_path(fs, from_path)
+                if mapped_path is not None:
+                    with MappedMarkdown(mapped_path) as source:
+                        _path, template = _page_template(
+                            from_path, source.meta, template_path, template_content, layouts
+                        )
+                        want_outline, content_hash, want_text = _page_needs(
+                            from_path, source, template, page_index, search_index, parse_cache, parse_memo
+                        )
+                    markdown_body = None
+                else:
+                    with fs.open(from_path, "r") as f:
+                        markdown_content = f.read()
+                    meta, markdown_body = split_front_matter(markdown_content)
+                    _path, template = _page_template(from_path, meta, template_path, template_content, layouts)
+                    want_outline, content_hash, want_text = _page_needs(
+                        from_path, markdown_content, template, page_index, search_index, parse_cache, parse_memo
+                    )
+            except Exception as e:
+                _page_failed(from_path, e, errors, search_index, events)
+                continue
+            page_placeholders = placeholders.get(dest_path) if placeholders is not None else None
+            parsed = _cached_parse(parse_cache, parse_memo, content_hash, want_outline, want_text, block_hashes)
+            waits = False
+            if parsed is None and parse_memo is not None:
+                sent = queued.get((content_hash, want_outline))
+                waits = sent is not None and sent[0] >= want_text and sent[1] >= block_hashes
+                if not waits:
+                    queued[(content_hash, want_outline)] = (want_text, block_hashes)
+            if parsed is None and not waits:
+                tasks.append((markdown_body, mapped_path, want_outline, want_text, block_hashes))
+            todo.append((from_path, dest_path, content_hash, template, parsed, waits, want_outline, page_placeholders))
+        return todo, pool.map(_render_in_worker, tasks, chunksize=max(1, len(tasks) // (jobs * 4)))
+
+    def finish(todo: list, rendered_pages: Iterator) -> None:
+        for from_path, dest_path, content_hash, template, parsed, waits, want_outline, page_placeholders in todo:
+            if waits:
+                # The page it shares its Markdown with came first
+                parsed = parse_memo.get(content_hash, want_outline, False)
+                if parsed is None:
+                    _page_failed(from_path, failed[(content_hash, want_outline)], errors, search_index, events)
+                    continue
+            seconds = 0.0
+            if parsed is None:
+                rendered = next(rendered_pages)
+                if isinstance(rendered, Exception):
+                    failed[(content_hash, want_outline)] = rendered
+                    _page_failed(from_path, rendered, errors, search_index, events)
+                    continue
+                parsed, seconds = rendered[:5], rendered[5]
+                _store_parse(parse_cache, parse_memo, content_hash, parsed)
+            started = time.perf_counter()
+            title, content_slots, outline, text_sink, blocks = parsed
+            full_html = _fill_template(title, content_slots, template, routes, outline, page_placeholders)
+            seconds += time.perf_counter() - started
+            results.append(_finish_page(
+                from_path, dest_path, basepath, title, full_html, outline, text_sink, content_hash,
+                page_index, search_index, out, events, dest_root, seconds, blocks, keep_html
+            ))
+
+    results: List[PageResult] = []
+    window = PARALLEL_WINDOW * jobs
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_render_worker, initargs=(parser_factory,)) as pool:
+        # Each window is sent before the one before it is written, so
+        # the workers are never left waiting on the files
+        pending = None
+        for start in range(0, len(pages), window):
+            sent = send(pages[start:start + window])
+            if pending is not None:
+                finish(*pending)
+            pending = sent
+        if pending is not None:
+            finish(*pending)
+    return results
@@ -0,0 +1,140 @@
+import os
+import shutil
+from typing import List, Optional, Tuple
+
+SWITCH_MODES = ("symlink", "rename")
+
+
+class Generations:
+    """
+    Numbered builds of an output directory, kept next to it in
+    <dest>.generations/ so a new build never touches the one being served:
+
+      docs -> docs.generations/7      ("symlink": dest is a symlink)
+      docs.generations/6, 5, ...      older generations, for rollback
+      docs.generations/8.staging      the build in progress
+
+    publish() switches dest to a new generation. In "symlink" mode that is
+    one atomic rename of a symlink over dest. In "rename" mode (for hosts
+    that do not follow symlinks) dest is a real directory, swapped out with
+    two renames; dest is briefly missing in between.
+    """
+
+    def __init__(self, dest: str, keep: int = 3, mode: str = "symlink") -> None:
+        if mode not in SWITCH_MODES:
+            raise ValueError(f"Unknown switch mode: {mode}")
+        self.dest = dest.rstrip("/")
+        self.root = self.dest + ".generations"
+        self.keep = keep
+        self.mode = mode
+
+    def _path(self, generation: int) -> str:
+        return os.path.join(self.root, str(generation))
+
+    def ids(self) -> List[int]:
+        """
+        The generations kept in the generations directory, oldest first.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(name) for name in os.listdir(self.root) if name.isdigit())
+
+    def current(self) -> Optional[int]:
+        """
+        The generation dest points at, or None before the first publish.
+        """
+        if os.path.islink(self.dest):
+            name = os.path.basename(os.readlink(self.dest))
+            return int(name) if name.isdigit() else None
+        marker = os.path.join(self.root, "current")
+        if os.path.isdir(self.dest) and os.path.exists(marker):
+            with open(marker) as f:
+                return int(f.read())
+        return None
+
+    def live_dir(self) -> Optional[str]:
+        """
+        Where the files being served are, e.g. to seed a new build from.
+        """
+        if os.path.isdir(self.dest):
+            return os.path.realpath(self.dest)
+        return None
+
+    def _next_id(self) -> int:
+        known = self.ids()
+        current = self.current()
+        if current is not None:
+            known.append(current)
+        return max(known, default=0) + 1
+
+    def _retired_id(self) -> int:
+        # The id for a live directory that is being switched away from;
+        # one that never was a generation counts as the oldest
+        current = self.current()
+        if current is not None:
+            return current
+        oldest = min(self.ids(), default=1) - 1
+        return oldest if oldest >= 0 else self._next_id()
+
+    def new_staging(self) -> Tuple[int, str]:
+        """
+        Creates an empty directory for the next generation.
+        Leftovers of builds that never got published are removed first.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        for name in os.listdir(self.root):
+            if name.endswith(".staging"):
+                shutil.rmtree(os.path.join(self.root, name))
+        generation = self._next_id()
+        staging = self._path(generation) + ".staging"
+        os.makedirs(staging)
+        return generation, staging
+
+    def publish(self, generation: int, staging: str) -> None:
+        """
+        Makes a finished staging directory the live output, then prunes.
+        """
+        os.rename(staging, self._path(generation))
+        self._switch(generation)
+        self.prune()
+
+    def _switch(self, generation: int) -> None:
+        target = self._path(generation)
+        if self.mode == "symlink":
+            if os.path.isdir(self.dest) and not os.path.islink(self.dest):
+                # First switch: the old real directory becomes a generation
+                os.rename(self.dest, self._path(self._retired_id()))
+            link = self.dest + ".link"
+            if os.path.lexists(link):
+                os.remove(link)
+            os.symlink(os.path.relpath(target, os.path.dirname(self.dest) or "."), link)
+            # Renaming over the old symlink replaces it in one step
+            os.replace(link, self.dest)
+        else:
+            if os.path.islink(self.dest):
+                os.remove(self.dest)
+            elif os.path.isdir(self.dest):
+                os.rename(self.dest, self._path(self._retired_id()))
+            os.rename(target, self.dest)
+            with open(os.path.join(self.root, "current"), "w") as f:
+                f.write(str(generation))
+
+    def rollback(self) -> int:
+        """
+        Switches back to the newest generation older than the live one.
+        """
+        current = self.current()
+        older = [generation for generation in self.ids() if current is None or generation < current]
+        if not older:
+            raise ValueError(f"No older generation of {self.dest} to roll back to")
+        self._switch(older[-1])
+        return older[-1]
+
+    def prune(self) -> None:
+        """
+        Keeps the newest `keep` generations besides the live one.
+        """
+        current = self.current()
+        others = [generation for generation in self.ids() if generation != current]
+        for generation in others[:max(0, len(others) - self.keep)]:
+            shutil.rmtree(self._path(generation))
@@ -7,6 +7,8 @@ class HTMLNode:
     """
     Represents a node in the HTML DOM tree.
     """
+    # A big page is hundreds of thousands of nodes: no per-node __dict__
+    __slots__ = ("tag", "value", "children", "props")
 
     def __init__(
             self,
@@ -54,6 +56,7 @@ class LeafNode(HTMLNode):
     Represents a leaf in the HTML tree (a node with no children).
     Example: <p>I am a paragraph</p>
     """
+    __slots__ = ()
 
     def __init__(
             self,
@@ -93,6 +96,7 @@ class ParentNode(HTMLNode):
     Represents a branch in the HTML tree.
     It contains other nodes but no direct value.
     """
+    __slots__ = ()
 
     def __init__(
             self,
@@ -105,21 +109,36 @@ class ParentNode(HTMLNode):
         # We pass None for the value argument to the superclass.
         super().__init__(tag, None, children, props)
 
-    def to_html(self) -> str:
-        """
-        Recursively renders the HTML for this node and all its children.
-        """
+    def _open_tag(self) -> str:
         if self.tag is None:
             raise ValueError("Invalid HTML: ParentNode must have a tag")
         if self.children is None:
             raise ValueError("Invalid HTML: ParentNode must have children")
+        return f"<{self.tag}{self.props_to_html()}>" if self.props else f"<{self.tag}>"
 
-        # Functional Pragmatism:
-        # We use a generator expression inside join() to recursively call to_html().
-        # This is more memory efficient than building a large string with += in a loop.
-        children_html = "".join(child.to_html() for child in self.children)
-
-        return f"<{self.tag}{self.props_to_html()}>{children_html}</{self.tag}>"
+    def to_html(self) -> str:
+        """
+        Renders the HTML for this node and all its children.
+        """
+        # Walks the tree with an explicit stack instead of recursing, so
+        # however deeply a document nests (lists in lists in quotes...)
+        # rendering never hits Python's recursion limit. Every piece goes
+        # into one list that is joined once at the end.
+        parts = [self._open_tag()]
+        stack = [(self, iter(self.children))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                # Subclasses may render themselves differently
+                if type(child) is ParentNode:
+                    parts.append(child._open_tag())
+                    stack.append((child, iter(child.children)))
+                    break
+                parts.append(child.to_html())
+            else:
+                stack.pop()
+                parts.append(f"</{node.tag}>")
+        return "".join(parts)
 
     def __repr__(self) -> str:
         return f"ParentNode({self.tag}, children: {len(self.children)}, {self.props})"
\ No newline at end of file
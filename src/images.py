@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from events import EventLog
+from extensions import Extension
+from filesystem import DISK, FileSystem, copy_file
+from htmlnode import LeafNode
+from markdown_blocks import MarkdownParser
+from textnode import TextNode, TextType
+
+# Pillow is optional: without it we still read dimensions from the
+# headers ourselves, we just cannot produce downscaled variants.
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+
+# JPEG start-of-frame markers carry the dimensions (C4, C8 and CC are not frames)
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _read_jpeg_size(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    # Walk the segment headers, seeking over their payloads,
+    # until we reach a start-of-frame segment.
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            # Markers without a payload
+            continue
+        header = f.read(2)
+        if len(header) != 2:
+            return None
+        length = struct.unpack(">H", header)[0]
+        if marker in _JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) != 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_size(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    """
+    Reads (width, height) from an image file's header without decoding it.
+    Supports PNG, GIF, WebP and JPEG. Returns None for anything else.
+    """
+    head = f.read(32)
+
+    # PNG: signature, then the IHDR chunk with big-endian width/height
+    if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+
+    # GIF: little-endian logical screen size right after the signature
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack("<HH", head[6:10])
+
+    # WebP: RIFF container with a VP8, VP8L or VP8X chunk
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        chunk = head[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", head[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(head[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            width = int.from_bytes(head[24:27], "little") + 1
+            height = int.from_bytes(head[27:30], "little") + 1
+            return width, height
+        return None
+
+    # JPEG: starts with the SOI marker
+    if head[:2] == b"\xff\xd8":
+        return _read_jpeg_size(f)
+
+    return None
+
+
+def image_size(path: str, fs: FileSystem = DISK) -> Optional[Tuple[int, int]]:
+    with fs.open(path, "rb") as f:
+        return read_image_size(f)
+
+
+def file_hash(path: str, fs: FileSystem = DISK) -> str:
+    """
+    SHA-256 of a file's bytes, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with fs.open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageInfo:
+    """
+    What the page renderer needs to know about one image:
+    its intrinsic size and any downscaled variants (url, width).
+    """
+
+    def __init__(self, width: int, height: int, variants: Optional[List[Tuple[str, int]]] = None) -> None:
+        self.width = width
+        self.height = height
+        self.variants = variants or []
+
+    def __repr__(self) -> str:
+        return f"ImageInfo({self.width}, {self.height}, {self.variants})"
+
+
+def _variant_name(rel_path: str, width: int) -> str:
+    # images/tom.png -> images/tom-480w.png
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}-{width}w{ext}"
+
+
+def _process_image(job: Tuple[str, str, str, Tuple[int, ...], Optional[str]]) -> Tuple[str, Optional[dict]]:
+    """
+    Worker: reads one image's size and renders its variants into the cache.
+    Runs in a separate process, so it only takes and returns plain data.
+    """
+    rel_path, source_path, digest, widths, cache_dir = job
+    size = image_size(source_path)
+    if size is None:
+        return rel_path, None
+    width, height = size
+
+    variants = []
+    wanted = [w for w in widths if w < width]
+    if wanted and PILImage is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        ext = os.path.splitext(rel_path)[1]
+        with PILImage.open(source_path) as original:
+            for target in wanted:
+                cached = os.path.join(cache_dir, f"{digest}-{target}w{ext}")
+                if not os.path.exists(cached):
+                    resized = original.resize((target, max(1, round(height * target / width))))
+                    resized.save(cached)
+                variants.append((_variant_name(rel_path, target), target, cached))
+
+    return rel_path, {"hash": digest, "width": width, "height": height, "variants": variants}
+
+
+def build_image_index(
+        static_dir: str,
+        dest_dir: str,
+        widths: Iterable[int] = (),
+        cache_dir: Optional[str] = None,
+        jobs: Optional[int] = None,
+        fs: FileSystem = DISK,
+        out: FileSystem = DISK,
+        events: Optional[EventLog] = None
+) -> Dict[str, ImageInfo]:
+    """
+    Scans static_dir for images and returns {url: ImageInfo}, with urls
+    such as "/images/tom.png". Downscaled variants (Pillow required) are
+    copied into dest_dir next to the originals.
+
+    Results are cached by file hash in cache_dir, so unchanged images are
+    neither re-read nor re-scaled; the rest are processed in a process pool.
+
+    Images are read from fs and variants and cache written to out. Worker
+    processes and Pillow need real files, so images that are not on disk
+    (e.g. in a MemoryFileSystem) only get their size, read in this process.
+    """
+    widths = tuple(sorted(set(widths)))
+    cache: Dict[str, dict] = {}
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, "images.json")
+        if out.exists(cache_file):
+            with out.open(cache_file) as f:
+                cache = json.load(f)
+
+    variant_cache = None
+    if cache_dir is not None:
+        variant_cache = out.local_path(os.path.join(cache_dir, "image-variants"))
+    jobs_todo = []
+    results: Dict[str, dict] = {}
+    for root, _dirs, files in fs.walk(static_dir):
+        for filename in files:
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            source_path = os.path.join(root, filename)
+            rel_path = os.path.relpath(source_path, static_dir).replace(os.sep, "/")
+            digest = file_hash(source_path, fs)
+            cached = cache.get(digest)
+            # Reuse the cached entry if it was made for the same variant widths
+            # and its variant files are still there
+            if cached is not None and cached.get("widths") == list(widths) \
+                    and all(os.path.exists(v[2]) for v in cached["variants"]):
+                results[rel_path] = dict(cached, variants=[
+                    (_variant_name(rel_path, v[1]), v[1], v[2]) for v in cached["variants"]
+                ])
+                continue
+            local_path = fs.local_path(source_path)
+            if local_path is None:
+                size = image_size(source_path, fs)
+                if size is not None:
+                    results[rel_path] = {"hash": digest, "width": size[0], "height": size[1], "variants": []}
+                continue
+            if variant_cache is None and widths:
+                variant_cache = tempfile.mkdtemp(prefix="image-variants-")
+            jobs_todo.append((rel_path, local_path, digest, widths, variant_cache))
+
+    cache_hits = len(results)
+    if len(jobs_todo) > 1 and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            processed = list(pool.map(_process_image, jobs_todo))
+    else:
+        processed = [_process_image(job) for job in jobs_todo]
+
+    for rel_path, result in processed:
+        if result is None:
+            continue
+        results[rel_path] = result
+        cache[result["hash"]] = dict(result, widths=list(widths))
+
+    if cache_file is not None:
+        out.makedirs(cache_dir)
+        with out.open(cache_file, "w") as f:
+            json.dump(cache, f)
+
+    index = {}
+    for rel_path, result in results.items():
+        variants = []
+        for variant_path, width, cached_path in result["variants"]:
+            # Variants are always rendered on disk, by the worker processes
+            dest_path = os.path.join(dest_dir, variant_path)
+            out.makedirs(os.path.dirname(dest_path))
+            copy_file(DISK, cached_path, out, dest_path)
+            variants.append(("/" + variant_path, width))
+        index["/" + rel_path] = ImageInfo(result["width"], result["height"], variants)
+
+    if events is not None:
+        misses = len(results) - cache_hits
+        events.emit("images", images=len(index), cache_hits=cache_hits, cache_misses=misses)
+        events.metrics.inc("cache_hits_total", cache_hits, help="Build cache hits.", cache="images")
+        events.metrics.inc("cache_misses_total", misses, help="Build cache misses.", cache="images")
+    return index
+
+
+class ImagesExtension(Extension):
+    """
+    Renders images with width/height (no layout shift), lazy loading,
+    async decoding and, when variants exist, a srcset.
+    """
+    name = "images"
+
+    def __init__(self, index: Dict[str, ImageInfo], basepath: str = "/") -> None:
+        self.index = index
+        self.basepath = basepath
+
+    def extend(self, parser: MarkdownParser) -> None:
+        parser.add_inline_renderer(TextType.IMAGE, self.render)
+
+    def render(self, text_node: TextNode) -> LeafNode:
+        props = {"src": text_node.url, "alt": text_node.text}
+        info = self.index.get(text_node.url)
+        if info is not None:
+            props["width"] = str(info.width)
+            props["height"] = str(info.height)
+            if info.variants:
+                # srcset is not touched by the basepath rewrite of src/href,
+                # so its urls get the basepath here
+                candidates = [f"{self.basepath}{url[1:]} {width}w" for url, width in info.variants]
+                candidates.append(f"{self.basepath}{text_node.url[1:]} {info.width}w")
+                props["srcset"] = ", ".join(candidates)
+                props["sizes"] = f"(max-width: {info.width}px) 100vw, {info.width}px"
+        props["loading"] = "lazy"
+        props["decoding"] = "async"
+        return LeafNode("img", "", props)
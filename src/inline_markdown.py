@@ -1,9 +1,25 @@
 import re
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 
 from textnode import TextNode, TextType
 
 
+class MarkdownSyntaxError(ValueError):
+    """
+    Markdown that cannot be parsed. `text` is the span being parsed and
+    `offset` where in it the problem is; the block parser fills in the
+    1-based `line` and `column` in the document when it can.
+    """
+
+    def __init__(self, message: str, text: str = "", offset: int = 0) -> None:
+        super().__init__(message)
+        self.message = message
+        self.text = text
+        self.offset = offset
+        self.line: Optional[int] = None
+        self.column: Optional[int] = None
+
+
 def split_nodes_delimiter(
         old_nodes: List[TextNode],
         delimiter: str,
@@ -30,7 +46,11 @@ def split_nodes_delimiter(
         # If segments are even, it means we have an odd number of delimiters
         # (e.g. "bold ** text" -> 2 segments).
         if len(sections) % 2 == 0:
-            raise Exception(f"Invalid markdown, formatted section not closed: {node.text}")
+            raise MarkdownSyntaxError(
+                f"Invalid markdown, formatted section not closed: {node.text}",
+                node.text,
+                node.text.rfind(delimiter),
+            )
 
         # 4. Reassembly
         for i in range(len(sections)):
@@ -50,118 +70,97 @@ def split_nodes_delimiter(
 
     return new_nodes
 
+# Compiled once; every paragraph of every page goes through them
+_IMAGE_PATTERN = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)")
+_LINK_PATTERN = re.compile(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)")
+
+
 def extract_markdown_images(text: str) -> List[Tuple[str, str]]:
     """
     Extracts markdown images returning a list of tuples (alt_text, url).
     """
-    pattern = r"!\[([^\[\]]*)\]\(([^\(\)]*)\)"
-    return re.findall(pattern, text)
+    return _IMAGE_PATTERN.findall(text)
 
 def extract_markdown_links(text: str) -> List[Tuple[str, str]]:
     """
     Extracts markdown links returning a list of tuples (anchor_text, url).
     Ignores images (which start with !).
     """
-    pattern = r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)"
-    return re.findall(pattern, text)
+    return _LINK_PATTERN.findall(text)
 
 
-def split_nodes_image(old_nodes: List[TextNode]) -> List[TextNode]:
+def _split_nodes_pattern(old_nodes: List[TextNode], pattern: re.Pattern, text_type: TextType) -> List[TextNode]:
     new_nodes = []
     for node in old_nodes:
-        # Optimization: If it's not text, we can't extract images from it.
+        # Optimization: If it's not text, we can't extract anything from it.
         if node.text_type != TextType.TEXT:
             new_nodes.append(node)
             continue
 
-        original_text = node.text
-        images = extract_markdown_images(original_text)
-
-        # Base Case: If no images found, keep the node as is
-        if len(images) == 0:
+        # One pass over the text: each match is cut out where the regex
+        # found it, so a paragraph with thousands of links is still
+        # linear (splitting the remainder again per match is quadratic)
+        text = node.text
+        last = 0
+        for match in pattern.finditer(text):
+            # Part 1: Text before the match
+            if match.start() > last:
+                new_nodes.append(TextNode(text[last:match.start()], TextType.TEXT))
+            # Part 2: The image or link itself
+            new_nodes.append(TextNode(match.group(1), text_type, match.group(2)))
+            last = match.end()
+
+        # Base Case: If nothing was found, keep the node as is
+        if last == 0:
             new_nodes.append(node)
-            continue
-
-        for image_alt, image_link in images:
-            # Construct the markdown pattern to split by
-            sections = original_text.split(f"![{image_alt}]({image_link})", 1)
-
-            # Logic Gate: Ensure strict splitting
-            if len(sections) != 2:
-                raise ValueError("Invalid markdown, image section not closed")
-
-            # Part 1: Text before the image
-            if sections[0] != "":
-                new_nodes.append(TextNode(sections[0], TextType.TEXT))
-
-            # Part 2: The Image itself
-            new_nodes.append(TextNode(image_alt, TextType.IMAGE, image_link))
-
-            # Update the remaining text to be processed in the next iteration
-            original_text = sections[1]
-
-        # Part 3: Remaining text after the last image
-        if original_text != "":
-            new_nodes.append(TextNode(original_text, TextType.TEXT))
+        # Part 3: Remaining text after the last match
+        elif last < len(text):
+            new_nodes.append(TextNode(text[last:], TextType.TEXT))
 
     return new_nodes
 
 
-def split_nodes_link(old_nodes: List[TextNode]) -> List[TextNode]:
-    new_nodes = []
-    for node in old_nodes:
-        if node.text_type != TextType.TEXT:
-            new_nodes.append(node)
-            continue
-
-        original_text = node.text
-        links = extract_markdown_links(original_text)
-
-        if len(links) == 0:
-            new_nodes.append(node)
-            continue
-
-        for link_text, link_url in links:
-            sections = original_text.split(f"[{link_text}]({link_url})", 1)
-
-            if len(sections) != 2:
-                raise ValueError("Invalid markdown, link section not closed")
-
-            if sections[0] != "":
-                new_nodes.append(TextNode(sections[0], TextType.TEXT))
-
-            new_nodes.append(TextNode(link_text, TextType.LINK, link_url))
-
-            original_text = sections[1]
-
-        if original_text != "":
-            new_nodes.append(TextNode(original_text, TextType.TEXT))
-
-    return new_nodes
+def split_nodes_image(old_nodes: List[TextNode]) -> List[TextNode]:
+    return _split_nodes_pattern(old_nodes, _IMAGE_PATTERN, TextType.IMAGE)
 
 
-def text_to_textnodes(text: str) -> List[TextNode]:
+def split_nodes_link(old_nodes: List[TextNode]) -> List[TextNode]:
+    return _split_nodes_pattern(old_nodes, _LINK_PATTERN, TextType.LINK)
+
+
+# An inline step is (name, trigger, splitter).
+# The splitter only runs when its trigger occurs somewhere in the text:
+# every TEXT node is a substring of the original text, so a missing trigger
+# means there is nothing to split and plain spans skip the work entirely.
+InlineStep = Tuple[str, str, Callable[[List[TextNode]], List[TextNode]]]
+
+# The order matters:
+# We do images first because they start with '!', so we don't want
+# the link splitter to accidentally catch an image as a link.
+# We do code before styling, because code spans might contain asterisks
+# or underscores that we don't want to parse as bold/italic.
+CORE_INLINE_STEPS: List[InlineStep] = [
+    ("image", "![", split_nodes_image),
+    ("link", "[", split_nodes_link),
+    ("code", "`", lambda nodes: split_nodes_delimiter(nodes, "`", TextType.CODE)),
+    ("bold", "**", lambda nodes: split_nodes_delimiter(nodes, "**", TextType.BOLD)),
+    ("italic", "*", lambda nodes: split_nodes_delimiter(nodes, "*", TextType.ITALIC)),
+    # Support underscores too
+    ("italic_underscore", "_", lambda nodes: split_nodes_delimiter(nodes, "_", TextType.ITALIC)),
+]
+
+
+def text_to_textnodes(text: str, steps: Optional[List[InlineStep]] = None) -> List[TextNode]:
     """
     Parses a raw string into a list of TextNodes by sequentially applying
     all splitting strategies (Images, Links, Code, Bold, Italic).
+    Parsers with extensions pass their own precomputed list of steps.
     """
-    # Step 1: Start with a single text node
+    # Start with a single text node
     nodes = [TextNode(text, TextType.TEXT)]
 
-    # Step 2: Extract "Block-like" inline elements (Images and Links)
-    # We do images first because they start with '!', so we don't want
-    # the link splitter to accidentally catch an image as a link.
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
-
-    # Step 3: Extract "Delimiter-based" elements
-    # We do code first, because code blocks might contain asterisks or underscores
-    # that we don't want to parse as bold/italic.
-    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
-
-    # Step 4: Extract styling
-    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
-    nodes = split_nodes_delimiter(nodes, "*", TextType.ITALIC)
-    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)  # Support underscores too
+    for _name, trigger, split in steps if steps is not None else CORE_INLINE_STEPS:
+        if trigger in text:
+            nodes = split(nodes)
 
-    return nodes
\ No newline at end of file
+    return nodes
@@ -0,0 +1,196 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Union
+
+from filesystem import DISK, FileSystem
+
+# {% extends "base.html" %}, {% block name %} and {% endblock %}
+_TAG = re.compile(r'{%\s*(?:extends\s+"([^"]+)"|block\s+(\w+)|endblock(?:\s+\w+)?)\s*%}')
+
+# Inside a block override: the parent layout's version of the same block
+SUPER = "{{ super }}"
+
+
+class LayoutError(ValueError):
+    pass
+
+
+class _Block:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.children: List[Union[str, "_Block"]] = []
+
+
+class _Parsed:
+    """
+    One layout file: its parent (if it extends one), its top-level text
+    and blocks, and every block it defines by name.
+    """
+
+    def __init__(self, path: str, source: str) -> None:
+        self.path = path
+        self.extends: Optional[str] = None
+        self.nodes: List[Union[str, _Block]] = []
+        self.blocks: Dict[str, _Block] = {}
+        stack: List[_Block] = []
+        position = 0
+        for match in _TAG.finditer(source):
+            children = stack[-1].children if stack else self.nodes
+            if match.start() > position:
+                children.append(source[position:match.start()])
+            position = match.end()
+            extends, name = match.group(1), match.group(2)
+            if extends is not None:
+                if self.extends is not None or stack or any(node.strip() for node in self.nodes if isinstance(node, str)):
+                    raise LayoutError(f"{path}: extends must come first, and only once")
+                self.extends = extends
+            elif name is not None:
+                if name in self.blocks:
+                    raise LayoutError(f"{path}: block {name} is defined twice")
+                block = _Block(name)
+                children.append(block)
+                self.blocks[name] = block
+                stack.append(block)
+            else:
+                if not stack:
+                    raise LayoutError(f"{path}: endblock without a block")
+                stack.pop()
+        if stack:
+            raise LayoutError(f"{path}: block {stack[-1].name} is never closed")
+        if position < len(source):
+            self.nodes.append(source[position:])
+
+
+def _render_block(name: str, chain: List[_Parsed], start: int) -> str:
+    # The most derived definition at or above chain[start] wins
+    for level in range(start, len(chain)):
+        block = chain[level].blocks.get(name)
+        if block is not None:
+            return _render_nodes(block.children, chain, lambda: _render_block(name, chain, level + 1))
+    return ""
+
+
+def _render_nodes(nodes, chain: List[_Parsed], parent=None) -> str:
+    parts = []
+    for node in nodes:
+        if isinstance(node, _Block):
+            parts.append(_render_block(node.name, chain, 0))
+        elif parent is not None and SUPER in node:
+            parts.append(node.replace(SUPER, parent()))
+        else:
+            parts.append(node)
+    return "".join(parts)
+
+
+class Layouts:
+    """
+    The page templates of one build. The default template is used unless
+    a page's front matter names a layout (`layout: blog` is
+    layouts/blog.html) or a layout matches its directory: a page in
+    content/docs/api/ gets layouts/docs/api.html, else layouts/docs.html.
+
+    A layout can extend another and override its blocks:
+
+        {% extends "base.html" %}
+        {% block main %}<article>{{ Content }}</article>{% endblock %}
+
+    Names in extends are looked up in the layouts directory first, then
+    relative to the site. Every layout is compiled (its inheritance chain
+    resolved to one flat template) once, and the result cached.
+
+    Content directories named after one of the site's languages are
+    looked through: content/fr/docs/ gets the layouts of content/docs/.
+    """
+
+    def __init__(
+            self,
+            default_path: str,
+            layouts_dir: Optional[str] = "layouts",
+            content_dir: str = "content",
+            fs: FileSystem = DISK,
+            languages: Iterable[str] = ()
+    ) -> None:
+        self.default_path = default_path
+        self.layouts_dir = layouts_dir
+        self.content_dir = content_dir
+        self.fs = fs
+        self.languages = set(languages)
+        # layout path -> flat template
+        self.compiled: Dict[str, str] = {}
+        # content directory (or front matter layout name) -> layout path
+        self.by_dir: Dict[str, str] = {}
+        self.by_name: Dict[str, str] = {}
+        # file path -> mtime when read, to notice edits
+        self.mtimes: Dict[str, int] = {}
+        self._parsed: Dict[str, _Parsed] = {}
+
+    def _load(self, path: str) -> _Parsed:
+        if path not in self._parsed:
+            self.mtimes[path] = self.fs.stat(path).mtime_ns
+            self._parsed[path] = _Parsed(path, self.fs.read_text(path))
+        return self._parsed[path]
+
+    def _resolve(self, name: str) -> str:
+        if self.layouts_dir is not None:
+            path = os.path.join(self.layouts_dir, name)
+            if self.fs.isfile(path):
+                return path
+        if self.fs.isfile(name):
+            return name
+        raise LayoutError(f"Unknown layout: {name}")
+
+    def compile(self, path: str) -> str:
+        """
+        The flat template of the layout at path, with blocks filled in.
+        """
+        if path not in self.compiled:
+            chain = [self._load(path)]
+            while chain[-1].extends is not None:
+                parent = self._resolve(chain[-1].extends)
+                if any(parsed.path == parent for parsed in chain):
+                    raise LayoutError(f"{path}: layouts extend each other in a cycle")
+                chain.append(self._load(parent))
+            self.compiled[path] = _render_nodes(chain[-1].nodes, chain)
+        return self.compiled[path]
+
+    def path_for(self, source: str, meta: Optional[Dict[str, str]] = None) -> str:
+        """
+        Which layout file the page at source is rendered with.
+        """
+        name = (meta or {}).get("layout")
+        if name:
+            if name not in self.by_name:
+                self.by_name[name] = self._resolve(name if name.endswith(".html") else name + ".html")
+            return self.by_name[name]
+        directory = os.path.dirname(os.path.relpath(source, self.content_dir))
+        lang, _sep, rest = directory.partition(os.sep)
+        if lang in self.languages:
+            directory = rest
+        if directory not in self.by_dir:
+            self.by_dir[directory] = self._path_for_dir(directory)
+        return self.by_dir[directory]
+
+    def _path_for_dir(self, directory: str) -> str:
+        # The nearest enclosing directory that has a layout of its name
+        if self.layouts_dir is not None:
+            while directory:
+                candidate = os.path.join(self.layouts_dir, directory + ".html")
+                if self.fs.isfile(candidate):
+                    return candidate
+                directory = os.path.dirname(directory)
+        return self.default_path
+
+    def for_page(self, source: str, meta: Optional[Dict[str, str]] = None) -> str:
+        """
+        The compiled template the page at source is rendered with.
+        """
+        return self.compile(self.path_for(source, meta))
+
+    def changed(self) -> bool:
+        """
+        Whether any layout read so far was edited (or removed) since.
+        """
+        for path, mtime in self.mtimes.items():
+            if not self.fs.exists(path) or self.fs.stat(path).mtime_ns != mtime:
+                return True
+        return False
@@ -0,0 +1,404 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import ssl
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, SplitResult, urldefrag, urljoin, urlsplit
+
+from filesystem import DISK, FileSystem
+from frontmatter import split_front_matter
+from generate_page import collect_pages
+from inline_markdown import extract_markdown_images, extract_markdown_links
+
+CACHE_VERSION = 1
+USER_AGENT = "static-site-link-checker/1.0"
+
+# Statuses worth asking again with GET: servers that do not do HEAD
+_HEAD_NOT_SUPPORTED = (405, 501)
+_REDIRECTS = (301, 302, 303, 307, 308)
+_CODE_SPAN = re.compile(r"`[^`]*`")
+
+
+def collect_links(content_dir: str, fs: FileSystem = DISK) -> Dict[str, List[str]]:
+    """
+    The link index of a site: every external (http/https) link and image
+    url in its Markdown, without fragments, and the pages that use it.
+    Links in code blocks and code spans are not links.
+    """
+    links: Dict[str, List[str]] = {}
+    for source, _dest in collect_pages(content_dir, "", fs):
+        _meta, markdown = split_front_matter(fs.read_text(source))
+        fence = None
+        for line in markdown.split("\n"):
+            stripped = line.lstrip()
+            if fence is not None:
+                if stripped.startswith(fence):
+                    fence = None
+                continue
+            if stripped.startswith(("```", "~~~")):
+                fence = stripped[:3]
+                continue
+            text = _CODE_SPAN.sub("", line)
+            for _text, url in extract_markdown_images(text) + extract_markdown_links(text):
+                url = urldefrag(url.strip()).url
+                if urlsplit(url).scheme in ("http", "https") and urlsplit(url).hostname:
+                    sources = links.setdefault(url, [])
+                    if source not in sources:
+                        sources.append(source)
+    return links
+
+
+class LinkResult:
+    """
+    What checking one url found: the final HTTP status (after redirects)
+    or the error that prevented getting one. Dead links are 4xx answers;
+    errors, 5xx and 429 are transient and are not cached.
+    """
+
+    def __init__(
+            self,
+            url: str,
+            status: Optional[int] = None,
+            error: Optional[str] = None,
+            final_url: Optional[str] = None,
+            checked: float = 0.0
+    ) -> None:
+        self.url = url
+        self.status = status
+        self.error = error
+        self.final_url = final_url or url
+        self.checked = checked
+
+    @property
+    def ok(self) -> bool:
+        return self.status is not None and 200 <= self.status < 300
+
+    @property
+    def transient(self) -> bool:
+        return self.status is None or self.status == 429 or self.status >= 500
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"status": self.status, "error": self.error, "final_url": self.final_url, "checked": self.checked}
+
+    @classmethod
+    def from_dict(cls, url: str, data: Dict[str, object]) -> "LinkResult":
+        return cls(url, data["status"], data["error"], data["final_url"], data["checked"])
+
+    def __str__(self) -> str:
+        return f"{self.status}" if self.status is not None else self.error or "unknown error"
+
+    def __repr__(self) -> str:
+        return f"LinkResult({self.url}, {self})"
+
+
+class LinkCache:
+    """
+    Results of earlier checks on disk (<cache_dir>/links.json), each good
+    for ttl seconds: a repeated run only checks urls that are new or
+    whose result expired.
+    """
+
+    def __init__(
+            self,
+            cache_dir: str,
+            ttl: float = 24 * 3600,
+            fs: FileSystem = DISK,
+            clock: Callable[[], float] = time.time
+    ) -> None:
+        self.fs = fs
+        self.path = os.path.join(cache_dir, "links.json")
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: Dict[str, Dict[str, object]] = {}
+        if fs.exists(self.path):
+            with fs.open(self.path) as f:
+                data = json.load(f)
+            # A different format means starting over
+            if data.get("version") == CACHE_VERSION:
+                self.entries = data["links"]
+
+    def get(self, url: str) -> Optional[LinkResult]:
+        entry = self.entries.get(url)
+        if entry is None or self.clock() - entry["checked"] >= self.ttl:
+            return None
+        return LinkResult.from_dict(url, entry)
+
+    def put(self, result: LinkResult) -> None:
+        if not result.transient:
+            self.entries[result.url] = result.to_dict()
+
+    def save(self) -> None:
+        # Expired entries are of no use to the next run either
+        now = self.clock()
+        self.entries = {url: entry for url, entry in self.entries.items() if now - entry["checked"] < self.ttl}
+        self.fs.makedirs(os.path.dirname(self.path) or ".")
+        with self.fs.open(self.path, "w") as f:
+            json.dump({"version": CACHE_VERSION, "links": self.entries}, f, indent=1, sort_keys=True)
+
+
+class _HostPool:
+    """
+    Kept-alive connections to one host, how many may be open at once,
+    and when the next request to it may start.
+    """
+
+    def __init__(self, connections: int, interval: float) -> None:
+        self.idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.slots = asyncio.Semaphore(connections)
+        self.interval = interval
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+        self.opened = 0
+
+    async def wait_turn(self) -> None:
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class LinkChecker:
+    """
+    Checks urls concurrently with asyncio: at most `concurrency` requests
+    in flight overall, at most `per_host` connections to any one host,
+    and no more than `rate` requests per second to it. Connections are
+    kept alive and reused for the next url on the same host. Each url is
+    asked with HEAD (GET if the server does not do HEAD), redirects are
+    followed, and every request has a timeout.
+
+        checker = LinkChecker(rate=2)
+        results = asyncio.run(checker.check_all(urls))
+    """
+
+    def __init__(
+            self,
+            concurrency: int = 16,
+            per_host: int = 2,
+            rate: float = 2.0,
+            timeout: float = 10.0,
+            max_redirects: int = 5,
+            clock: Callable[[], float] = time.time
+    ) -> None:
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.clock = clock
+        self.pools: Dict[Tuple[str, str, int], _HostPool] = {}
+        self._ssl: Optional[ssl.SSLContext] = None
+
+    async def check_all(self, urls: Iterable[str]) -> Dict[str, LinkResult]:
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def check(url: str) -> LinkResult:
+            async with limit:
+                return await self.check(url)
+
+        try:
+            results = await asyncio.gather(*(check(url) for url in urls))
+        finally:
+            await self.close()
+        return {result.url: result for result in results}
+
+    async def check(self, url: str) -> LinkResult:
+        target = url
+        method = "HEAD"
+        try:
+            for _ in range(self.max_redirects + 1):
+                status, location = await self._request(method, target)
+                if status in _HEAD_NOT_SUPPORTED and method == "HEAD":
+                    method = "GET"
+                    continue
+                if status in _REDIRECTS and location:
+                    target = urldefrag(urljoin(target, location)).url
+                    continue
+                return LinkResult(url, status, None, target, self.clock())
+            return LinkResult(url, None, f"more than {self.max_redirects} redirects", target, self.clock())
+        except asyncio.TimeoutError:
+            return LinkResult(url, None, f"timed out after {self.timeout:g}s", target, self.clock())
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            return LinkResult(url, None, f"{type(e).__name__}: {e}", target, self.clock())
+
+    async def close(self) -> None:
+        for pool in self.pools.values():
+            for _reader, writer in pool.idle:
+                writer.close()
+            pool.idle.clear()
+
+    def _pool(self, key: Tuple[str, str, int]) -> _HostPool:
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = _HostPool(self.per_host, self.interval)
+        return pool
+
+    async def _connect(self, scheme: str, host: str, port: int):
+        ssl_context = None
+        if scheme == "https":
+            if self._ssl is None:
+                self._ssl = ssl.create_default_context()
+            ssl_context = self._ssl
+        return await asyncio.open_connection(host, port, ssl=ssl_context)
+
+    async def _request(self, method: str, url: str) -> Tuple[int, Optional[str]]:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"not an http(s) url: {url}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        pool = self._pool((parts.scheme, parts.hostname, port))
+        host = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+        path = quote(parts.path or "/", safe="/%:@!$&'()*+,;=~")
+        if parts.query:
+            path += "?" + parts.query
+        request = (
+            f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\n"
+            f"Accept: */*\r\nConnection: keep-alive\r\n\r\n"
+        ).encode()
+
+        async with pool.slots:
+            await pool.wait_turn()
+            # The timeout starts once the host's slot and turn came up:
+            # waiting behind the per-host and rate limits is not the
+            # server being slow
+            return await asyncio.wait_for(self._exchange(pool, parts, port, request, method), self.timeout)
+
+    async def _exchange(self, pool: _HostPool, parts: SplitResult, port: int, request: bytes,
+                        method: str) -> Tuple[int, Optional[str]]:
+        # A kept-alive connection may have been closed by the server
+        # meanwhile: then try once more on a new one
+        while True:
+            reused = bool(pool.idle)
+            if reused:
+                reader, writer = pool.idle.pop()
+            else:
+                reader, writer = await self._connect(parts.scheme, parts.hostname, port)
+                pool.opened += 1
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, headers, keep = await _read_response(reader, method)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if keep:
+                pool.idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, headers.get("location")
+
+
+async def _read_response(reader: asyncio.StreamReader, method: str) -> Tuple[int, Dict[str, str], bool]:
+    """
+    Reads one response: (status, headers, whether the connection can be
+    used again). Bodies are read and dropped, so the next response on a
+    kept-alive connection starts where it should.
+    """
+    status_line = await reader.readuntil(b"\r\n")
+    parts = status_line.decode("latin-1").split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+        raise ValueError(f"bad status line {status_line!r}")
+    version, status = parts[0], int(parts[1])
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    keep = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        return status, headers, keep
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await _discard(reader, size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        await _discard(reader, int(headers["content-length"]))
+    else:
+        # The body ends when the connection does
+        while await reader.read(65536):
+            pass
+        keep = False
+    return status, headers, keep
+
+
+async def _discard(reader: asyncio.StreamReader, size: int) -> None:
+    while size > 0:
+        data = await reader.read(min(size, 65536))
+        if not data:
+            raise asyncio.IncompleteReadError(b"", size)
+        size -= len(data)
+
+
+def check_links(
+        urls: Iterable[str],
+        cache: Optional[LinkCache] = None,
+        checker: Optional[LinkChecker] = None
+) -> Dict[str, LinkResult]:
+    """
+    Results for every url: cached ones that have not expired, and fresh
+    checks (all at once, see LinkChecker) for the rest.
+    """
+    checker = checker if checker is not None else LinkChecker()
+    results: Dict[str, LinkResult] = {}
+    todo = []
+    for url in urls:
+        cached = cache.get(url) if cache is not None else None
+        if cached is not None:
+            results[url] = cached
+        else:
+            todo.append(url)
+    if todo:
+        checked = asyncio.run(checker.check_all(todo))
+        results.update(checked)
+        if cache is not None:
+            for result in checked.values():
+                cache.put(result)
+    if cache is not None:
+        cache.save()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Check the external links of the site's Markdown.")
+    parser.add_argument("--content-dir", default="content", help="where the Markdown is (default content/)")
+    parser.add_argument("--cache-dir", default=".cache", help="where results are cached (default .cache/)")
+    parser.add_argument("--ttl", type=float, default=24, help="hours a result stays good (default 24)")
+    parser.add_argument("--rate", type=float, default=2, help="requests per second to one host (default 2)")
+    parser.add_argument("--per-host", type=int, default=2, help="connections to one host at once (default 2)")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight overall (default 16)")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds per request (default 10)")
+    args = parser.parse_args(argv)
+
+    links = collect_links(args.content_dir)
+    cache = LinkCache(args.cache_dir, args.ttl * 3600)
+    checker = LinkChecker(args.concurrency, args.per_host, args.rate, args.timeout)
+    results = check_links(sorted(links), cache, checker)
+
+    dead = [result for result in results.values() if not result.ok and not result.transient]
+    failed = [result for result in results.values() if result.transient]
+    for result in sorted(dead + failed, key=lambda result: result.url):
+        for source in links[result.url]:
+            print(f"{source}: {result.url} ({result})", file=sys.stderr)
+    print(f"Checked {len(results)} links: {len(results) - len(dead) - len(failed)} ok, "
+          f"{len(dead)} dead, {len(failed)} could not be checked")
+    if dead or failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
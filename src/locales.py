@@ -0,0 +1,207 @@
+import html
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from filesystem import DISK, FileSystem
+from generate_page import collect_pages
+from frontmatter import FieldError
+from page_errors import PageError, report_page_error
+from publishing import header_error, read_header
+from routes import aliases_of, link_forms, page_path, RouteTable
+from search_index import page_url
+
+
+class LocalePage:
+    """
+    One page of one language: its source, where it is written, and its
+    key, the path it has in every language (blog/post.md for
+    content/fr/blog/post.md and content/blog/post.fr.md alike). A
+    fallback page is the default language's source, built into another
+    language's tree because that language has no translation of it.
+    """
+
+    def __init__(self, source: str, dest_path: str, lang: str, key: str, fallback: bool = False) -> None:
+        self.source = source
+        self.dest_path = dest_path
+        self.lang = lang
+        self.key = key
+        self.fallback = fallback
+
+    def __repr__(self) -> str:
+        suffix = ", fallback" if self.fallback else ""
+        return f"LocalePage({self.lang}, {self.key}, {self.source}{suffix})"
+
+
+def locale_of(path: str, languages: Iterable[str], default: str) -> Tuple[str, str]:
+    """
+    The language of a source path (relative to the content directory) and
+    its key: fr/blog/post.md and blog/post.fr.md are ("fr", "blog/post.md");
+    a path with no language is the default's.
+    """
+    languages = set(languages)
+    parts = path.replace(os.sep, "/").split("/")
+    if len(parts) > 1 and parts[0] in languages:
+        return parts[0], "/".join(parts[1:])
+    stem, dot, lang = parts[-1][:-len(".md")].rpartition(".")
+    if dot and stem and lang in languages:
+        parts[-1] = stem + ".md"
+        return lang, "/".join(parts)
+    return default, "/".join(parts)
+
+
+class Locales:
+    """
+    The pages of a site in several languages (the first is the default),
+    found in either layout, or both:
+
+      content/<lang>/blog/post.md     per-language directories
+      content/blog/post.<lang>.md     per-language files
+
+    Pages without a language are the default's. The default language is
+    built into dest_dir, every other one into dest_dir/<lang>/, and a
+    language without a translation of a page gets the default's (a
+    fallback page), so every language has every page. collected is the
+    (source, dest) pages of collect_pages to place, default all of them.
+
+    Pages are routed like in a site in one language (see route_pages),
+    by the front matter of the source each language builds (from
+    headers, or else the files): a translation can have its own slug,
+    and aliases are relative to the language's tree. A page with a bad
+    slug or aliases is left out, as in route_pages (see errors there).
+    """
+
+    def __init__(
+            self,
+            languages: Iterable[str],
+            content_dir: str = "content",
+            dest_dir: str = "docs",
+            fs: FileSystem = DISK,
+            collected: Optional[Iterable[Tuple[str, str]]] = None,
+            headers: Optional[Dict[str, Dict[str, str]]] = None,
+            pretty: bool = False,
+            errors: Optional[List[PageError]] = None
+    ) -> None:
+        self.languages = list(languages)
+        if not self.languages:
+            raise ValueError("Locales need at least one language")
+        self.default = self.languages[0]
+        self.content_dir = content_dir
+        self.dest_dir = dest_dir
+        self.fs = fs
+        self.headers = headers if headers is not None else {}
+        self.pretty = pretty
+        # key -> lang -> page
+        self.pages: Dict[str, Dict[str, LocalePage]] = {}
+        if collected is None:
+            collected = collect_pages(content_dir, dest_dir, fs)
+        for source, _dest in collected:
+            lang, key = locale_of(os.path.relpath(source, content_dir), self.languages, self.default)
+            pages = self.pages.setdefault(key, {})
+            if lang in pages:
+                raise ValueError(f"{pages[lang].source} and {source} are both the {lang} version of {key}")
+            try:
+                dest_path = self.dest_path(lang, key, source)
+                aliases_of(self.meta(source))
+            except FieldError as e:
+                report_page_error(header_error(source, e, fs), errors)
+                continue
+            pages[lang] = LocalePage(source, dest_path, lang, key)
+        for key, pages in self.pages.items():
+            if self.default in pages:
+                source = pages[self.default].source
+                for lang in self.languages:
+                    if lang not in pages:
+                        pages[lang] = LocalePage(source, self.dest_path(lang, key, source), lang, key, True)
+
+    def dest_dir_of(self, lang: str) -> str:
+        return self.dest_dir if lang == self.default else os.path.join(self.dest_dir, lang)
+
+    def meta(self, source: str) -> Dict[str, str]:
+        if source not in self.headers:
+            self.headers[source] = read_header(source, self.fs)
+        return self.headers[source]
+
+    def dest_path(self, lang: str, key: str, source: Optional[str] = None) -> str:
+        """
+        Where the page with key is written in lang's tree, routed by the
+        front matter of source (the page lang builds).
+        """
+        meta = self.meta(source) if source is not None else {}
+        path = page_path(key, meta, self.pretty)
+        return os.path.join(self.dest_dir_of(lang), *path.split("/"))
+
+    def pages_of(self, lang: str) -> List[LocalePage]:
+        return [pages[lang] for key, pages in sorted(self.pages.items()) if lang in pages]
+
+    def all_pages(self) -> List[LocalePage]:
+        return [page for lang in self.languages for page in self.pages_of(lang)]
+
+    def translated(self) -> int:
+        return sum(not page.fallback for pages in self.pages.values() for page in pages.values())
+
+    def routes(self, lang: str, basepath: str = "/", assets: Optional[Dict[str, str]] = None) -> RouteTable:
+        """
+        The route table of lang's tree. Pages are linked to as the content
+        and templates write them, the default language's way (see
+        link_forms, and the page's url in the default language), and lead
+        to the same page in lang: /blog/ is /fr/blog/ in French.
+        """
+        routes = RouteTable(self.dest_dir, basepath, assets)
+        prefix = "" if lang == self.default else f"/{lang}"
+        for page in self.pages_of(lang):
+            links = link_forms(page.key)
+            default = self.pages[page.key].get(self.default)
+            if default is not None:
+                url = page_url(self.dest_dir, default.dest_path)
+                links.append(url)
+                if url.endswith("/") and url != "/":
+                    links.append(url[:-1])
+            aliases = [prefix + alias for alias in aliases_of(self.meta(page.source))]
+            routes.add(page.source, page.dest_path, links, aliases)
+        return routes
+
+    def links(self, lang: str) -> Dict[str, str]:
+        """
+        Root-relative page urls as the content and templates write them
+        (the default language's), mapped to the same page in lang:
+        {"/blog/": "/fr/blog/", ...}.
+        """
+        return self.routes(lang).hrefs
+
+    def alternates(self, key: str, basepath: str = "/") -> str:
+        """
+        The hreflang links of a page: one per language it is translated
+        into (fallback pages are not translations), and x-default for the
+        default language. Empty for pages in one language only.
+        """
+        pages = self.pages[key]
+        translations = [lang for lang in self.languages if lang in pages and not pages[lang].fallback]
+        if len(translations) < 2:
+            return ""
+        links = [(lang, pages[lang]) for lang in translations]
+        if self.default in translations:
+            links.append(("x-default", pages[self.default]))
+        return "\n".join(
+            '<link rel="alternate" hreflang="{}" href="{}" />'.format(
+                lang, html.escape(page_url(self.dest_dir, page.dest_path, basepath))
+            )
+            for lang, page in links
+        )
+
+    def placeholders(self, lang: str, basepath: str = "/") -> Dict[str, Dict[str, str]]:
+        """
+        The locale placeholders of every page of lang, by destination path:
+        {{ Lang }} (the language of the page's text, so the default's for
+        fallback pages) and {{ Alternates }} (its hreflang links).
+        """
+        alternates: Dict[str, str] = {}
+        placeholders = {}
+        for page in self.pages_of(lang):
+            if page.key not in alternates:
+                alternates[page.key] = self.alternates(page.key, basepath)
+            placeholders[page.dest_path] = {
+                "{{ Lang }}": self.default if page.fallback else lang,
+                "{{ Alternates }}": alternates[page.key],
+            }
+        return placeholders
+
@@ -1,80 +1,201 @@
+import argparse
 import os
-import shutil
 import sys
 
-from generate_page import generate_pages_recursive
+from builder import BuildConfig, build
+from events import EventLog
+from extensions import EXTENSIONS
+from generations import Generations, SWITCH_MODES
+from page_errors import PageFailed
+from parse_cache import DEFAULT_MAX_BYTES
+from sharding import merge_shards, parse_shard, shard_name
 
 
-def copy_files_recursive(source_dir_path: str, dest_dir_path: str) -> None:
+def add_site_arguments(parser: argparse.ArgumentParser) -> None:
     """
-    Recursively copies the contents of the source directory to the destination directory.
+    The options that say how the site is built and linked, shared by
+    every command that builds it (this one and the daemon's, see
+    site_config).
     """
-    # 1. Validation: Fail if source doesn't exist
-    if not os.path.exists(source_dir_path):
-        raise Exception(f"Source directory does not exist: {source_dir_path}")
-
-    # 2. Preparation: Create the destination directory if it doesn't exist
-    if not os.path.exists(dest_dir_path):
-        os.mkdir(dest_dir_path)
-
-    # 3. Traversal: List all items in the current source directory
-    for filename in os.listdir(source_dir_path):
-        # Construct full paths
-        from_path = os.path.join(source_dir_path, filename)
-        to_path = os.path.join(dest_dir_path, filename)
-
-        # 4. Logic Gate: File vs Directory
-        print(f"Processing: {from_path} -> {to_path}")
-
-        if os.path.isfile(from_path):
-            # Base Case: It's a file, just copy it
-            shutil.copy(from_path, to_path)
-        else:
-            # Recursive Step: It's a directory, dive deeper!
-            copy_files_recursive(from_path, to_path)
+    parser.add_argument("basepath", nargs="?", default="/", help="URL prefix the site is served under")
+    parser.add_argument("--cache-dir", default=".cache", help="where build caches are kept")
+    parser.add_argument("--languages", default="", metavar="LANGS",
+                        help="comma-separated languages of the site, default first, e.g. en,fr,de "
+                             "(from content/<lang>/ and *.<lang>.md)")
+    parser.add_argument("--pretty-urls", action="store_true",
+                        help="serve blog/post.md at /blog/post/ (written to blog/post/index.html)")
+    parser.add_argument("--drafts", action="store_true",
+                        help="also build pages marked `draft: true` in their front matter (e.g. for previews)")
+    parser.add_argument("--future", action="store_true",
+                        help="also build pages whose front matter `date:` is still in the future (e.g. for previews)")
+    parser.add_argument("--typography", action="store_true",
+                        help="smart quotes, dashes and ellipses in the text of every page")
+    parser.add_argument("--no-fingerprint", action="store_true",
+                        help="link CSS/JS by their plain names instead of content-hashed copies")
+
+
+def site_config(args: argparse.Namespace, **options) -> BuildConfig:
+    """
+    The BuildConfig of the options add_site_arguments added, with the
+    rest of its settings from options.
+    """
+    return BuildConfig(
+        basepath=args.basepath,
+        cache_dir=args.cache_dir,
+        fingerprint=not args.no_fingerprint,
+        languages=[lang.strip() for lang in args.languages.split(",") if lang.strip()],
+        pretty_urls=args.pretty_urls,
+        drafts=args.drafts,
+        future=args.future,
+        extensions=list(EXTENSIONS) + ["typography"] if args.typography else None,
+        **options
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate the static site from content/ into docs/.")
+    add_site_arguments(parser)
+    parser.add_argument("--page-index", action="store_true",
+                        help="write page-index.json listing every page's url and title")
+    parser.add_argument("--index-outline", action="store_true",
+                        help="include each page's headings in page-index.json")
+    parser.add_argument("--image-widths", default="",
+                        help="comma-separated widths of downscaled image variants, e.g. 480,960 (needs Pillow)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="worker processes for images (default: one per CPU) and for pages (default: none)")
+    parser.add_argument("--keep-going", action="store_true",
+                        help="build every page that can be built, then report all errors (exits 1 if any)")
+    parser.add_argument("--atomic", choices=SWITCH_MODES,
+                        help="build into a new generation, then switch docs/ to it by symlink or by rename")
+    parser.add_argument("--keep-generations", type=int, default=3,
+                        help="older generations kept for --rollback (default 3)")
+    parser.add_argument("--rollback", action="store_true",
+                        help="switch docs/ back to the previous generation and exit")
+    parser.add_argument("--shard", metavar="I/N",
+                        help="build only shard I of N of the pages, into docs.shard-I-of-N/")
+    parser.add_argument("--merge-shards", nargs="+", metavar="DIR",
+                        help="combine the outputs of every shard of a build into docs/ and exit")
+    parser.add_argument("--parse-cache-size", type=float, default=DEFAULT_MAX_BYTES / (1 << 20), metavar="MB",
+                        help="cap on the cache of parsed pages, in MB (0 turns it off)")
+    parser.add_argument("--changes", metavar="PATH",
+                        help="write the urls that changed since the last build to PATH (JSON), e.g. for a CDN purge")
+    parser.add_argument("--diff-blocks", action="store_true",
+                        help="with --changes, also report which blocks of each changed page changed")
+    parser.add_argument("--no-search", action="store_true", help="skip building the search index")
+    parser.add_argument("--log-events", metavar="PATH",
+                        help="write the build's events as JSON lines to PATH ('-' for stdout)")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="write build metrics in Prometheus text format to PATH")
+    return parser.parse_args()
 
 
 def main() -> None:
     # 1. Capture Base Path from Command Line Args
-    basepath = "/"
-    if len(sys.argv) > 1:
-        basepath = sys.argv[1]
-
-    print(f"Using base path: {basepath}")
-
-    # Define our source and destination
-    # Senior Engineer Tip: Use absolute paths or reliable relative paths
-    source = "static"
-    # destination = "public"
-    # content_source = "content"
-    # template_path = "template.html"
-
-    # 2. Change destination to 'docs' for GitHub Pages
-    destination = "docs"
-    content_source = "content"
-    template_path = "template.html"
-
-    print("Deleting public directory...")
-    # Step 1: Clean Slate. Remove the entire directory tree if it exists.
-    if os.path.exists(destination):
-        shutil.rmtree(destination)
-
-    print("Copying static files to public directory...")
-    copy_files_recursive(source, destination)
-
-    # NEW: Generate the page
-    # generate_page("content/index.md", "template.html", "public/index.html")
-    # print("Generating content...")
-    # This one call handles the entire site now
-    # generate_pages_recursive(content_source, template_path, destination)
-    # 3. Pass basepath to generator
-    generate_pages_recursive(content_source, template_path, destination, basepath)
-
-    print("Done!")
-
-    # Create a dummy node to verify our implementation
-    # node = TextNode("This is some anchor text", TextType.LINK, "https://www.boot.dev")
-    # print(node)
+    args = parse_args()
+
+    if args.rollback:
+        # Unless told otherwise, switch the way the last publish did
+        mode = args.atomic or ("symlink" if os.path.islink("docs") else "rename")
+        generations = Generations("docs", args.keep_generations, mode)
+        try:
+            generation = generations.rollback()
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"docs/ is generation {generation} again")
+        return
+
+    if args.merge_shards:
+        try:
+            merged = merge_shards(args.merge_shards, "docs")
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"Merged {merged['shards']} shards: {merged['pages']} pages, {merged['files']} files")
+        return
+
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            sys.exit(str(e))
+
+    # Quiet by default: events are only written when asked for
+    log_file = None
+    if args.log_events == "-":
+        events = EventLog(sys.stdout)
+    elif args.log_events:
+        log_file = open(args.log_events, "w")
+        events = EventLog(log_file)
+    else:
+        events = EventLog()
+
+    # 2. Everything else lives in the library API; the defaults build
+    # content/ + static/ + template.html into docs/ for GitHub Pages
+    config = site_config(
+        args,
+        dest_dir=f"docs.{shard_name(shard)}" if shard is not None else "docs",
+        image_widths=[int(width) for width in args.image_widths.split(",") if width.strip()],
+        jobs=args.jobs,
+        search=not args.no_search,
+        page_index=args.page_index,
+        index_outline=args.index_outline,
+        keep_going=args.keep_going,
+        atomic=args.atomic,
+        keep_generations=args.keep_generations,
+        shard=shard,
+        parse_cache_size=int(args.parse_cache_size * (1 << 20)) or None,
+        changes=args.changes,
+        diff_blocks=args.diff_blocks,
+        # Pages are only written out, never read back from the result
+        keep_html=False,
+        events=events,
+    )
+    try:
+        result = build(config)
+    except PageFailed as e:
+        # Reported like the pages of a --keep-going build, without a traceback
+        print(e.error, file=sys.stderr)
+        sys.exit("Build stopped; --keep-going builds the other pages.")
+    finally:
+        if log_file is not None:
+            log_file.close()
+    if args.metrics:
+        result.metrics.write(args.metrics)
+
+    stats = result.stats
+    if "search" in stats:
+        search = stats["search"]
+        print(f"Search index: {search['pages']} pages, {search['changed']} changed, "
+              f"{search['shards_written']} shards written")
+    if "locales" in stats:
+        locales = stats["locales"]
+        print(f"Languages: {locales['languages']}, {locales['translated']} pages translated, "
+              f"{locales['fallbacks']} fallbacks, {locales['shared_parses']} parses shared")
+    if "parse_cache" in stats:
+        parse = stats["parse_cache"]
+        print(f"Parse cache: {parse['hits']} pages reused, {parse['misses']} parsed")
+    if args.changes:
+        changes = stats["changes"]
+        print(f"Changes: {changes['changed']} changed, {changes['added']} added, {changes['removed']} removed "
+              f"(see {args.changes})")
+    if stats["redirects"]:
+        print(f"Redirects: {stats['redirects']} stubs for the aliases of moved pages")
+    if result.skipped:
+        skipped = stats["skipped"]
+        print(f"Skipped {skipped['draft']} drafts and {skipped['scheduled']} scheduled pages "
+              f"(--drafts and --future build them):")
+        for page in result.skipped:
+            print(f"  {page}")
+    if "generation" in stats:
+        print(f"Published generation {stats['generation']} ({stats['linked_files']} unchanged files linked)")
+    print(f"Done! {stats['pages']} pages in {stats['seconds']:.2f}s")
+
+    if result.errors:
+        for error in result.errors:
+            print(error, file=sys.stderr)
+        total = stats["pages"] + len(result.errors)
+        print(f"{len(result.errors)} of {total} pages failed; their previous output was kept.", file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+import hashlib
+import mmap
+import os
+from typing import Dict, Iterator, Optional
+
+from filesystem import FileSystem
+from frontmatter import parse_front_matter
+from inline_markdown import MarkdownSyntaxError
+
+# Files at least this big are mapped instead of read into one string
+MMAP_THRESHOLD = 1 << 20
+
+
+def mappable_path(fs: FileSystem, path: str) -> Optional[str]:
+    """
+    The local path of a source file big enough to be worth mapping,
+    or None (small files, files that are not on disk).
+    """
+    local_path = fs.local_path(path)
+    if local_path is None or os.path.getsize(local_path) < MMAP_THRESHOLD:
+        return None
+    return local_path
+
+
+class MappedMarkdown:
+    """
+    A Markdown file read through a read-only memory map, for sources of
+    many megabytes. Line boundaries are found on the raw bytes and every
+    line is decoded on its own, as the parser asks for it, so the file is
+    never one big string or one big list of lines. Empty lines are not
+    decoded at all, and the content hash is taken straight from the map.
+
+        with MappedMarkdown(path) as source:
+            node = markdown_lines_to_html_node(source.lines(), parser)
+            title = source.title()
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # Empty files cannot be mapped
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.data = memoryview(self._map) if self._map is not None else memoryview(b"")
+        self.size = size
+        self._title: Optional[str] = None
+        # Front matter is read from the first lines only
+        self.meta: Dict[str, str]
+        self.meta, self.header_lines = parse_front_matter(self._decoded_lines())
+
+    def close(self) -> None:
+        self.data.release()
+        if self._map is not None:
+            self._map.close()
+
+    def __enter__(self) -> "MappedMarkdown":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def content_hash(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+
+    def _spans(self) -> Iterator[tuple]:
+        # (start, end) of every line, without its "\n"; like
+        # str.split("\n"), a trailing newline ends in an empty line
+        data = self.data
+        find = self._map.find if self._map is not None else b"".find
+        end = len(data)
+        start = 0
+        while start <= end:
+            stop = find(b"\n", start)
+            if stop < 0:
+                stop = end
+            yield start, stop
+            start = stop + 1
+
+    def _decoded_lines(self) -> Iterator[str]:
+        data = self.data
+        for start, end in self._spans():
+            yield str(data[start:end], "utf-8")
+
+    def lines(self) -> Iterator[str]:
+        """
+        The page's lines for the parser. Front matter lines come out empty,
+        so line numbers still match the file (as with split_front_matter).
+        """
+        data = self.data
+        find = self._map.find if self._map is not None else b"".find
+        size = len(data)
+        skip = self.header_lines
+        title = self._title
+        # Same walk as _spans, inlined: this runs once per line of a big file
+        start = 0
+        while start <= size:
+            stop = find(b"\n", start)
+            if stop < 0:
+                stop = size
+            if skip:
+                skip -= 1
+                yield ""
+            elif start == stop:
+                yield ""
+            else:
+                # A slice of the memoryview is not a copy; only str() is
+                line = str(data[start:stop], "utf-8")
+                if title is None and line.startswith("# "):
+                    title = self._title = line[2:].strip()
+                yield line
+            start = stop + 1
+
+    def title(self) -> str:
+        """
+        The page's title, as extract_title finds it; known once lines()
+        has been read.
+        """
+        if self._title is None:
+            error = MarkdownSyntaxError("No h1 header found")
+            error.line, error.column = 1, 1
+            raise error
+        return self._title
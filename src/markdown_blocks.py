@@ -1,9 +1,16 @@
+from __future__ import annotations
+
 from enum import Enum
-from typing import List
+from typing import Callable, Dict, Iterable, List, Optional
+
+from htmlnode import ParentNode, HTMLNode, LeafNode
+from inline_markdown import text_to_textnodes, CORE_INLINE_STEPS, InlineStep, MarkdownSyntaxError
+from textnode import text_node_to_html_node, TEXT_NODE_RENDERERS, TextNode, TextType
+from toc import Outline, node_text
+
 
-from htmlnode import ParentNode, HTMLNode
-from inline_markdown import text_to_textnodes
-from textnode import text_node_to_html_node
+# Texts kept by a parser's inline_cache before it starts over
+INLINE_CACHE_SIZE = 100_000
 
 
 def extract_title(markdown: str) -> str:
@@ -11,7 +18,9 @@ def extract_title(markdown: str) -> str:
     for line in lines:
         if line.startswith("# "):
             return line[2:].strip()
-    raise Exception("No h1 header found")
+    error = MarkdownSyntaxError("No h1 header found")
+    error.line, error.column = 1, 1
+    raise error
 
 class BlockType(Enum):
     PARAGRAPH = "paragraph"
@@ -88,10 +97,59 @@ def block_to_block_type(block: str) -> BlockType:
     return BlockType.PARAGRAPH
 
 
-def markdown_to_html_node(markdown: str) -> HTMLNode:
+def markdown_to_html_node(
+        markdown: str,
+        parser: Optional[MarkdownParser] = None,
+        outline: Optional[Outline] = None,
+        text_sink: Optional[List[str]] = None
+) -> HTMLNode:
     """
     Converts a full markdown document into a single HTML <div> node
     containing all the block elements as children.
+    Uses the container-aware single-pass parser, so nested lists,
+    multi-paragraph list items and lazy continuation lines are supported.
+    Pass a MarkdownParser to parse with extensions, an Outline to collect
+    the page's headings while the tree is built, and a text_sink list to
+    receive the text of every inline span (e.g. for the search index).
+    """
+    return (parser or DEFAULT_PARSER).parse(markdown, outline, text_sink)
+
+
+def markdown_lines_to_html_node(
+        lines: Iterable[str],
+        parser: Optional[MarkdownParser] = None,
+        outline: Optional[Outline] = None,
+        text_sink: Optional[List[str]] = None,
+        render_blocks: bool = False
+) -> HTMLNode:
+    """
+    Same as markdown_to_html_node, but consumes an iterable of lines
+    (without trailing newlines) so callers can stream large sources.
+    With render_blocks, the top-level blocks are kept as their HTML only
+    (see markdown_lines_to_html).
+    """
+    return (parser or DEFAULT_PARSER).parse_lines(lines, outline, text_sink, render_blocks)
+
+
+def markdown_lines_to_html(
+        lines: Iterable[str],
+        parser: Optional[MarkdownParser] = None,
+        outline: Optional[Outline] = None,
+        text_sink: Optional[List[str]] = None
+) -> str:
+    """
+    Renders a stream of lines straight to the HTML of the <div>. Every
+    top-level block is turned into HTML as soon as it closes and its nodes
+    are dropped, so a huge page never holds its whole tree at once.
+    Finish hooks see those blocks as raw (tagless) leaves.
+    """
+    return (parser or DEFAULT_PARSER).parse_lines(lines, outline, text_sink, render_blocks=True).to_html()
+
+
+def markdown_to_html_node_legacy(markdown: str) -> HTMLNode:
+    """
+    The original blank-line splitting parser.
+    Only understands flat blocks; kept for differential testing.
     """
     blocks = markdown_to_blocks(markdown)
     children = []
@@ -100,20 +158,7 @@ def markdown_to_html_node(markdown: str) -> HTMLNode:
         block_type = block_to_block_type(block)
 
         # Dispatch Pattern: Delegate based on type
-        if block_type == BlockType.PARAGRAPH:
-            children.append(block_to_paragraph(block))
-        elif block_type == BlockType.HEADING:
-            children.append(block_to_heading(block))
-        elif block_type == BlockType.CODE:
-            children.append(block_to_code(block))
-        elif block_type == BlockType.QUOTE:
-            children.append(block_to_quote(block))
-        elif block_type == BlockType.UNORDERED_LIST:
-            children.append(block_to_ul(block))
-        elif block_type == BlockType.ORDERED_LIST:
-            children.append(block_to_ol(block))
-        else:
-            raise ValueError("Invalid block type")
+        children.append(_LEGACY_BLOCK_HANDLERS[block_type](block))
 
     return ParentNode("div", children, None)
 
@@ -131,16 +176,25 @@ def text_to_children(text: str) -> List[HTMLNode]:
     return children
 
 
-def block_to_paragraph(block: str) -> HTMLNode:
+# Converts inline markdown into HTMLNodes; parsers with extensions
+# pass their own converter to the block_to_* helpers.
+InlineConverter = Callable[[str], List[HTMLNode]]
+
+
+def block_to_paragraph(block: str, inline: InlineConverter = text_to_children) -> HTMLNode:
     # Paragraphs just need their newlines replaced by spaces
     # to render nicely in HTML
     lines = block.split("\n")
     paragraph = " ".join(lines)
-    children = text_to_children(paragraph)
+    children = inline(paragraph)
     return ParentNode("p", children)
 
 
-def block_to_heading(block: str) -> HTMLNode:
+def block_to_heading(
+        block: str,
+        inline: InlineConverter = text_to_children,
+        outline: Optional[Outline] = None
+) -> HTMLNode:
     # Determine level by counting #
     level = 0
     for char in block:
@@ -153,8 +207,15 @@ def block_to_heading(block: str) -> HTMLNode:
         raise ValueError(f"Invalid heading level: {level}")
 
     text = block[level + 1:]  # Strip the '# ' prefix
-    children = text_to_children(text)
-    return ParentNode(f"h{level}", children)
+    children = inline(text)
+    node = ParentNode(f"h{level}", children)
+
+    # Record the heading for the table of contents while we have it at hand;
+    # the id makes the TOC links land on it
+    if outline is not None:
+        slug = outline.add(level, node_text(node).strip())
+        node.props = {"id": slug}
+    return node
 
 
 def block_to_code(block: str) -> HTMLNode:
@@ -167,7 +228,7 @@ def block_to_code(block: str) -> HTMLNode:
     text = block[4:-3]  # Remove ```\n and ```
 
     # Code blocks do NOT parse inline markdown. They are raw text.
-    children = text_to_children(text)
+    children = [LeafNode(None, text)]
 
     # Structure: <pre><code>...</code></pre>
     code = ParentNode("code", children)
@@ -206,4 +267,736 @@ def block_to_ol(block: str) -> HTMLNode:
         text = item[item.find(" ") + 1:]
         children = text_to_children(text)
         html_items.append(ParentNode("li", children))
-    return ParentNode("ol", html_items)
\ No newline at end of file
+    return ParentNode("ol", html_items)
+
+
+_LEGACY_BLOCK_HANDLERS: Dict[BlockType, Callable[[str], HTMLNode]] = {
+    BlockType.PARAGRAPH: block_to_paragraph,
+    BlockType.HEADING: block_to_heading,
+    BlockType.CODE: block_to_code,
+    BlockType.QUOTE: block_to_quote,
+    BlockType.UNORDERED_LIST: block_to_ul,
+    BlockType.ORDERED_LIST: block_to_ol,
+}
+
+
+# --- Container-aware block parser -------------------------------------------
+#
+# A CommonMark-style parser: we keep a stack of open blocks (document, quotes,
+# lists, list items and at most one open leaf). Each line is matched against
+# the open containers from the root down, new block starts are detected on
+# what remains, and blocks are turned into HTMLNodes the moment they close.
+# Every line is visited exactly once and every block is closed exactly once,
+# so the whole document is parsed in a single linear pass.
+#
+# Everything that varies per block kind or per span type goes through lookup
+# tables owned by a MarkdownParser (block starts keyed by the first character
+# of the line, builders keyed by block kind, hooks keyed by HTML tag), so
+# extensions never add work to blocks and spans they do not apply to.
+
+# Which kinds of blocks may hold which children.
+# Lists only hold items, items only live in lists, leaves hold nothing.
+# Any other kind (e.g. one added by an extension) is a container whose
+# content is indented by `offset` columns, just like a list item.
+_LEAF_KINDS = frozenset(("paragraph", "code"))
+
+
+def _can_contain(parent_kind: str, child_kind: str) -> bool:
+    if parent_kind == "list":
+        return child_kind == "item"
+    if parent_kind in _LEAF_KINDS:
+        return False
+    return child_kind != "item"
+
+
+class Block:
+    """
+    An open block on the parser stack.
+    Closed children are kept as already-built HTMLNodes.
+    """
+    __slots__ = (
+        "kind", "parent", "children", "lines", "offset", "ordered", "start",
+        "marker", "tight", "saw_blank", "fence", "fence_indent", "info", "line",
+    )
+
+    def __init__(self, kind: str, parent: Optional[Block] = None) -> None:
+        self.kind = kind
+        self.parent = parent
+        self.children: List[HTMLNode] = []
+        self.lines: List[str] = []
+        # List items and extension containers: the column their content starts at
+        self.offset = 0
+        # Lists: ordered or not, first number and bullet/delimiter character
+        self.ordered = False
+        self.start = 1
+        self.marker = ""
+        self.tight = True
+        # Set when a blank line was seen inside this list/item
+        self.saw_blank = False
+        # Fenced code: the opening fence, its indentation and info string.
+        # Extensions may use `info` to remember a label.
+        self.fence = ""
+        self.fence_indent = 0
+        self.info = ""
+        # The (1-based) source line the block started on, for error messages
+        self.line = 0
+
+
+# A block start looks at the line at column p (the first non-space character,
+# at most 3 columns past pos). It returns None when it does not apply,
+# END_OF_LINE when it consumed the whole line, or the new position after
+# opening a container, so further block starts can nest inside it.
+BlockStart = Callable[["DocumentParser", str, int, int, int], Optional[int]]
+BlockBuilder = Callable[["DocumentParser", Block], Optional[HTMLNode]]
+ParagraphHook = Callable[["DocumentParser", List[str]], Optional[HTMLNode]]
+NodeHook = Callable[["DocumentParser", HTMLNode], None]
+FinishHook = Callable[["DocumentParser", List[HTMLNode]], None]
+TextTransform = Callable[[List[str], List[str]], List[str]]
+
+# What comes before a prose span in a text transform's batch: the
+# previous span directly (SPAN_JOIN), an inline element that is not prose,
+# such as a code span (SPAN_GAP), or the start of a block (SPAN_BREAK).
+# Control characters, so a transform can join the whole batch with them
+# into one string and split it again after.
+SPAN_BREAK = "\x00"
+SPAN_GAP = "\x01"
+SPAN_JOIN = "\x02"
+
+# Spans whose text is prose, and so goes through text transforms
+PROSE_TYPES = (TextType.TEXT, TextType.BOLD, TextType.ITALIC, TextType.LINK)
+
+END_OF_LINE = -1
+
+
+def _locate(error: MarkdownSyntaxError, lines: List[str], first_line: int) -> None:
+    """
+    Fills in the line and column of an inline error from where its text
+    occurs in the block's lines. Columns count from the start of the
+    block's content, i.e. after any container markers and indentation.
+    """
+    if error.line is not None:
+        return
+    text = "\n".join(lines)
+    start = -1
+    if error.text:
+        # Paragraphs are parsed with their lines joined by spaces;
+        # either way offsets line up with the newline-joined text
+        start = text.find(error.text)
+        if start < 0:
+            start = " ".join(lines).find(error.text)
+    offset = start + error.offset if start >= 0 else 0
+    before = text[:offset]
+    error.line = first_line + before.count("\n")
+    error.column = offset - (before.rfind("\n") + 1) + 1
+
+
+def _skip_spaces(line: str, pos: int) -> int:
+    n = len(line)
+    while pos < n and line[pos] == " ":
+        pos += 1
+    return pos
+
+
+def _parse_list_marker(line: str, p: int):
+    """
+    Detects a list item marker at position p.
+    Returns (ordered, marker, start, marker_end) or None.
+    """
+    n = len(line)
+    char = line[p]
+    if char in "-*+":
+        end = p + 1
+        if end < n and line[end] != " ":
+            return None
+        return False, char, 1, end
+
+    end = p
+    while end < n and end - p < 9 and line[end].isdigit():
+        end += 1
+    if end == p or end >= n or line[end] not in ".)":
+        return None
+    delimiter = line[end]
+    end += 1
+    if end < n and line[end] != " ":
+        return None
+    return True, delimiter, int(line[p:end - 1]), end
+
+
+def _start_quote(doc: DocumentParser, line: str, pos: int, p: int, matched: int) -> Optional[int]:
+    doc.prepare(matched)
+    doc.open("quote")
+    pos = p + 1
+    if pos < len(line) and line[pos] == " ":
+        pos += 1
+    return pos
+
+
+def _start_heading(doc: DocumentParser, line: str, pos: int, p: int, matched: int) -> Optional[int]:
+    n = len(line)
+    level = 0
+    while p + level < n and line[p + level] == "#":
+        level += 1
+    if level > 6 or p + level >= n or line[p + level] != " " or line[p + level:].strip() == "":
+        return None
+    doc.prepare(matched)
+    doc.add_node(block_to_heading(line[p:].rstrip(), doc.text_to_children, doc.outline))
+    return END_OF_LINE
+
+
+def _start_fence(doc: DocumentParser, line: str, pos: int, p: int, matched: int) -> Optional[int]:
+    n = len(line)
+    char = line[p]
+    length = 0
+    while p + length < n and line[p + length] == char:
+        length += 1
+    info = line[p + length:].strip()
+    if length < 3 or (char == "`" and "`" in info):
+        return None
+    doc.prepare(matched)
+    code = doc.open("code")
+    code.fence = char * length
+    code.fence_indent = p - pos
+    code.info = info.split(" ", 1)[0]
+    return END_OF_LINE
+
+
+def _start_list_item(doc: DocumentParser, line: str, pos: int, p: int, matched: int) -> Optional[int]:
+    marker = _parse_list_marker(line, p)
+    if marker is None:
+        return None
+    n = len(line)
+    ordered, delimiter, start, end = marker
+    content = _skip_spaces(line, end)
+    empty = content == n
+    # Lists may only interrupt a paragraph with real content,
+    # and ordered ones only when they start at 1
+    if doc.stack[matched - 1].kind == "paragraph" and (empty or (ordered and start != 1)):
+        return None
+    spaces = content - end
+    if empty or spaces > 4:
+        spaces = 1
+    doc.prepare(matched)
+    doc.open_item(ordered, delimiter, start)
+    doc.stack[-1].offset = (end - pos) + spaces
+    return min(end + spaces, n)
+
+
+_CORE_BLOCK_STARTS: Dict[str, List[BlockStart]] = {
+    ">": [_start_quote],
+    "#": [_start_heading],
+    "`": [_start_fence],
+    "~": [_start_fence],
+}
+for _char in "-*+0123456789":
+    _CORE_BLOCK_STARTS[_char] = [_start_list_item]
+
+
+def _build_paragraph(doc: DocumentParser, block: Block) -> Optional[HTMLNode]:
+    for hook in doc.parser.paragraph_hooks:
+        node = hook(doc, block.lines)
+        if node is not None:
+            return node
+    return block_to_paragraph("\n".join(block.lines), doc.text_to_children)
+
+
+def _build_code(doc: DocumentParser, block: Block) -> Optional[HTMLNode]:
+    text = "\n".join(block.lines)
+    if block.lines:
+        text += "\n"
+    props = {"class": f"language-{block.info}"} if block.info else None
+    # Code blocks do NOT parse inline markdown. They are raw text.
+    return ParentNode("pre", [ParentNode("code", [LeafNode(None, text)], props)])
+
+
+def _build_quote(doc: DocumentParser, block: Block) -> Optional[HTMLNode]:
+    children = block.children
+    # A quote holding a single paragraph renders its text directly
+    if len(children) == 1 and children[0].tag == "p":
+        children = children[0].children
+    return ParentNode("blockquote", children)
+
+
+def _build_item(doc: DocumentParser, block: Block) -> Optional[HTMLNode]:
+    return ParentNode("li", block.children)
+
+
+def _build_list(doc: DocumentParser, block: Block) -> Optional[HTMLNode]:
+    items = block.children
+    if block.tight:
+        # Tight lists render their paragraphs without <p> wrappers
+        for item in items:
+            unwrapped = []
+            for child in item.children:
+                if child.tag == "p" and isinstance(child, ParentNode):
+                    unwrapped.extend(child.children)
+                else:
+                    unwrapped.append(child)
+            item.children = unwrapped
+    if block.ordered:
+        props = {"start": str(block.start)} if block.start != 1 else None
+        return ParentNode("ol", items, props)
+    return ParentNode("ul", items)
+
+
+_CORE_BLOCK_BUILDERS: Dict[str, BlockBuilder] = {
+    "paragraph": _build_paragraph,
+    "code": _build_code,
+    "quote": _build_quote,
+    "item": _build_item,
+    "list": _build_list,
+}
+
+
+class MarkdownParser:
+    """
+    A configurable markdown parser.
+
+    Extensions are objects with an `extend(parser)` method that registers
+    block starts, block builders, hooks and inline steps. All registrations
+    go straight into the parser's lookup tables, so nothing is re-resolved
+    while parsing. Parsers are reusable and safe to keep warm between documents.
+
+    Setting inline_cache to a dict keeps the inline parse (the text nodes)
+    of every text, so text that recurs across documents, e.g. the
+    untranslated paragraphs and headings of a page in several languages,
+    is split into spans only once. Text nodes are never changed after
+    they are made, so documents can share them.
+    """
+
+    def __init__(self, extensions: Optional[Iterable[object]] = None) -> None:
+        self.block_starts: Dict[str, List[BlockStart]] = {
+            char: list(starts) for char, starts in _CORE_BLOCK_STARTS.items()
+        }
+        self.block_builders: Dict[str, BlockBuilder] = dict(_CORE_BLOCK_BUILDERS)
+        self.paragraph_hooks: List[ParagraphHook] = []
+        self.node_hooks: Dict[str, List[NodeHook]] = {}
+        self.finish_hooks: List[FinishHook] = []
+        self.inline_steps: List[InlineStep] = list(CORE_INLINE_STEPS)
+        self.inline_renderers: Dict[Enum, Callable[[TextNode], LeafNode]] = dict(TEXT_NODE_RENDERERS)
+        self.text_transforms: List[TextTransform] = []
+        # Looked up once per span. Not a set: Enum.__hash__ is Python code,
+        # while `in` on a short list tries identity first (3x faster here)
+        self.prose_types = list(PROSE_TYPES)
+        self.extensions: List[object] = []
+        self.inline_cache: Optional[Dict[str, List[TextNode]]] = None
+        for extension in extensions or []:
+            self.register(extension)
+
+    def register(self, extension: object) -> None:
+        extension.extend(self)
+        self.extensions.append(extension)
+
+    # --- Registration API ---------------------------------------------------
+
+    def add_block_start(self, chars: str, start: BlockStart) -> None:
+        """
+        Tries `start` on lines whose first non-space character is in `chars`.
+        """
+        for char in chars:
+            self.block_starts.setdefault(char, []).append(start)
+
+    def add_block_builder(self, kind: str, builder: BlockBuilder) -> None:
+        """
+        Builds the HTMLNode for closed blocks of `kind`.
+        A builder may return None to emit nothing in place.
+        """
+        self.block_builders[kind] = builder
+
+    def add_paragraph_hook(self, hook: ParagraphHook) -> None:
+        """
+        Gets the lines of every closed paragraph first; returning a node
+        replaces the paragraph (this is how tables are recognised).
+        """
+        self.paragraph_hooks.append(hook)
+
+    def add_node_hook(self, tags: Iterable[str], hook: NodeHook) -> None:
+        """
+        Calls `hook` on every block-level node with one of the given tags.
+        """
+        for tag in tags:
+            self.node_hooks.setdefault(tag, []).append(hook)
+
+    def add_finish_hook(self, hook: FinishHook) -> None:
+        """
+        Runs once per document on the top-level children, before wrapping.
+        """
+        self.finish_hooks.append(hook)
+
+    def add_text_transform(self, transform: TextTransform) -> None:
+        """
+        Rewrites the prose of a document (see PROSE_TYPES; never code)
+        in one batch: `transform(texts, joins)` gets the text of every
+        prose span in document order, with what comes before each (see
+        SPAN_GAP), and returns the new texts. Streamed documents are
+        batched per top-level block. Outline entries keep the headings'
+        text as written.
+        """
+        self.text_transforms.append(transform)
+
+    def add_inline_step(
+            self,
+            name: str,
+            trigger: str,
+            split: Callable[[List[TextNode]], List[TextNode]],
+            before: Optional[str] = None
+    ) -> None:
+        """
+        Inserts an inline splitter before the step called `before`,
+        or at the end. It only runs on text containing `trigger`.
+        """
+        index = len(self.inline_steps)
+        if before is not None:
+            names = [step[0] for step in self.inline_steps]
+            if before not in names:
+                raise ValueError(f"Unknown inline step: {before}")
+            index = names.index(before)
+        self.inline_steps.insert(index, (name, trigger, split))
+
+    def add_inline_renderer(self, text_type: Enum, render: Callable[[TextNode], LeafNode]) -> None:
+        self.inline_renderers[text_type] = render
+
+    # --- Parsing -----------------------------------------------------------
+
+    def text_to_textnodes(self, text: str) -> List[TextNode]:
+        cache = self.inline_cache
+        if cache is None:
+            return text_to_textnodes(text, self.inline_steps)
+        text_nodes = cache.get(text)
+        if text_nodes is None:
+            if len(cache) >= INLINE_CACHE_SIZE:
+                cache.clear()
+            text_nodes = cache[text] = text_to_textnodes(text, self.inline_steps)
+        return text_nodes
+
+    def text_to_children(self, text: str) -> List[HTMLNode]:
+        renderers = self.inline_renderers
+        return [
+            text_node_to_html_node(text_node, renderers)
+            for text_node in self.text_to_textnodes(text)
+        ]
+
+    def parse(
+            self,
+            markdown: str,
+            outline: Optional[Outline] = None,
+            text_sink: Optional[List[str]] = None
+    ) -> HTMLNode:
+        return self.parse_lines(markdown.split("\n"), outline, text_sink)
+
+    def parse_lines(
+            self,
+            lines: Iterable[str],
+            outline: Optional[Outline] = None,
+            text_sink: Optional[List[str]] = None,
+            render_blocks: bool = False
+    ) -> HTMLNode:
+        doc = DocumentParser(self, outline, text_sink, render_blocks)
+        try:
+            for line in lines:
+                doc.add_line(line)
+            return doc.finish()
+        except MarkdownSyntaxError as e:
+            # Not raised while closing a block (those know their lines):
+            # it came from the line being parsed, e.g. a heading
+            _locate(e, [doc.line], doc.line_number)
+            raise
+
+
+class DocumentParser:
+    """
+    Parses one markdown document, line by line.
+    Feed lines with add_line() and collect the <div> with finish().
+    Extensions keep per-document data in `state`; headings are recorded
+    in `outline` and span texts in `text_sink` when they are given.
+    With render_blocks, top-level blocks are kept as their HTML only.
+    """
+
+    def __init__(
+            self,
+            parser: MarkdownParser,
+            outline: Optional[Outline] = None,
+            text_sink: Optional[List[str]] = None,
+            render_blocks: bool = False
+    ) -> None:
+        self.parser = parser
+        self.render_blocks = render_blocks
+        self.outline = outline
+        self.text_sink = text_sink
+        # Only pay for capturing text when someone asked for it, and for
+        # collecting prose spans when something transforms them
+        if parser.text_transforms:
+            self.text_to_children = self._collect_text_to_children
+        elif text_sink is None:
+            self.text_to_children = parser.text_to_children
+        else:
+            self.text_to_children = self._capture_text_to_children
+        # Prose leaves waiting for the text transforms, and their joins
+        self.prose: List[LeafNode] = []
+        self.joins: List[str] = []
+        self.block_starts = parser.block_starts
+        self.state: Dict[str, object] = {}
+        self.root = Block("document")
+        self.stack: List[Block] = [self.root]
+        # Blocks that saw a blank line since the last non-blank line
+        self.blank_marked: List[Block] = []
+        # The line being parsed and its (1-based) number
+        self.line = ""
+        self.line_number = 0
+
+    def add_line(self, line: str) -> None:
+        self.line_number += 1
+        # Whatever the source, a CRLF file's lines end in "\r" here
+        if line.endswith("\r"):
+            line = line[:-1]
+        if "\t" in line:
+            line = line.expandtabs(4)
+        self.line = line
+        stack = self.stack
+        n = len(line)
+        pos = 0
+        depth = len(stack)
+
+        # 1. Match the line against the open blocks, root first.
+        # `first` caches the first non-space column at or after pos, so deep
+        # nesting does not rescan the same indentation for every container.
+        first = _skip_spaces(line, 0)
+        matched = 1
+        while matched < depth:
+            block = stack[matched]
+            kind = block.kind
+            if first < pos:
+                first = _skip_spaces(line, pos)
+            if kind == "quote":
+                if first - pos > 3 or first >= n or line[first] != ">":
+                    break
+                pos = first + 1
+                if pos < n and line[pos] == " ":
+                    pos += 1
+            elif kind == "paragraph":
+                if first == n:
+                    break
+            elif kind != "list" and kind != "code":
+                # List items and extension containers continue on blank
+                # lines and on lines indented past their content offset
+                if first == n:
+                    pos = n
+                elif first - pos >= block.offset:
+                    pos += block.offset
+                else:
+                    break
+            # Lists and fenced code always continue here;
+            # lists close once no item or lazy line follows
+            matched += 1
+
+        tip = stack[-1]
+        if matched == depth and tip.kind == "code":
+            self._add_code_line(tip, line, pos)
+            return
+
+        # 2. Look for new block starts in what is left of the line
+        started = False
+        block_starts = self.block_starts
+        while True:
+            p = _skip_spaces(line, pos)
+            if p == n or p - pos > 3:
+                break
+            starts = block_starts.get(line[p])
+            if starts is None:
+                break
+            for start in starts:
+                result = start(self, line, pos, p, matched)
+                if result is not None:
+                    break
+            else:
+                break
+            if result == END_OF_LINE:
+                self._clear_blanks()
+                return
+            pos = result
+            matched = len(stack)
+            started = True
+
+        # 3. Whatever remains is paragraph text (or a blank line)
+        p = _skip_spaces(line, pos)
+        blank = p == n
+        tip = stack[-1]
+        if not started and not blank and matched < len(stack) and tip.kind == "paragraph":
+            # Lazy continuation: the paragraph goes on even though
+            # its containers did not match this line
+            tip.lines.append(line[p:])
+            self._clear_blanks()
+            return
+
+        self._close_to(matched)
+        tip = stack[-1]
+        if blank:
+            if tip.kind == "paragraph":
+                self._close_tip()
+            for block in stack:
+                if block.kind == "item" or block.kind == "list":
+                    block.saw_blank = True
+                    self.blank_marked.append(block)
+            return
+
+        if tip.kind == "paragraph":
+            tip.lines.append(line[p:])
+        else:
+            self.open("paragraph").lines.append(line[p:])
+        self._clear_blanks()
+
+    def finish(self) -> ParentNode:
+        while len(self.stack) > 1:
+            self._close_tip()
+        children = self.root.children
+        for hook in self.parser.finish_hooks:
+            hook(self, children)
+        self._transform_text()
+        # When capturing or collecting, this is a method bound to self, in
+        # self's own __dict__: a reference cycle that keeps the parser, and
+        # the tree it built, alive until the cyclic garbage collector runs
+        del self.text_to_children
+        return ParentNode("div", children, None)
+
+    def _capture_text_to_children(self, text: str) -> List[HTMLNode]:
+        parser = self.parser
+        text_nodes = parser.text_to_textnodes(text)
+        self.text_sink.extend(text_node.text for text_node in text_nodes)
+        renderers = parser.inline_renderers
+        return [text_node_to_html_node(text_node, renderers) for text_node in text_nodes]
+
+    def _collect_text_to_children(self, text: str) -> List[HTMLNode]:
+        parser = self.parser
+        text_nodes = parser.text_to_textnodes(text)
+        if self.text_sink is not None:
+            self.text_sink.extend(text_node.text for text_node in text_nodes)
+        renderers = parser.inline_renderers
+        children = [text_node_to_html_node(text_node, renderers) for text_node in text_nodes]
+        prose_types = parser.prose_types
+        prose, joins = self.prose, self.joins
+        join = SPAN_BREAK
+        for text_node, node in zip(text_nodes, children):
+            if text_node.text_type in prose_types:
+                prose.append(node)
+                joins.append(join)
+                join = SPAN_JOIN
+            else:
+                join = SPAN_GAP
+        return children
+
+    def _transform_text(self) -> None:
+        """
+        Runs the text transforms over the prose collected so far.
+        """
+        if not self.prose:
+            return
+        texts = [node.value for node in self.prose]
+        for transform in self.parser.text_transforms:
+            texts = transform(texts, self.joins)
+        for node, text in zip(self.prose, texts):
+            node.value = text
+        self.prose.clear()
+        self.joins.clear()
+
+    # --- Stack management (used by block starts) ------------------------------
+
+    def prepare(self, matched: int) -> None:
+        """
+        Closes unmatched blocks and any paragraph a new block interrupts.
+        """
+        self._close_to(matched)
+        if self.stack[-1].kind == "paragraph":
+            self._close_tip()
+
+    def open(self, kind: str) -> Block:
+        """
+        Opens a new block of `kind` in the innermost container that can hold it.
+        """
+        stack = self.stack
+        while not _can_contain(stack[-1].kind, kind):
+            self._close_tip()
+        parent = stack[-1]
+        # A blank line between two children of an item makes its list loose
+        if parent.kind == "item" and parent.saw_blank and parent.children:
+            parent.parent.tight = False
+        block = Block(kind, parent)
+        block.line = self.line_number
+        stack.append(block)
+        return block
+
+    def open_item(self, ordered: bool, marker: str, start: int) -> None:
+        tip = self.stack[-1]
+        if tip.kind == "list" and (tip.ordered != ordered or tip.marker != marker):
+            self._close_tip()
+            tip = self.stack[-1]
+        if tip.kind == "list":
+            # A blank line between two items makes the list loose
+            if tip.saw_blank:
+                tip.tight = False
+        else:
+            lst = self.open("list")
+            lst.ordered = ordered
+            lst.marker = marker
+            lst.start = start
+        self.open("item")
+        self._clear_blanks()
+
+    def add_node(self, node: HTMLNode) -> None:
+        """
+        Adds an already-built leaf node (e.g. a heading) to the open container.
+        """
+        stack = self.stack
+        while not _can_contain(stack[-1].kind, "leaf"):
+            self._close_tip()
+        parent = stack[-1]
+        if parent.kind == "item" and parent.saw_blank and parent.children:
+            parent.parent.tight = False
+        self._emit(parent, node)
+
+    def _close_to(self, depth: int) -> None:
+        while len(self.stack) > depth:
+            self._close_tip()
+
+    def _clear_blanks(self) -> None:
+        for block in self.blank_marked:
+            block.saw_blank = False
+        self.blank_marked.clear()
+
+    def _add_code_line(self, code: Block, line: str, pos: int) -> None:
+        p = _skip_spaces(line, pos)
+        fence = code.fence
+        if p - pos <= 3 and line.startswith(fence, p):
+            end = p + len(fence)
+            while end < len(line) and line[end] == fence[0]:
+                end += 1
+            if line[end:].strip() == "":
+                self._close_tip()
+                return
+        # Strip at most the fence's own indentation from content lines
+        strip = min(p - pos, code.fence_indent)
+        code.lines.append(line[pos + strip:])
+
+    def _close_tip(self) -> None:
+        block = self.stack.pop()
+        builder = self.parser.block_builders.get(block.kind)
+        if builder is None:
+            raise ValueError(f"Invalid block type: {block.kind}")
+        try:
+            node = builder(self, block)
+        except MarkdownSyntaxError as e:
+            _locate(e, block.lines, block.line)
+            raise
+        if node is not None:
+            self._emit(block.parent, node)
+
+    def _emit(self, parent: Block, node: HTMLNode) -> None:
+        hooks = self.parser.node_hooks.get(node.tag)
+        if hooks is not None:
+            for hook in hooks:
+                hook(self, node)
+        if self.render_blocks and parent is self.root:
+            self._transform_text()
+            node = LeafNode(None, node.to_html())
+        parent.children.append(node)
+
+
+DEFAULT_PARSER = MarkdownParser()
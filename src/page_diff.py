@@ -0,0 +1,141 @@
+import difflib
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from filesystem import DISK, FileSystem
+
+CHANGES_VERSION = 1
+
+# Hex digits kept per hash: 64 bits is plenty to tell versions of one
+# page (or block) apart, and keeps the state of a big site small
+HASH_LENGTH = 16
+
+
+def block_hash(html: str) -> str:
+    """
+    The hash of one top-level block of a page, from its HTML. The HTML
+    is the tree's canonical form, so this is the hash of the block's
+    whole subtree, whichever way it was parsed.
+    """
+    return page_hash(html.encode())
+
+
+def page_hash(data: bytes) -> str:
+    """
+    The hash of a page's output, from the bytes written (the same as the
+    block_hash of its HTML).
+    """
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def merkle_root(hashes: List[str]) -> str:
+    """
+    One hash for a page's content from the hashes of its blocks: equal
+    roots mean equal content, and unequal ones are narrowed down to the
+    blocks that changed by comparing the lists.
+    """
+    return hashlib.sha256("".join(hashes).encode()).hexdigest()[:HASH_LENGTH]
+
+
+def block_diff(old: List[str], new: List[str]) -> List[Dict[str, object]]:
+    """
+    Which blocks changed between two versions of a page, as ranges of
+    block indexes: [{"op": "replace", "old": [2, 3], "new": [2, 4]}, ...].
+    """
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    return [
+        {"op": op, "old": [i1, i2], "new": [j1, j2]}
+        for op, i1, i2, j1, j2 in matcher.get_opcodes()
+        if op != "equal"
+    ]
+
+
+class PageChanges:
+    """
+    Tells which pages of the site changed since the last build, so a CDN
+    only needs to purge those. Every page is remembered by url with the
+    hash of its output and, when block hashes were collected, the hashes
+    of its top-level blocks and their Merkle root:
+
+      <state_dir>/changes/pages.json   {url: [page hash, root, [block hashes]]}
+
+    A page whose output is unchanged is not reported, even if its source
+    file was touched; one whose template changed is, with an empty block
+    diff. Without a state_dir every page counts as added.
+    """
+
+    def __init__(self, state_dir: Optional[str] = None, fs: FileSystem = DISK) -> None:
+        self.fs = fs
+        self.state_dir = os.path.join(state_dir, "changes") if state_dir is not None else None
+        self.previous: Dict[str, list] = {}
+        if self.state_dir is not None:
+            state_file = os.path.join(self.state_dir, "pages.json")
+            if fs.exists(state_file):
+                with fs.open(state_file) as f:
+                    state = json.load(f)
+                # A different format means starting over
+                if state.get("version") == CHANGES_VERSION:
+                    self.previous = state["pages"]
+        self.pages: Dict[str, list] = {}
+
+    def add(self, url: str, html: str, blocks: Optional[List[str]] = None) -> None:
+        self.add_digest(url, block_hash(html), blocks)
+
+    def add_digest(self, url: str, digest: str, blocks: Optional[List[str]] = None) -> None:
+        """
+        A page by the hash of its output (see page_hash), for builds that
+        did not keep its HTML.
+        """
+        root = merkle_root(blocks) if blocks is not None else None
+        self.pages[url] = [digest, root, blocks]
+
+    def keep(self, url: str) -> None:
+        """
+        A page whose previous output stays (it failed to build).
+        """
+        if url in self.previous and url not in self.pages:
+            self.pages[url] = self.previous[url]
+
+    def report(self) -> Dict[str, object]:
+        changed, added, blocks = [], [], {}
+        for url, (page, root, new_blocks) in sorted(self.pages.items()):
+            old = self.previous.get(url)
+            if old is None:
+                added.append(url)
+            elif old[0] != page:
+                changed.append(url)
+                if old[2] is not None and new_blocks is not None:
+                    blocks[url] = block_diff(old[2], new_blocks) if old[1] != root else []
+        removed = sorted(url for url in self.previous if url not in self.pages)
+        report = {
+            "version": CHANGES_VERSION,
+            "changed": changed,
+            "added": added,
+            "removed": removed,
+            "unchanged": len(self.pages) - len(changed) - len(added),
+        }
+        if blocks:
+            report["blocks"] = blocks
+        return report
+
+    def write(self, path: Optional[str] = None, out: Optional[FileSystem] = None) -> Dict[str, object]:
+        """
+        Saves the state for the next build and, given a path, writes the
+        report there (to out, by default the state's filesystem).
+        Returns the report.
+        """
+        report = self.report()
+        if path is not None:
+            out = out if out is not None else self.fs
+            directory = os.path.dirname(path)
+            if directory:
+                out.makedirs(directory)
+            with out.open(path, "w") as f:
+                json.dump(report, f, indent=2)
+        if self.state_dir is not None:
+            self.fs.makedirs(self.state_dir)
+            with self.fs.open(os.path.join(self.state_dir, "pages.json"), "w") as f:
+                json.dump({"version": CHANGES_VERSION, "pages": self.pages}, f, separators=(",", ":"))
+        return report
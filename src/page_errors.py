@@ -0,0 +1,58 @@
+from typing import Dict, List, Optional
+
+from inline_markdown import MarkdownSyntaxError
+
+
+class PageError:
+    """
+    A page that failed to build: its source file, what went wrong and,
+    for Markdown errors, the 1-based line and column.
+    """
+
+    def __init__(self, source: str, message: str, line: Optional[int] = None, column: Optional[int] = None) -> None:
+        self.source = source
+        self.message = message
+        self.line = line
+        self.column = column
+
+    @classmethod
+    def from_exception(cls, source: str, error: Exception) -> "PageError":
+        if isinstance(error, MarkdownSyntaxError):
+            return cls(source, error.message, error.line, error.column)
+        return cls(source, f"{type(error).__name__}: {error}")
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"source": self.source, "line": self.line, "column": self.column, "message": self.message}
+
+    def __str__(self) -> str:
+        # file:line:column: message, the format editors know how to jump to
+        location = self.source
+        if self.line is not None:
+            location += f":{self.line}"
+            if self.column is not None:
+                location += f":{self.column}"
+        return f"{location}: {self.message}"
+
+    def __repr__(self) -> str:
+        return f"PageError({self})"
+
+
+class PageFailed(ValueError):
+    """
+    A page that stops a build (one without keep_going) before it is
+    generated, e.g. over its front matter: error says which and where.
+    """
+
+    def __init__(self, error: PageError) -> None:
+        super().__init__(str(error))
+        self.error = error
+
+
+def report_page_error(error: PageError, errors: Optional[List[PageError]]) -> None:
+    """
+    Records error in errors, for a build that keeps going, or else
+    raises it as PageFailed.
+    """
+    if errors is None:
+        raise PageFailed(error)
+    errors.append(error)
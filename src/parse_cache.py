@@ -0,0 +1,246 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from filesystem import DISK, FileSystem
+from images import ImageInfo
+from toc import Outline
+
+# Bump when the format of an entry changes
+PARSE_CACHE_VERSION = 2
+
+# Evicted down to this size (least recently used first) when saved
+DEFAULT_MAX_BYTES = 256 << 20
+
+# Everything a page's HTML depends on besides its Markdown: changing any of
+# these modules changes the parser version, so every entry misses
+PARSER_MODULES = (
+    "markdown_blocks", "inline_markdown", "textnode", "htmlnode", "extensions", "images", "toc", "frontmatter",
+    "routes",
+)
+
+# (title, content HTML split at its urls (see url_slots), outline, span texts, block hashes)
+Parsed = Tuple[str, List[str], Optional[Outline], Optional[List[str]], Optional[List[str]]]
+
+
+def parser_version(
+        extensions: Iterable[str],
+        images: Optional[Dict[str, ImageInfo]] = None,
+        basepath: str = "/"
+) -> str:
+    """
+    A fingerprint of the parser a build renders with: the source of the
+    parsing modules, the extensions (in order), the image index and the
+    basepath. Entries made with any other parser never match.
+    """
+    digest = hashlib.sha256(f"parse-cache-{PARSE_CACHE_VERSION}\n".encode())
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in PARSER_MODULES:
+        with open(os.path.join(src_dir, f"{module}.py"), "rb") as f:
+            digest.update(f.read())
+    digest.update(json.dumps(list(extensions)).encode())
+    digest.update(json.dumps(
+        {url: [info.width, info.height, info.variants] for url, info in (images or {}).items()}, sort_keys=True
+    ).encode())
+    digest.update(basepath.encode())
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    Parsed pages kept between builds, so an unchanged page is never parsed
+    again, not even by a fresh process with a cold start (e.g. a CI job
+    that restored .cache/). An entry is the page's title, the HTML of its
+    content before it goes into the template (split at its urls, which
+    are resolved when the page is rendered), its outline and, if they
+    were collected, its span texts for the search index and the hashes of
+    its blocks (see page_diff). It is keyed by
+    the source's content hash and the parser version (see parser_version),
+    and by whether the outline was collected, since that adds heading ids.
+
+    Lives in <cache_dir>/parse/:
+
+      index.json          {key: [bytes, last used]}
+      entries/<k>/<key>.json
+
+    save() writes the index and evicts the least recently used entries
+    until the cache fits in max_bytes.
+    """
+
+    def __init__(
+            self,
+            cache_dir: str,
+            version: str,
+            max_bytes: int = DEFAULT_MAX_BYTES,
+            fs: FileSystem = DISK
+    ) -> None:
+        self.fs = fs
+        self.root = os.path.join(cache_dir, "parse")
+        self.version = version
+        self.max_bytes = max_bytes
+        self.entries = _load_index(self.root, fs)
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    def key(self, content_hash: str, outline: bool) -> str:
+        return hashlib.sha256(f"{self.version}:{content_hash}:{int(outline)}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, "entries", key[:2], f"{key}.json")
+
+    def get(self, content_hash: str, outline: bool, texts: bool, blocks: bool = False) -> Optional[Parsed]:
+        """
+        The cached parse of a page, or None. An entry without span texts
+        (or block hashes) does not count when they are needed.
+        """
+        key = self.key(content_hash, outline)
+        entry = None
+        if key in self.entries:
+            try:
+                with self.fs.open(self._path(key)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                # Gone or damaged: parse the page again
+                del self.entries[key]
+        if entry is None or (texts and entry["texts"] is None) or (blocks and entry.get("blocks") is None):
+            self.stats["misses"] += 1
+            return None
+        self.entries[key][1] = time.time()
+        self.stats["hits"] += 1
+        entry_outline = Outline.from_list(entry["outline"]) if entry["outline"] is not None else None
+        return (entry["title"], entry["slots"], entry_outline, entry["texts"] if texts else None,
+                entry.get("blocks") if blocks else None)
+
+    def put(
+            self,
+            content_hash: str,
+            title: str,
+            content_slots: List[str],
+            outline: Optional[Outline],
+            texts: Optional[List[str]],
+            blocks: Optional[List[str]] = None
+    ) -> None:
+        key = self.key(content_hash, outline is not None)
+        data = json.dumps({
+            "title": title,
+            "slots": content_slots,
+            "outline": outline.to_list() if outline is not None else None,
+            "texts": texts,
+            "blocks": blocks,
+        }, separators=(",", ":")).encode()
+        path = self._path(key)
+        self.fs.makedirs(os.path.dirname(path))
+        with self.fs.open(path, "wb") as f:
+            f.write(data)
+        self.entries[key] = [len(data), time.time()]
+        self.stats["stored"] += 1
+
+    def size(self) -> int:
+        return sum(size for size, _last_used in self.entries.values())
+
+    def save(self) -> None:
+        self.stats["evicted"] += evict(self.root, self.entries, self.max_bytes, self.fs)
+        _save_index(self.root, self.entries, self.fs)
+
+
+class ParseMemo:
+    """
+    Pages parsed during one build, in memory and by content hash, so pages
+    with the same Markdown (a page and its untranslated copies in other
+    languages) are parsed once per build, cache or no cache. Same lookup
+    rules as ParseCache.
+    """
+
+    def __init__(self) -> None:
+        self.entries: Dict[Tuple[str, bool], Parsed] = {}
+        self.hits = 0
+
+    def get(self, content_hash: str, outline: bool, texts: bool, blocks: bool = False) -> Optional[Parsed]:
+        parsed = self.entries.get((content_hash, outline))
+        if parsed is None or (texts and parsed[3] is None) or (blocks and parsed[4] is None):
+            return None
+        self.hits += 1
+        return parsed
+
+    def put(self, content_hash: str, parsed: Parsed) -> None:
+        self.entries[(content_hash, parsed[2] is not None)] = parsed
+
+
+def _load_index(root: str, fs: FileSystem) -> Dict[str, List[float]]:
+    path = os.path.join(root, "index.json")
+    if not fs.exists(path):
+        return {}
+    with fs.open(path) as f:
+        index = json.load(f)
+    # A different format means starting over
+    if index.get("version") != PARSE_CACHE_VERSION:
+        return {}
+    return index["entries"]
+
+
+def _save_index(root: str, entries: Dict[str, List[float]], fs: FileSystem) -> None:
+    fs.makedirs(root)
+    with fs.open(os.path.join(root, "index.json"), "w") as f:
+        json.dump({"version": PARSE_CACHE_VERSION, "entries": entries}, f, separators=(",", ":"))
+
+
+def evict(root: str, entries: Dict[str, List[float]], max_bytes: int, fs: FileSystem = DISK) -> int:
+    """
+    Removes the least recently used entries until the rest fit in
+    max_bytes. Returns how many were removed.
+    """
+    total = sum(size for size, _last_used in entries.values())
+    removed = 0
+    for key in sorted(entries, key=lambda k: entries[k][1]):
+        if total <= max_bytes:
+            break
+        size, _last_used = entries.pop(key)
+        path = os.path.join(root, "entries", key[:2], f"{key}.json")
+        if fs.exists(path):
+            fs.remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+
+def prune(cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES, fs: FileSystem = DISK) -> Dict[str, int]:
+    """
+    Shrinks a parse cache to max_bytes, least recently used first, and
+    deletes entry files the index does not know (left by a build that
+    never got to save). max_bytes=0 empties it.
+    """
+    root = os.path.join(cache_dir, "parse")
+    entries = _load_index(root, fs)
+    evicted = evict(root, entries, max_bytes, fs)
+    orphans = 0
+    entries_dir = os.path.join(root, "entries")
+    if fs.exists(entries_dir):
+        for dir_path, _dirs, filenames in fs.walk(entries_dir):
+            for filename in filenames:
+                if filename[:-len(".json")] not in entries:
+                    fs.remove(os.path.join(dir_path, filename))
+                    orphans += 1
+    _save_index(root, entries, fs)
+    return {"entries": len(entries), "bytes": sum(size for size, _ in entries.values()),
+            "evicted": evicted, "orphans": orphans}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage the build's parse cache.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    prune_parser = commands.add_parser("prune", help="Evict least recently used entries down to a size.")
+    prune_parser.add_argument("--cache-dir", default=".cache", help="The build's cache directory.")
+    prune_parser.add_argument("--max-size", type=float, default=DEFAULT_MAX_BYTES / (1 << 20),
+                              help="Size to shrink to, in MB (0 empties the cache).")
+    args = parser.parse_args(argv)
+
+    if args.command == "prune":
+        stats = prune(args.cache_dir, int(args.max_size * (1 << 20)))
+        print(f"Parse cache: {stats['entries']} entries, {stats['bytes'] / (1 << 20):.1f} MB "
+              f"({stats['evicted']} evicted, {stats['orphans']} orphaned files removed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from filesystem import DISK, FileSystem
+from frontmatter import field_line, FieldError, parse_front_matter
+from page_errors import PageError, report_page_error
+
+_YES = ("true", "yes", "on", "1")
+_NO = ("false", "no", "off", "0", "")
+
+
+class SkippedPage:
+    """
+    A page left out of a build: its source, why ("draft" or "scheduled")
+    and, for a scheduled page, the date it is published on.
+    """
+
+    def __init__(self, source: str, reason: str, date: Optional[datetime.datetime] = None) -> None:
+        self.source = source
+        self.reason = reason
+        self.date = date
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"source": self.source, "reason": self.reason,
+                "date": self.date.isoformat() if self.date is not None else None}
+
+    def __str__(self) -> str:
+        if self.date is not None:
+            return f"{self.source}: {self.reason} for {self.date.isoformat()}"
+        return f"{self.source}: {self.reason}"
+
+    def __repr__(self) -> str:
+        return f"SkippedPage({self})"
+
+
+def read_header(path: str, fs: FileSystem = DISK) -> Dict[str, str]:
+    """
+    A page's front matter, read without the rest of the file: lines are
+    taken one at a time and reading stops at the closing fence (or the
+    first line, for a page without front matter).
+    """
+    with fs.open(path, "r") as f:
+        fields, _count = parse_front_matter(f)
+    return fields
+
+
+def header_error(source: str, error: FieldError, fs: FileSystem = DISK) -> PageError:
+    """
+    A bad front matter field as the error of its page, at the field's line.
+    """
+    with fs.open(source, "r") as f:
+        line = field_line(f, error.field)
+    return PageError(source, str(error), line)
+
+
+def is_draft(value: str) -> bool:
+    value = value.strip().lower()
+    if value in _YES:
+        return True
+    if value in _NO:
+        return False
+    raise FieldError("draft", f"{value!r} is neither true nor false")
+
+
+def publish_date(value: str) -> datetime.datetime:
+    """
+    A page's date (2026-10-19, or an ISO 8601 time such as
+    2026-10-19T08:00:00+02:00). Dates and times without a timezone are
+    local time.
+    """
+    try:
+        date = datetime.datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise FieldError("date", f"{value!r} is not a date (YYYY-MM-DD) or an ISO 8601 time") from None
+    return date.astimezone() if date.tzinfo is None else date
+
+
+def skip_reason(
+        meta: Dict[str, str],
+        now: datetime.datetime,
+        drafts: bool = False,
+        future: bool = False
+) -> Tuple[Optional[str], Optional[datetime.datetime]]:
+    """
+    Why a page with this front matter is not published yet: ("draft",
+    None), ("scheduled", its date), or (None, None) for a page that is.
+    With drafts (or future), drafts (or pages dated after now) are
+    published too.
+    """
+    if not drafts and is_draft(meta.get("draft", "")):
+        return "draft", None
+    if not future and "date" in meta:
+        date = publish_date(meta["date"])
+        if date > now:
+            return "scheduled", date
+    return None, None
+
+
+def filter_publishable(
+        pages: Iterable[Tuple[str, str]],
+        fs: FileSystem = DISK,
+        now: Optional[datetime.datetime] = None,
+        drafts: bool = False,
+        future: bool = False,
+        headers: Optional[Dict[str, Dict[str, str]]] = None,
+        errors: Optional[List[PageError]] = None
+) -> Tuple[List[Tuple[str, str]], List[SkippedPage]]:
+    """
+    Splits (source, dest) pages into the ones to build and the ones that
+    are drafts or dated after now (default: the current time), from
+    their front matter alone, so a skipped page is never parsed. Returns
+    (pages to build, skipped pages). A page with a malformed draft or
+    date field is left out and its PageError added to errors, or raised
+    as PageFailed without an errors list. headers, if given, is filled
+    with every page's front matter, for what else needs it (see
+    route_pages).
+    """
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+    elif now.tzinfo is None:
+        now = now.astimezone()
+    kept, skipped = [], []
+    # A source listed more than once is read once
+    reasons: Dict[str, Tuple[Optional[str], Optional[datetime.datetime]]] = {}
+    for source, dest_path in pages:
+        if source not in reasons:
+            meta = read_header(source, fs)
+            if headers is not None:
+                headers[source] = meta
+            try:
+                reasons[source] = skip_reason(meta, now, drafts, future)
+            except FieldError as e:
+                report_page_error(header_error(source, e, fs), errors)
+                reasons[source] = ("error", None)
+                continue
+            if reasons[source][0] is not None:
+                skipped.append(SkippedPage(source, *reasons[source]))
+        if reasons[source][0] is None:
+            kept.append((source, dest_path))
+    return kept, skipped
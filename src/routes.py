@@ -0,0 +1,270 @@
+import html
+import os
+import posixpath
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from filesystem import DISK, FileSystem
+from frontmatter import FieldError
+from page_errors import PageError, report_page_error
+from publishing import header_error, read_header
+from search_index import page_url
+
+# Root-relative href/src values ("/x", but not protocol-relative "//host/x"),
+# found from the `="` they start with rather than from the attribute name
+_URL_SLOT = re.compile(r'="(?:(?<=\bhref=")|(?<=\bsrc="))(/(?!/)[^"]*)(?=")')
+
+# Where a url's path ends and its query or fragment begins
+_URL_SUFFIX = re.compile(r"[?#]")
+
+REDIRECT_TEMPLATE = (
+    '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Redirecting</title>'
+    '<link rel="canonical" href="{href}"><meta name="robots" content="noindex">'
+    '<meta http-equiv="refresh" content="0; url={href}"></head>'
+    '<body><p>This page has moved to <a href="{href}">{href}</a>.</p></body></html>\n'
+)
+
+
+def url_slots(html_content: str) -> List[str]:
+    """
+    Splits HTML at its root-relative href and src urls: literal HTML at
+    even indexes, urls at odd ones. Pages are split once, when they are
+    parsed (and cached that way), so rendering only looks the urls up
+    (see RouteTable.resolve) and never scans the HTML again.
+    """
+    slots = []
+    pos = 0
+    for match in _URL_SLOT.finditer(html_content):
+        start = match.start(1)
+        slots.append(html_content[pos:start])
+        pos = match.end(1)
+        slots.append(html_content[start:pos])
+    slots.append(html_content[pos:])
+    return slots
+
+
+def page_path(key: str, meta: Dict[str, str], pretty: bool = False) -> str:
+    """
+    Where a page is written, relative to its output tree, from its key
+    (its path under the content directory) and front matter:
+
+      blog/post.md        blog/post.html, or blog/post/index.html with pretty
+      blog/index.md       blog/index.html either way
+      slug: hello         blog/hello.html (or blog/hello/index.html)
+
+    A slug renames the page, never its directory, so index pages take none.
+    """
+    directory, name = posixpath.split(key)
+    stem = name[:-len(".md")]
+    slug = meta.get("slug")
+    if slug is not None:
+        if stem == "index":
+            raise FieldError("slug", "an index page is named after its directory")
+        if not slug or slug in (".", "..") or slug != slug.strip() or any(char in slug for char in '/"<>&'):
+            raise FieldError("slug", f"{slug!r} is not a single path segment")
+        stem = slug
+    if stem == "index":
+        return posixpath.join(directory, "index.html")
+    if pretty:
+        return posixpath.join(directory, stem, "index.html")
+    return posixpath.join(directory, stem + ".html")
+
+
+def link_forms(key: str) -> List[str]:
+    """
+    The urls content links to a page by, whatever its route: its source
+    (/blog/post.md) and its url in the plain layout (/blog/post.html, or
+    /blog/ and /blog for blog/index.md), which is how pages were linked
+    before routes could change.
+    """
+    stem = key[:-len(".md")]
+    forms = ["/" + key, "/" + stem + ".html"]
+    if stem == "index" or stem.endswith("/index"):
+        directory = stem[:-len("index")]
+        forms.append("/" + directory)
+        if directory:
+            forms.append("/" + directory[:-1])
+    return forms
+
+
+def aliases_of(meta: Dict[str, str]) -> List[str]:
+    """
+    The old urls a page is also reachable at, from its front matter:
+    `aliases: /old-name.html, /2019/old-name/`.
+    """
+    aliases = [alias.strip() for alias in meta.get("aliases", "").split(",") if alias.strip()]
+    for alias in aliases:
+        if not alias.startswith("/") or alias.startswith("//") or ".." in alias.split("/"):
+            raise FieldError("aliases", f"{alias!r} is not a root-relative url")
+    return aliases
+
+
+def alias_path(alias: str) -> str:
+    """
+    Where the redirect stub of an alias is written, relative to the site:
+    /old.html -> old.html, /old/ and /old -> old/index.html.
+    """
+    path = alias.strip("/")
+    if not path:
+        return "index.html"
+    return path if path.endswith(".html") else path + "/index.html"
+
+
+def redirect_page(href: str) -> str:
+    """
+    A stub that sends browsers (and tells crawlers to go) to href.
+    """
+    return REDIRECT_TEMPLATE.format(href=html.escape(href))
+
+
+class RouteTable:
+    """
+    The routes of one output tree (a site, or one language of it),
+    computed once per build: where every page is written and every url
+    content may link to it by (see link_forms), already resolved to the
+    href it gets, with the basepath and, for fingerprinted assets, their
+    hashed names. Aliases resolve straight to their page, and get a
+    redirect stub each (see redirects).
+
+    Urls are root-relative to the site in dest_dir, without the basepath.
+    """
+
+    def __init__(self, dest_dir: str = "", basepath: str = "/", assets: Optional[Dict[str, str]] = None) -> None:
+        self.dest_dir = dest_dir
+        self.basepath = basepath
+        # source -> dest path
+        self.pages: Dict[str, str] = {}
+        # dest path -> what is written there (a page's source, or an alias)
+        self.owners: Dict[str, str] = {}
+        # url as written -> href
+        self.hrefs: Dict[str, str] = {}
+        # dest path of a stub -> href of its page
+        self.redirects: Dict[str, str] = {}
+        # source -> dest paths of its stubs, for pages with aliases
+        self.stubs: Dict[str, List[str]] = {}
+        if assets:
+            self.add_assets(assets)
+
+    def href(self, url: str) -> str:
+        return self.basepath + url[1:]
+
+    def url_of(self, dest_path: str) -> str:
+        return page_url(self.dest_dir, dest_path)
+
+    def add(self, source: str, dest_path: str, links: Iterable[str] = (), aliases: Iterable[str] = ()) -> str:
+        """
+        Routes source to dest_path, under its own url and the links
+        given, with a redirect stub for every alias. Returns the url.
+        Raises ValueError when two pages (or a page and an alias) would
+        be written to the same path.
+        """
+        self._claim(dest_path, source)
+        self.pages[source] = dest_path
+        url = self.url_of(dest_path)
+        href = self.href(url)
+        # The page's own url wins over another page's link forms
+        self.hrefs[url] = href
+        if url.endswith("/") and url != "/":
+            self.hrefs.setdefault(url[:-1], href)
+        for link in links:
+            self.hrefs.setdefault(link, href)
+        for alias in aliases:
+            stub_path = os.path.join(self.dest_dir, *alias_path(alias).split("/"))
+            self._claim(stub_path, f"an alias of {source}")
+            self.redirects[stub_path] = href
+            self.stubs.setdefault(source, []).append(stub_path)
+            self.hrefs[alias] = href
+            # The stub answers with and without the trailing slash
+            if alias.endswith("/"):
+                self.hrefs.setdefault(alias[:-1], href)
+            elif not alias.endswith(".html"):
+                self.hrefs.setdefault(alias + "/", href)
+        return url
+
+    def _claim(self, dest_path: str, owner: str) -> None:
+        if dest_path in self.owners:
+            raise ValueError(f"{self.owners[dest_path]} and {owner} are both routed to {dest_path}")
+        self.owners[dest_path] = owner
+
+    def add_assets(self, manifest: Dict[str, str]) -> None:
+        # Fingerprinted copies, e.g. /index.css -> /index.<hash>.css
+        for url, hashed in manifest.items():
+            self.hrefs[url] = self.href(hashed)
+
+    def resolve(self, url: str) -> str:
+        """
+        The href of a root-relative url: its page's (query and fragment
+        kept), an asset's hashed copy, or else the url under the basepath.
+        """
+        href = self.hrefs.get(url)
+        if href is not None:
+            return href
+        suffix = _URL_SUFFIX.search(url)
+        if suffix is not None:
+            href = self.hrefs.get(url[:suffix.start()])
+            if href is not None:
+                return href + url[suffix.start():]
+        return self.basepath + url[1:]
+
+    def resolve_slots(self, slots: List[str]) -> str:
+        """
+        HTML split by url_slots, put back together with its urls resolved.
+        """
+        if len(slots) == 1:
+            return slots[0]
+        parts = slots[:]
+        resolve = self.resolve
+        for index in range(1, len(parts), 2):
+            parts[index] = resolve(parts[index])
+        return "".join(parts)
+
+    def write_redirects(self, out: FileSystem, sources: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Writes the redirect stubs of every page, or of the given sources'.
+        Returns the paths written.
+        """
+        if sources is None:
+            sources = self.stubs
+        written = []
+        for source in sources:
+            for stub_path in self.stubs.get(source, ()):
+                out.makedirs(os.path.dirname(stub_path))
+                out.write_text(stub_path, redirect_page(self.redirects[stub_path]))
+                written.append(stub_path)
+        return written
+
+
+def route_pages(
+        pages: Iterable[Tuple[str, str]],
+        content_dir: str,
+        dest_dir: str,
+        basepath: str = "/",
+        pretty: bool = False,
+        headers: Optional[Dict[str, Dict[str, str]]] = None,
+        fs: FileSystem = DISK,
+        errors: Optional[List[PageError]] = None
+) -> Tuple[List[Tuple[str, str]], RouteTable]:
+    """
+    Routes the (source, dest) pages of collect_pages by their front
+    matter (slug, aliases; read from headers, or else from the files)
+    and the url layout. Returns the pages with their routed dest paths,
+    and the route table. A page with a bad slug or aliases is left out
+    and its PageError added to errors, or raised as PageFailed without
+    an errors list.
+    """
+    routes = RouteTable(dest_dir, basepath)
+    routed = []
+    for source, _dest in pages:
+        meta = headers.get(source) if headers is not None else None
+        if meta is None:
+            meta = read_header(source, fs)
+        key = os.path.relpath(source, content_dir).replace(os.sep, "/")
+        try:
+            dest_path = os.path.join(dest_dir, *page_path(key, meta, pretty).split("/"))
+            aliases = aliases_of(meta)
+        except FieldError as e:
+            report_page_error(header_error(source, e, fs), errors)
+            continue
+        routes.add(source, dest_path, link_forms(key), aliases)
+        routed.append((source, dest_path))
+    return routed, routes
@@ -0,0 +1,260 @@
+import json
+import os
+import re
+import string
+from typing import Dict, Iterable, List, Optional, Set
+
+from filesystem import DISK, FileSystem, copy_file
+
+INDEX_VERSION = 1
+
+_TOKEN = re.compile(r"[^\W_]+")
+_SHARD_SAFE = set(string.ascii_lowercase + string.digits)
+
+
+def page_url(dest_root: str, dest_path: str, basepath: str = "/") -> str:
+    """
+    The public url of a generated page:
+    docs/blog/tom/index.html -> {basepath}blog/tom/
+    """
+    url = os.path.relpath(dest_path, dest_root).replace(os.sep, "/")
+    if url == "index.html":
+        url = ""
+    elif url.endswith("/index.html"):
+        url = url[:-len("index.html")]
+    return basepath + url
+
+
+def tokenize(texts: Iterable[str]) -> Dict[str, List[int]]:
+    """
+    Lowercased word tokens of a page and the positions they occur at.
+    Single characters are skipped; they make poor search terms.
+    """
+    postings: Dict[str, List[int]] = {}
+    position = 0
+    for text in texts:
+        for match in _TOKEN.finditer(text.lower()):
+            term = match.group()
+            if len(term) > 1:
+                postings.setdefault(term, []).append(position)
+            position += 1
+    return postings
+
+
+def shard_key(term: str, prefix_length: int = 2) -> str:
+    """
+    The name of the shard a term lives in: its first characters, with
+    anything outside [a-z0-9] hex-escaped so it is a safe file name.
+    The JS client computes exactly the same key.
+    """
+    return "".join(c if c in _SHARD_SAFE else f"_{ord(c):x}" for c in term[:prefix_length])
+
+
+def _delta_encode(positions: List[int]) -> List[int]:
+    return [positions[0]] + [b - a for a, b in zip(positions, positions[1:])]
+
+
+class SearchIndex:
+    """
+    Builds a sharded inverted index (term -> pages -> positions) from the text
+    of every page, written to <dest_root>/search/:
+
+      pages.json          [[id, url, title], ...]
+      shards/<key>.json   {term: [[page_id, [position deltas]], ...]}
+
+    With a state_dir the index is incremental: pages whose source did not
+    change are not re-tokenized, and only the shards holding terms of
+    changed or removed pages are rewritten.
+
+    Everything (index and state) is written to the filesystem fs.
+    """
+
+    def __init__(
+            self,
+            dest_root: str,
+            basepath: str = "/",
+            state_dir: Optional[str] = None,
+            prefix_length: int = 2,
+            fs: FileSystem = DISK
+    ) -> None:
+        self.fs = fs
+        self.dest_root = dest_root
+        self.basepath = basepath
+        self.prefix_length = prefix_length
+        self.state_dir = os.path.join(state_dir, "search") if state_dir is not None else None
+        self.state = {"version": INDEX_VERSION, "prefix_length": prefix_length, "next_id": 0, "pages": {}}
+        if self.state_dir is not None:
+            state_file = os.path.join(self.state_dir, "state.json")
+            if fs.exists(state_file):
+                with fs.open(state_file) as f:
+                    state = json.load(f)
+                # A different format or sharding means starting over
+                if state.get("version") == INDEX_VERSION and state.get("prefix_length") == prefix_length:
+                    self.state = state
+        self.seen: Set[str] = set()
+        # source -> postings, for pages added or changed in this build
+        self.changed: Dict[str, Dict[str, List[int]]] = {}
+        self.stats = {"pages": 0, "changed": 0, "removed": 0, "shards_written": 0}
+
+    def needs_text(self, source: str, content_hash: str) -> bool:
+        """
+        Whether a page changed since the last build, so its text is needed.
+        """
+        entry = self.state["pages"].get(source)
+        return entry is None or entry["hash"] != content_hash
+
+    def add_page(
+            self,
+            source: str,
+            dest_path: str,
+            title: str,
+            content_hash: str,
+            texts: Optional[Iterable[str]] = None
+    ) -> None:
+        self.seen.add(source)
+        pages = self.state["pages"]
+        entry = pages.get(source)
+        if entry is None:
+            entry = {"id": self.state["next_id"], "hash": None, "terms": []}
+            self.state["next_id"] += 1
+            pages[source] = entry
+        entry["url"] = page_url(self.dest_root, dest_path, self.basepath)
+        entry["title"] = title
+        if entry["hash"] != content_hash:
+            if texts is None:
+                raise ValueError(f"Page changed but no text was given: {source}")
+            self.changed[source] = tokenize(texts)
+            entry["hash"] = content_hash
+
+    def keep(self, source: str) -> None:
+        """
+        Keeps a page's entry from the last build as it is
+        (e.g. because it failed to build this time).
+        """
+        self.seen.add(source)
+
+    def write(self) -> Dict[str, int]:
+        pages = self.state["pages"]
+        removed = [source for source in pages if source not in self.seen]
+
+        # Every shard that holds (or will hold) a term of a changed or removed page
+        affected: Dict[str, Dict[str, Dict[str, list]]] = {}
+        for source in list(self.changed) + removed:
+            for term in pages[source]["terms"]:
+                affected.setdefault(shard_key(term, self.prefix_length), {})
+        for postings in self.changed.values():
+            for term in postings:
+                affected.setdefault(shard_key(term, self.prefix_length), {})
+
+        shard_dir = os.path.join(self.state_dir or os.path.join(self.dest_root, "search"), "shards")
+        self.fs.makedirs(shard_dir)
+        stale_ids = {pages[source]["id"] for source in list(self.changed) + removed}
+        for key in affected:
+            shard: Dict[str, list] = {}
+            path = os.path.join(shard_dir, f"{key}.json")
+            if self.fs.exists(path):
+                with self.fs.open(path) as f:
+                    shard = json.load(f)
+            # Drop the old postings of changed/removed pages...
+            for term in list(shard):
+                shard[term] = [posting for posting in shard[term] if posting[0] not in stale_ids]
+                if not shard[term]:
+                    del shard[term]
+            affected[key] = shard
+
+        # ...and add the new ones
+        for source, postings in self.changed.items():
+            page_id = pages[source]["id"]
+            for term, positions in postings.items():
+                shard = affected[shard_key(term, self.prefix_length)]
+                shard.setdefault(term, []).append([page_id, _delta_encode(positions)])
+            pages[source]["terms"] = sorted(postings)
+
+        for key, shard in affected.items():
+            path = os.path.join(shard_dir, f"{key}.json")
+            if shard:
+                with self.fs.open(path, "w") as f:
+                    json.dump(shard, f, separators=(",", ":"), sort_keys=True)
+            elif self.fs.exists(path):
+                self.fs.remove(path)
+        for source in removed:
+            del pages[source]
+
+        out_dir = os.path.join(self.dest_root, "search")
+        if self.state_dir is not None:
+            with self.fs.open(os.path.join(self.state_dir, "state.json"), "w") as f:
+                json.dump(self.state, f, separators=(",", ":"))
+            # The output directory is rebuilt from scratch; copy the shards over
+            out_shards = os.path.join(out_dir, "shards")
+            self.fs.makedirs(out_shards)
+            for name in self.fs.listdir(shard_dir):
+                copy_file(self.fs, os.path.join(shard_dir, name), self.fs, os.path.join(out_shards, name))
+
+        listing = sorted([entry["id"], entry["url"], entry["title"]] for entry in pages.values())
+        with self.fs.open(os.path.join(out_dir, "pages.json"), "w") as f:
+            json.dump({"version": INDEX_VERSION, "prefix_length": self.prefix_length, "pages": listing},
+                      f, separators=(",", ":"))
+
+        self.stats.update(
+            pages=len(pages),
+            changed=len(self.changed),
+            removed=len(removed),
+            shards_written=len(affected),
+        )
+        return self.stats
+
+
+def merge_search_indexes(
+        fs: FileSystem,
+        search_dirs: List[str],
+        out: FileSystem,
+        dest_dir: str
+) -> Dict[str, int]:
+    """
+    Combines the search/ directories of sharded builds into one index in
+    dest_dir. Pages are renumbered by url, so the result does not depend
+    on the order the shards are given in. Shards are merged one key at a
+    time; only one merged shard file is held in memory.
+    """
+    listing = []
+    prefix_length = None
+    for index, search_dir in enumerate(search_dirs):
+        with fs.open(os.path.join(search_dir, "pages.json")) as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"{search_dir}: search index version {data.get('version')}, expected {INDEX_VERSION}")
+        if prefix_length not in (None, data["prefix_length"]):
+            raise ValueError(f"{search_dir}: shards use prefix length {data['prefix_length']}, not {prefix_length}")
+        prefix_length = data["prefix_length"]
+        listing.extend((url, title, index, page_id) for page_id, url, title in data["pages"])
+    listing.sort()
+    new_ids = {(index, page_id): new_id for new_id, (_url, _title, index, page_id) in enumerate(listing)}
+
+    keys: Set[str] = set()
+    for search_dir in search_dirs:
+        shard_dir = os.path.join(search_dir, "shards")
+        if fs.exists(shard_dir):
+            keys.update(name[:-len(".json")] for name in fs.listdir(shard_dir) if name.endswith(".json"))
+
+    out_shards = os.path.join(dest_dir, "shards")
+    out.makedirs(out_shards)
+    for key in sorted(keys):
+        merged: Dict[str, list] = {}
+        for index, search_dir in enumerate(search_dirs):
+            path = os.path.join(search_dir, "shards", f"{key}.json")
+            if not fs.exists(path):
+                continue
+            with fs.open(path) as f:
+                shard = json.load(f)
+            for term, postings in shard.items():
+                merged.setdefault(term, []).extend([new_ids[(index, page_id)], deltas] for page_id, deltas in postings)
+        for postings in merged.values():
+            postings.sort(key=lambda posting: posting[0])
+        with out.open(os.path.join(out_shards, f"{key}.json"), "w") as f:
+            json.dump(merged, f, separators=(",", ":"), sort_keys=True)
+
+    pages = [[new_id, url, title] for new_id, (url, title, _index, _page_id) in enumerate(listing)]
+    with out.open(os.path.join(dest_dir, "pages.json"), "w") as f:
+        json.dump({"version": INDEX_VERSION, "prefix_length": prefix_length or 2, "pages": pages},
+                  f, separators=(",", ":"))
+    return {"pages": len(pages), "shards_written": len(keys)}
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from filesystem import DISK, FileSystem, copy_file
+from search_index import merge_search_indexes
+
+if TYPE_CHECKING:
+    # generate_page shards its page list with this module
+    from generate_page import PageError, PageResult
+
+# Written to the root of every shard's output, never to the merged site
+SHARD_MANIFEST = "shard.json"
+SHARD_MANIFEST_VERSION = 1
+
+# Files every shard writes its own part of; the merge combines them
+_MERGED = ("page-index.json", "search")
+
+Shard = Tuple[int, int]
+
+
+def parse_shard(text: str) -> Shard:
+    """
+    "2/4" -> (2, 4): the second of four shards, counting from 1.
+    """
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, e.g. 2/4, not {text!r}") from None
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard {text}: i must be between 1 and N")
+    return index, count
+
+
+def shard_name(shard: Shard) -> str:
+    return f"shard-{shard[0]}-of-{shard[1]}"
+
+
+def shard_of(source: str, content_dir: str, count: int) -> int:
+    """
+    Which of count shards (1-based) a page belongs to: a hash of its path
+    inside the content directory, so every machine agrees without talking
+    to the others, and adding a page never moves another one.
+    """
+    path = os.path.relpath(source, content_dir).replace(os.sep, "/")
+    digest = hashlib.sha256(path.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def select_shard(pages: List[Tuple[str, str]], content_dir: str, shard: Shard) -> List[Tuple[str, str]]:
+    index, count = shard
+    return [page for page in pages if shard_of(page[0], content_dir, count) == index]
+
+
+def write_shard_manifest(
+        out: FileSystem,
+        dest: str,
+        shard: Shard,
+        pages: List[PageResult],
+        errors: Optional[List[PageError]] = None,
+        search_dirs: Sequence[str] = ("search",)
+) -> None:
+    """
+    The shard's partial manifest: which pages it built (and which failed)
+    and where its search indexes are (relative to dest; one per language
+    in a multilingual build), for merge_shards to check and combine.
+    """
+    manifest = {
+        "version": SHARD_MANIFEST_VERSION,
+        "shard": shard[0],
+        "shards": shard[1],
+        "pages": [
+            {"source": page.source, "path": os.path.relpath(page.dest_path, dest).replace(os.sep, "/"),
+             "url": page.url, "title": page.title}
+            for page in pages
+        ],
+        "errors": [error.to_dict() for error in errors or []],
+        "search": [search_dir.replace(os.sep, "/") for search_dir in search_dirs],
+    }
+    with out.open(os.path.join(dest, SHARD_MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def _read_manifests(fs: FileSystem, shard_dirs: Sequence[str]) -> List[dict]:
+    manifests = []
+    for shard_dir in shard_dirs:
+        path = os.path.join(shard_dir, SHARD_MANIFEST)
+        if not fs.exists(path):
+            raise ValueError(f"{shard_dir} is not a shard's output (no {SHARD_MANIFEST})")
+        with fs.open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != SHARD_MANIFEST_VERSION:
+            raise ValueError(f"{path}: manifest version {manifest.get('version')}, expected {SHARD_MANIFEST_VERSION}")
+        manifests.append(manifest)
+
+    counts = {manifest["shards"] for manifest in manifests}
+    if len(counts) != 1:
+        raise ValueError(f"Shards of different builds: N is {sorted(counts)}")
+    count = counts.pop()
+    found = sorted(manifest["shard"] for manifest in manifests)
+    if found != list(range(1, count + 1)):
+        missing = sorted(set(range(1, count + 1)) - set(found))
+        duplicated = sorted({index for index in found if found.count(index) > 1})
+        raise ValueError(f"Need each of {count} shards exactly once; missing {missing}, duplicated {duplicated}")
+    return manifests
+
+
+def _same_bytes(fs: FileSystem, path: str, out: FileSystem, dest: str) -> bool:
+    if fs.stat(path).size != out.stat(dest).size:
+        return False
+    return fs.read_bytes(path) == out.read_bytes(dest)
+
+
+def merge_shards(
+        shard_dirs: Sequence[str],
+        dest: str,
+        fs: FileSystem = DISK,
+        out: Optional[FileSystem] = None
+) -> Dict[str, int]:
+    """
+    Combines the outputs of all N shards of a build into one site in dest:
+    every shard's pages, the files all of them wrote (static files and
+    assets, which must be identical), and one page index and search index
+    made from the shards' partial ones. Returns counts of what was merged.
+    """
+    out = out if out is not None else fs
+    manifests = _read_manifests(fs, shard_dirs)
+    shard_dirs = [shard_dir for _shard, shard_dir in sorted(zip((m["shard"] for m in manifests), shard_dirs))]
+    manifests.sort(key=lambda manifest: manifest["shard"])
+
+    if out.exists(dest):
+        out.rmtree(dest)
+    out.makedirs(dest)
+
+    # Step 1: Every file, except the partial indexes
+    search_names = sorted({name for manifest in manifests for name in manifest.get("search", ["search"])})
+    skipped = {os.path.normpath(name) for name in search_names}
+    written = set()
+    files = 0
+    for shard_dir in shard_dirs:
+        for root, dirs, filenames in fs.walk(shard_dir):
+            rel_root = os.path.relpath(root, shard_dir)
+            if rel_root == os.curdir:
+                dirs[:] = [name for name in dirs if name not in _MERGED]
+                filenames = [name for name in filenames if name not in _MERGED and name != SHARD_MANIFEST]
+            dirs[:] = [name for name in dirs if os.path.normpath(os.path.join(rel_root, name)) not in skipped]
+            target_dir = os.path.normpath(os.path.join(dest, rel_root))
+            out.makedirs(target_dir)
+            for filename in filenames:
+                path, target = os.path.join(root, filename), os.path.join(target_dir, filename)
+                if target in written:
+                    if not _same_bytes(fs, path, out, target):
+                        raise ValueError(f"Shards disagree about {os.path.relpath(target, dest)}")
+                    continue
+                copy_file(fs, path, out, target)
+                written.add(target)
+                files += 1
+
+    # Step 2: The indexes
+    page_index = [os.path.join(shard_dir, "page-index.json") for shard_dir in shard_dirs]
+    if all(fs.exists(path) for path in page_index):
+        entries = []
+        for path in page_index:
+            with fs.open(path) as f:
+                entries.extend(json.load(f)["pages"])
+        entries.sort(key=lambda page: page["url"])
+        with out.open(os.path.join(dest, "page-index.json"), "w") as f:
+            json.dump({"pages": entries}, f, indent=2)
+    search_pages = 0
+    for name in search_names:
+        search_dirs = [os.path.join(shard_dir, name) for shard_dir in shard_dirs]
+        if all(fs.exists(os.path.join(search_dir, "pages.json")) for search_dir in search_dirs):
+            search_pages += merge_search_indexes(fs, search_dirs, out, os.path.join(dest, name))["pages"]
+
+    return {
+        "shards": len(manifests),
+        "pages": sum(len(manifest["pages"]) for manifest in manifests),
+        "errors": sum(len(manifest["errors"]) for manifest in manifests),
+        "files": files,
+        "search_pages": search_pages,
+    }
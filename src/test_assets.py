@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+import unittest
+
+from assets import fingerprint_assets, fingerprinted_name, MANIFEST_NAME
+
+
+class TestFingerprintAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.cache = os.path.join(self.tmp.name, "cache")
+        os.makedirs(os.path.join(self.static, "js"))
+        with open(os.path.join(self.static, "index.css"), "w") as f:
+            f.write("body { color: red; }")
+        with open(os.path.join(self.static, "js", "app.js"), "w") as f:
+            f.write("console.log(1);")
+        with open(os.path.join(self.static, "logo.png"), "wb") as f:
+            f.write(b"png")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_manifest(self):
+        manifest = fingerprint_assets(self.static, self.dest, self.cache)
+        self.assertEqual(sorted(manifest), ["/index.css", "/js/app.js"])
+        hashed = manifest["/index.css"]
+        self.assertRegex(hashed, r"^/index\.[0-9a-f]{10}\.css$")
+        self.assertTrue(os.path.exists(os.path.join(self.dest, hashed[1:])))
+        with open(os.path.join(self.dest, MANIFEST_NAME)) as f:
+            self.assertEqual(json.load(f), manifest)
+
+    def test_hash_changes_with_content(self):
+        first = fingerprint_assets(self.static, self.dest, self.cache)["/index.css"]
+        with open(os.path.join(self.static, "index.css"), "w") as f:
+            f.write("body { color: blue; }")
+        second = fingerprint_assets(self.static, self.dest, self.cache)["/index.css"]
+        self.assertNotEqual(first, second)
+
+    def test_unchanged_files_reuse_cached_hash(self):
+        fingerprint_assets(self.static, self.dest, self.cache)
+        state_file = os.path.join(self.cache, "assets.json")
+        with open(state_file) as f:
+            state = json.load(f)
+        # Pretend the hash was different: an unchanged file must not be re-read
+        state["index.css"]["hash"] = "f" * 64
+        with open(state_file, "w") as f:
+            json.dump(state, f)
+        manifest = fingerprint_assets(self.static, self.dest, self.cache)
+        self.assertEqual(manifest["/index.css"], "/index.ffffffffff.css")
+
+    def test_fingerprinted_name(self):
+        self.assertEqual(fingerprinted_name("css/site.css", "0123456789abcdef"), "css/site.0123456789.css")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import sys
+import unittest
+from unittest import mock
+
+import generate_page
+from builder import BuildConfig, Builder, build
+from filesystem import MemoryFileSystem
+from inline_markdown import MarkdownSyntaxError
+from page_diff import page_hash
+
+TEMPLATE = '<title>{{ Title }}</title><link href="/index.css">{{ Content }}'
+
+
+def site(pages=None, template=TEMPLATE):
+    # A site in memory, for the build tests of every module: the template,
+    # a stylesheet and pages by path ({"content/index.md": "# Home"})
+    files = {"template.html": template, "static/index.css": "body {}"}
+    files.update(pages or {})
+    return MemoryFileSystem(files)
+
+
+class TestBuild(unittest.TestCase):
+    def test_in_memory_build(self):
+        fs = site({"content/index.md": "# Home\n\nHello", "content/blog/post.md": "# Post\n\n| a |\n| - |\n| 1 |"})
+        result = build(BuildConfig(basepath="/site/", fs=fs, cache_dir=None))
+
+        self.assertEqual(result.stats["pages"], 2)
+        self.assertEqual([page.url for page in result.pages], ["/site/blog/post.html", "/site/"])
+        home = result.page("content/index.md")
+        self.assertEqual(home.title, "Home")
+        self.assertIn('<h1 id="home">Home</h1><p>Hello</p>', home.html)
+        self.assertRegex(home.html, r'href="/site/index\.[0-9a-f]{10}\.css"')
+        # Extensions are on by default
+        self.assertIn("<table>", result.page("content/blog/post.md").html)
+        # The site went to the same filesystem
+        self.assertEqual(fs.read_text("docs/index.html"), home.html)
+        self.assertTrue(fs.exists("docs/search/pages.json"))
+
+    def test_separate_output(self):
+        fs, out = site({"content/index.md": "# Home"}), MemoryFileSystem()
+        result = build(BuildConfig(fs=fs, out=out, cache_dir=None, search=False, page_index=True))
+        self.assertIs(result.files, out)
+        self.assertTrue(out.exists("docs/page-index.json"))
+        self.assertFalse(fs.exists("docs"))
+
+    def test_warm_builder(self):
+        builder = Builder()
+        parser = builder.parser
+        for text in ("first", "second"):
+            result = builder.build(BuildConfig(fs=site({"content/index.md": f"# {text}"}), cache_dir=None))
+            self.assertEqual(result.pages[0].title, text)
+        self.assertIs(builder.parser, parser)
+        self.assertEqual(builder.builds, 2)
+
+    def test_extensions_must_match(self):
+        with self.assertRaises(ValueError):
+            Builder(["tables"]).build(BuildConfig(fs=site(), cache_dir=None))
+
+    def test_layouts(self):
+        fs = site({
+            "content/index.md": "# Home",
+            "content/blog/post.md": "# Post",
+            "content/blog/about.md": "---\nlayout: plain\n---\n# About",
+        })
+        fs.makedirs("layouts")
+        fs.write_text("template.html", "<title>{{ Title }}</title>{% block body %}{{ Content }}{% endblock %}")
+        fs.write_text("layouts/blog.html", '{% extends "template.html" %}{% block body %}<article>{{ Content }}</article>{% endblock %}')
+        fs.write_text("layouts/plain.html", "{{ Content }}")
+        for jobs in (None, 2):
+            result = build(BuildConfig(fs=fs, cache_dir=None, search=False, jobs=jobs))
+            self.assertEqual(result.page("content/index.md").html, '<title>Home</title><div><h1 id="home">Home</h1></div>')
+            self.assertEqual(result.page("content/blog/post.md").html,
+                             '<title>Post</title><article><div><h1 id="post">Post</h1></div></article>')
+            self.assertEqual(result.page("content/blog/about.md").html, '<div><h1 id="about">About</h1></div>')
+            self.assertEqual(result.stats["layouts"], 3)
+
+
+    def test_deep_content_tree(self):
+        # Deeper than Python would let a recursive walk go
+        deep = "/".join(["d"] * (sys.getrecursionlimit() + 100))
+        fs = site({"content/index.md": "# Home", f"content/{deep}/page.md": "# Deep"})
+        for _ in range(2):
+            result = build(BuildConfig(fs=fs, cache_dir=None, search=False))
+        self.assertEqual(result.stats["pages"], 2)
+        self.assertTrue(fs.exists(f"docs/{deep}/page.html"))
+
+    def test_without_html(self):
+        fs = site({"content/index.md": "# Home", "content/blog/post.md": "# Post"})
+        build(BuildConfig(fs=fs))
+        fs.write_text("content/blog/post.md", "# Post\n\nEdited")
+        for jobs in (None, 2):
+            result = build(BuildConfig(fs=fs, keep_html=False, jobs=jobs, changes="changes.json"))
+            self.assertEqual([page.html for page in result.pages], [None, None])
+            post = result.page("content/blog/post.md")
+            self.assertEqual(post.digest, page_hash(fs.read_text("docs/blog/post.html").encode()))
+        # The first of the two builds saw the edit
+        self.assertEqual(result.stats["changes"], {"changed": 0, "added": 0, "removed": 0})
+
+    def test_parallel_windows(self):
+        fs = site({f"content/p{i}.md": f"# Page {i}\n\n[next](/p{i + 1}.md)" for i in range(9)})
+        serial = build(BuildConfig(fs=fs, cache_dir=None))
+        with mock.patch.object(generate_page, "PARALLEL_WINDOW", 1):
+            parallel = build(BuildConfig(fs=fs, cache_dir=None, jobs=2))
+        self.assertEqual([(page.url, page.html) for page in parallel.pages],
+                         [(page.url, page.html) for page in serial.pages])
+
+
+class TestKeepGoing(unittest.TestCase):
+    def broken_site(self):
+        fs = site({"content/a.md": "# A", "content/b.md": "# B\n\nold", "content/c.md": "# C", "content/d.md": "# D"})
+        build(BuildConfig(fs=fs, cache_dir=None))
+        fs.write_text("content/b.md", "# B\n\nnew **unclosed")
+        fs.write_text("content/c.md", "no title")
+        fs.remove("content/d.md")
+        return fs
+
+    def test_fails_fast_by_default(self):
+        with self.assertRaises(MarkdownSyntaxError) as context:
+            build(BuildConfig(fs=self.broken_site(), cache_dir=None))
+        self.assertIn("while generating content/b.md", context.exception.__notes__)
+
+    def test_collects_every_error(self):
+        fs = self.broken_site()
+        result = build(BuildConfig(fs=fs, cache_dir=None, keep_going=True))
+        self.assertFalse(result.ok)
+        self.assertEqual([str(error) for error in result.errors], [
+            "content/b.md:3:5: Invalid markdown, formatted section not closed: new **unclosed",
+            "content/c.md:1:1: No h1 header found",
+        ])
+        self.assertEqual(result.stats["pages"], 1)
+        # Failed pages keep their previous output; removed pages are gone
+        self.assertIn("<p>old</p>", fs.read_text("docs/b.html"))
+        self.assertTrue(fs.exists("docs/c.html"))
+        self.assertFalse(fs.exists("docs/d.html"))
+
+    def test_parallel_workers(self):
+        fs = self.broken_site()
+        result = build(BuildConfig(fs=fs, cache_dir=None, keep_going=True, jobs=2))
+        self.assertEqual([error.source for error in result.errors], ["content/b.md", "content/c.md"])
+        self.assertEqual([page.source for page in result.pages], ["content/a.md"])
+        self.assertEqual(fs.read_text("docs/a.html"), result.pages[0].html)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+from builder import BuildConfig
+from daemon import SiteDaemon, UnixSocketServer, LocalHTTPServer, request
+from filesystem import DiskFileSystem, MemoryFileSystem
+from main import add_site_arguments, site_config
+
+
+def warm_site():
+    fs = MemoryFileSystem({
+        "template.html": '<title>{{ Title }}</title><link href="/index.css">{{ Content }}',
+        "static/index.css": "body {}",
+        "content/index.md": "# Home",
+        "content/blog/tom.md": "# Tom\n\nBombadil",
+    })
+    site = SiteDaemon(BuildConfig(fs=fs, cache_dir=None), cache_size=2)
+    site.rebuild()
+    return site, fs
+
+
+class TestSiteDaemon(unittest.TestCase):
+    def test_render_by_url_and_source(self):
+        site, _fs = warm_site()
+        response = site.handle({"op": "render", "url": "/blog/tom.html"})
+        self.assertTrue(response["ok"])
+        self.assertEqual(response["source"], "content/blog/tom.md")
+        self.assertIn("<p>Bombadil</p>", response["html"])
+        # Linked against the manifest of the last build
+        self.assertRegex(response["html"], r'href="/index\.[0-9a-f]{10}\.css"')
+        self.assertEqual(site.handle({"op": "render", "source": "content/index.md"})["url"], "/")
+
+    def test_render_cache(self):
+        site, _fs = warm_site()
+        self.assertFalse(site.render(source="content/index.md")["cached"])
+        self.assertTrue(site.render(source="content/index.md")["cached"])
+        # A draft is rendered from the markdown given, not the file
+        draft = site.render(source="content/index.md", markdown="# Draft")
+        self.assertEqual((draft["title"], draft["cached"]), ("Draft", False))
+        site.render(source="content/blog/tom.md")
+        stats = site.handle({"op": "stats"})
+        self.assertEqual((stats["render_hits"], stats["render_misses"]), (1, 3))
+        # The oldest render was evicted to keep the cache at its size
+        self.assertEqual(stats["cached_pages"], 2)
+        self.assertFalse(site.render(source="content/index.md")["cached"])
+
+    def test_template_reloaded_when_changed(self):
+        site, fs = warm_site()
+        site.render(source="content/index.md")
+        fs.write_text("template.html", "<h6>{{ Title }}</h6>")
+        response = site.render(source="content/index.md")
+        self.assertEqual(response["html"], "<h6>Home</h6>")
+        self.assertEqual(site.stats()["template_loads"], 2)
+
+    def test_translations_share_layouts(self):
+        fs = MemoryFileSystem({
+            "template.html": "<main>{{ Content }}</main>",
+            "layouts/blog.html": "<article>{{ Content }}</article>",
+            "content/blog/tom.md": "# Tom",
+            "content/fr/blog/tom.md": "# Tom",
+        })
+        site = SiteDaemon(BuildConfig(fs=fs, cache_dir=None, languages=["en", "fr"]))
+        self.assertEqual(site.render(source="content/fr/blog/tom.md")["html"], '<article><div><h1 id="tom">Tom</h1></div></article>')
+
+    def test_pages_render_in_their_language(self):
+        fs = MemoryFileSystem({
+            "template.html": '<html lang="{{ Lang }}">{{ Alternates }}{{ Content }}',
+            "content/about.md": "# About\n\n[Home](/)",
+            "content/fr/about.md": "# About\n\n[Home](/)",
+            "content/index.md": "# Home",
+            "content/contact.md": "# Contact\n\n[About](/about.html)",
+        })
+        site = SiteDaemon(BuildConfig(fs=fs, cache_dir=None, languages=["en", "fr"]))
+        site.rebuild()
+        english = site.render(source="content/about.md")
+        french = site.render(source="content/fr/about.md")
+        self.assertEqual(french["url"], "/fr/about.html")
+        self.assertFalse(french["cached"])
+        self.assertIn('<html lang="fr">', french["html"])
+        self.assertIn('<a href="/fr/">', french["html"])
+        self.assertIn('hreflang="en" href="/about.html"', french["html"])
+        self.assertIn('<html lang="en">', english["html"])
+        self.assertIn('<a href="/">', english["html"])
+        # A page without a translation is the default's text, linking within French
+        fallback = site.render(url="/fr/contact.html")
+        self.assertEqual(fallback["url"], "/fr/contact.html")
+        self.assertIn('<html lang="en">', fallback["html"])
+        self.assertIn('<a href="/fr/about.html">', fallback["html"])
+        self.assertIn('<a href="/about.html">', site.render(url="/contact.html")["html"])
+
+    def test_errors(self):
+        site, _fs = warm_site()
+        self.assertEqual(site.handle({"op": "nope"}), {"ok": False, "error": "Unknown op: nope"})
+        self.assertFalse(site.handle({"op": "render", "url": "/missing/"})["ok"])
+        self.assertFalse(site.handle({"op": "render", "colour": "red"})["ok"])
+
+    def test_sources_outside_the_content_are_refused(self):
+        site, fs = warm_site()
+        fs.write_text("secret.md", "# Secret")
+        fs.write_text("content/notes.txt", "# Notes")
+        for source in ("secret.md", "content/../secret.md", "/etc/passwd", "content/notes.txt", "content"):
+            with self.subTest(source=source):
+                response = site.handle({"op": "render", "source": source})
+                self.assertEqual(response, {"ok": False, "error": f"ValueError: Not a page of the site: {source}"})
+        self.assertTrue(site.handle({"op": "render", "source": "./content/blog/../index.md"})["ok"])
+
+    def test_symlinks_out_of_the_content_are_refused(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "content"))
+            with open(os.path.join(tmp, "secret.md"), "w") as f:
+                f.write("# Secret")
+            os.symlink(os.path.join(tmp, "secret.md"), os.path.join(tmp, "content", "link.md"))
+            site = SiteDaemon(BuildConfig(fs=DiskFileSystem(tmp), cache_dir=None))
+            self.assertIn("Not a page of the site", site.handle({"op": "render", "source": "content/link.md"})["error"])
+
+
+class TestSiteOptions(unittest.TestCase):
+    def test_options_shared_with_the_build(self):
+        parser = argparse.ArgumentParser()
+        add_site_arguments(parser)
+        parser.add_argument("--socket")
+        args = parser.parse_args(
+            ["/site/", "--languages", "en, fr", "--pretty-urls", "--typography", "--no-fingerprint", "--drafts"]
+        )
+        config = site_config(args)
+        self.assertEqual(config.basepath, "/site/")
+        self.assertEqual(config.languages, ["en", "fr"])
+        self.assertTrue(config.pretty_urls and config.drafts)
+        self.assertFalse(config.future or config.fingerprint)
+        self.assertIn("typography", config.extensions)
+        self.assertEqual(site_config(parser.parse_args([]), jobs=2).jobs, 2)
+
+
+class TestTransports(unittest.TestCase):
+    def serve(self, server):
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def test_unix_socket(self):
+        site, _fs = warm_site()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "site.sock")
+            self.serve(UnixSocketServer(path, site))
+            response = request(path, {"op": "render", "url": "/"})
+            self.assertEqual(response["title"], "Home")
+            self.assertEqual(request(path, {"op": "stats"})["renders"], 1)
+
+    def test_http(self):
+        site, _fs = warm_site()
+        server = LocalHTTPServer(0, site)
+        self.serve(server)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/render?url=/") as response:
+            self.assertEqual(json.load(response)["title"], "Home")
+        # A rebuild can not be set off by a link or an <img> on another site
+        with self.assertRaises(urllib.error.HTTPError) as refused:
+            urllib.request.urlopen(f"{base}/rebuild")
+        self.assertEqual((refused.exception.code, refused.exception.headers["Allow"]), (405, "POST"))
+        refused.exception.close()
+        self.assertEqual(site.stats()["rebuilds"], 1)
+        rebuild = urllib.request.Request(f"{base}/rebuild", data=b"{}", method="POST")
+        with urllib.request.urlopen(rebuild) as response:
+            self.assertEqual(json.load(response)["pages"], 2)
+        self.assertEqual(site.stats()["rebuilds"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import json
+import unittest
+
+from builder import BuildConfig, build
+from events import EventLog, Metrics
+from filesystem import MemoryFileSystem
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counters_and_gauges(self):
+        metrics = Metrics()
+        metrics.inc("pages_total", help="Pages generated.")
+        metrics.inc("pages_total", 2)
+        metrics.inc("cache_hits_total", 3, cache="assets")
+        metrics.set("build_seconds", 0.5)
+        self.assertEqual(metrics.value("pages_total"), 3)
+        self.assertEqual(
+            metrics.to_prometheus(),
+            "# TYPE ssg_build_seconds gauge\n"
+            "ssg_build_seconds 0.5\n"
+            "# TYPE ssg_cache_hits_total counter\n"
+            'ssg_cache_hits_total{cache="assets"} 3\n'
+            "# HELP ssg_pages_total Pages generated.\n"
+            "# TYPE ssg_pages_total counter\n"
+            "ssg_pages_total 3\n",
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = Metrics()
+        for seconds in (0.01, 0.2, 5):
+            metrics.observe("page_seconds", seconds, buckets=(0.1, 1.0))
+        self.assertEqual(
+            metrics.to_prometheus(),
+            "# TYPE ssg_page_seconds histogram\n"
+            'ssg_page_seconds_bucket{le="0.1"} 1\n'
+            'ssg_page_seconds_bucket{le="1"} 2\n'
+            'ssg_page_seconds_bucket{le="+Inf"} 3\n'
+            "ssg_page_seconds_sum 5.21\n"
+            "ssg_page_seconds_count 3\n",
+        )
+
+    def test_kind_conflict(self):
+        metrics = Metrics()
+        metrics.inc("pages_total")
+        with self.assertRaises(ValueError):
+            metrics.set("pages_total", 1)
+
+
+class TestBuildEvents(unittest.TestCase):
+    def site(self, **pages):
+        files = {"template.html": "{{ Title }}{{ Content }}"}
+        files.update({f"content/{path}": markdown for path, markdown in pages.items()})
+        return MemoryFileSystem(files)
+
+    def test_event_stream(self):
+        stream = io.StringIO()
+        result = build(BuildConfig(fs=self.site(**{"index.md": "# Home"}), cache_dir=None, events=EventLog(stream)))
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([event["event"] for event in events], ["build_start", "page", "build_end"])
+        self.assertEqual(events[1]["bytes"], len("Home<div><h1 id=\"home\">Home</h1></div>"))
+        self.assertEqual(events[2]["pages"], 1)
+        self.assertEqual(result.metrics.value("pages_total"), 1)
+        self.assertEqual(result.metrics.value("cache_misses_total", cache="search"), 1)
+
+    def test_quiet_by_default(self):
+        result = build(BuildConfig(fs=self.site(**{"index.md": "# Home"}), cache_dir=None))
+        self.assertIn("ssg_pages_total 1", result.metrics.to_prometheus())
+
+    def test_error_event(self):
+        stream = io.StringIO()
+        events = EventLog(stream)
+        with self.assertRaises(Exception):
+            build(BuildConfig(fs=self.site(**{"index.md": "no title"}), cache_dir=None, events=events))
+        last = json.loads(stream.getvalue().splitlines()[-1])
+        self.assertEqual(last["event"], "error")
+        self.assertIn("h1", last["error"])
+        self.assertEqual(events.metrics.value("build_errors_total"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
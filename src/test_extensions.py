@@ -0,0 +1,120 @@
+import unittest
+
+from extensions import HeadingAnchorsExtension, TablesExtension, FootnotesExtension, EXTENSIONS, \
+    parser_with_extensions, smarten
+from htmlnode import LeafNode
+from markdown_blocks import MarkdownParser, markdown_lines_to_html, markdown_to_html_node, SPAN_BREAK
+from textnode import TextType
+
+
+class TestHeadingAnchors(unittest.TestCase):
+    def test_heading_ids(self):
+        parser = MarkdownParser([HeadingAnchorsExtension()])
+        html = parser.parse("# Hello **World**\n\n## Setup\n\n## Setup").to_html()
+        self.assertEqual(
+            html,
+            '<div><h1 id="hello-world">Hello <b>World</b></h1>'
+            '<h2 id="setup">Setup</h2><h2 id="setup-1">Setup</h2></div>',
+        )
+
+    def test_default_parser_unchanged(self):
+        parser_with_extensions(["heading_anchors"])
+        self.assertEqual(markdown_to_html_node("# Title").to_html(), "<div><h1>Title</h1></div>")
+
+
+class TestTables(unittest.TestCase):
+    def test_table(self):
+        parser = MarkdownParser([TablesExtension()])
+        md = "| Name | Age |\n| :--- | --: |\n| **Bob** | 3 |\n| Sam |"
+        self.assertEqual(
+            parser.parse(md).to_html(),
+            '<div><table><thead><tr><th align="left">Name</th><th align="right">Age</th></tr></thead>'
+            '<tbody><tr><td align="left"><b>Bob</b></td><td align="right">3</td></tr>'
+            '<tr><td align="left">Sam</td><td align="right"></td></tr></tbody></table></div>',
+        )
+
+    def test_not_a_table(self):
+        parser = MarkdownParser([TablesExtension()])
+        md = "a | b\nno delimiter row"
+        self.assertEqual(parser.parse(md).to_html(), "<div><p>a | b no delimiter row</p></div>")
+
+
+class TestFootnotes(unittest.TestCase):
+    def test_footnotes(self):
+        parser = MarkdownParser([FootnotesExtension()])
+        md = "Text[^1] and `[^1]`.\n\n[^1]: The note\n    goes on."
+        self.assertEqual(
+            parser.parse(md).to_html(),
+            '<div><p>Text<sup id="fnref-1"><a href="#fn-1">1</a></sup> and <code>[^1]</code>.</p>'
+            '<section class="footnotes"><ol><li id="fn-1"><p>The note goes on. '
+            '<a href="#fnref-1">&#8617;</a></p></li></ol></section></div>',
+        )
+
+    def test_inline_step_order(self):
+        parser = MarkdownParser([FootnotesExtension()])
+        names = [step[0] for step in parser.inline_steps]
+        self.assertEqual(names.index("footnote_ref"), names.index("bold") - 1)
+
+
+class TestTypography(unittest.TestCase):
+    def setUp(self):
+        self.parser = parser_with_extensions(["typography"])
+
+    def html(self, markdown):
+        return self.parser.parse(markdown).to_html()
+
+    def test_punctuation(self):
+        self.assertEqual(
+            self.html("He said \"hi\" -- then left... It's over---in the '90s, 'once'."),
+            "<div><p>He said \u201chi\u201d \u2013 then left\u2026 It\u2019s over\u2014in the \u201990s, "
+            "\u2018once\u2019.</p></div>",
+        )
+
+    def test_placeholder_characters_in_the_text(self):
+        for control in "\x03\x05\x07\x08\x0e":
+            self.assertEqual(smarten([f'a{control}b "q"'], [SPAN_BREAK]), [f"a{control}b \u201cq\u201d"])
+
+    def test_units(self):
+        self.assertEqual(self.html("5 kg, 10 MB and 50 % of 3 km; not 2 kgs, 4 mmm or 1 cat"),
+                         "<div><p>5\u00a0kg, 10\u00a0MB and 50\u00a0% of 3\u00a0km; not 2 kgs, 4 mmm or 1 cat</p></div>")
+        self.assertEqual(self.html("\u201c5 GB\u201d, **8 mm**"),
+                         "<div><p>\u201c5\u00a0GB\u201d, <b>8\u00a0mm</b></p></div>")
+
+    def test_quotes_across_spans(self):
+        # One batch for the page: the quotes pair up around the bold text
+        self.assertEqual(self.html('"**Bold**" and _"it"_'),
+                         "<div><p>\u201c<b>Bold</b>\u201d and <i>\u201cit\u201d</i></p></div>")
+        self.assertEqual(self.html('# "Title"\n\n"Text"'),
+                         "<div><h1>\u201cTitle\u201d</h1><p>\u201cText\u201d</p></div>")
+
+    def test_code_and_html_untouched(self):
+        self.assertEqual(self.html('Run `"a" -- b` now "ok"'),
+                         '<div><p>Run <code>"a" -- b</code> now \u201cok\u201d</p></div>')
+        self.assertEqual(self.html('```\n"x" -- y...\n```'), '<div><pre><code>"x" -- y...\n</code></pre></div>')
+        self.assertEqual(self.html('<span class="x">"in"</span> <!-- c -->'),
+                         '<div><p><span class="x">\u201cin\u201d</span> <!-- c --></p></div>')
+        self.assertEqual(self.html('[a "b"](/x--y)'), '<div><p><a href="/x--y">a \u201cb\u201d</a></p></div>')
+
+    def test_streamed_output_matches(self):
+        parser = parser_with_extensions(list(EXTENSIONS) + ["typography"])
+        markdown = '# "Hi"\n\n- it\'s "one"\n- two -- three\n\n| a | "b" |\n|---|---|\n| c... | d |\n\nNote[^1].\n\n[^1]: "x"'
+        self.assertEqual(markdown_lines_to_html(markdown.split("\n"), parser=parser),
+                         parser.parse(markdown).to_html())
+
+    def test_not_on_by_default(self):
+        self.assertEqual(markdown_to_html_node('"a" -- b').to_html(), '<div><p>"a" -- b</p></div>')
+
+
+class TestRegistration(unittest.TestCase):
+    def test_unknown_extension(self):
+        with self.assertRaises(ValueError):
+            parser_with_extensions(["nope"])
+
+    def test_custom_inline_renderer(self):
+        parser = MarkdownParser()
+        parser.add_inline_renderer(TextType.BOLD, lambda node: LeafNode("strong", node.text))
+        self.assertEqual(parser.parse("**hi**").to_html(), "<div><p><strong>hi</strong></p></div>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from filesystem import MemoryFileSystem, DiskFileSystem, copy_tree
+
+
+class TestMemoryFileSystem(unittest.TestCase):
+    def test_read_write(self):
+        fs = MemoryFileSystem({"content/index.md": "# Hi"})
+        self.assertEqual(fs.read_text("content/index.md"), "# Hi")
+        self.assertTrue(fs.isdir("content"))
+        fs.makedirs("docs/blog")
+        with fs.open("docs/blog/index.html", "w") as f:
+            f.write("<p>é</p>")
+        self.assertEqual(fs.read_bytes("docs/blog/index.html"), "<p>é</p>".encode())
+        self.assertEqual(fs.listdir("docs"), ["blog"])
+        self.assertEqual(fs.stat("docs/blog/index.html").size, 9)
+        # New directories under an existing one are all listed
+        fs.makedirs("content/fr/blog")
+        self.assertEqual(fs.listdir("content"), ["fr", "index.md"])
+        self.assertEqual(fs.listdir(""), ["content", "docs"])
+
+    def test_missing(self):
+        fs = MemoryFileSystem()
+        with self.assertRaises(FileNotFoundError):
+            fs.read_text("nope.md")
+        with self.assertRaises(FileNotFoundError):
+            fs.write_text("no/dir.html", "")
+
+    def test_mtime_changes_on_write(self):
+        fs = MemoryFileSystem({"a.css": "x"})
+        before = fs.stat("a.css").mtime_ns
+        fs.write_text("a.css", "x")
+        self.assertNotEqual(fs.stat("a.css").mtime_ns, before)
+
+    def test_walk_and_rmtree(self):
+        fs = MemoryFileSystem({"s/a.css": "a", "s/js/b.js": "b"})
+        self.assertEqual(list(fs.walk("s")), [("s", ["js"], ["a.css"]), ("s/js", [], ["b.js"])])
+        fs.rmtree("s")
+        self.assertFalse(fs.exists("s/js/b.js"))
+        self.assertEqual(fs.listdir(""), [])
+
+    def test_deep_trees(self):
+        # Deeper than Python would let a recursive walk go
+        deep = "/".join(["d"] * (sys.getrecursionlimit() + 100))
+        fs = MemoryFileSystem({f"s/{deep}/a.css": "a"})
+        self.assertEqual(list(fs.walk("s"))[-1], (f"s/{deep}", [], ["a.css"]))
+        fs.rmtree("s")
+        self.assertEqual(fs.listdir(""), [])
+
+
+class TestCopyTree(unittest.TestCase):
+    def test_disk_to_memory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "static", "images"))
+            with open(os.path.join(tmp, "static", "images", "a.png"), "wb") as f:
+                f.write(b"png")
+            out = MemoryFileSystem()
+            copied = copy_tree(DiskFileSystem(tmp), "static", out, "docs")
+        self.assertEqual(copied, 1)
+        self.assertEqual(out.read_bytes("docs/images/a.png"), b"png")
+
+
+if __name__ == "__main__":
+    unittest.main()
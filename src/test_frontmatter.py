@@ -0,0 +1,32 @@
+import unittest
+
+from frontmatter import field_line, split_front_matter
+
+
+class TestSplitFrontMatter(unittest.TestCase):
+    def test_fields(self):
+        meta, body = split_front_matter('---\nlayout: blog\ntitle: "Hi: there"\n---\n# Hi')
+        self.assertEqual(meta, {"layout": "blog", "title": "Hi: there"})
+        # Line numbers are kept: the heading is still on line 5
+        self.assertEqual(body, "\n\n\n\n# Hi")
+
+    def test_no_front_matter(self):
+        self.assertEqual(split_front_matter("# Hi\n---\n"), ({}, "# Hi\n---\n"))
+
+    def test_rule_is_not_front_matter(self):
+        markdown = "---\nJust a paragraph after a rule\n---\n"
+        self.assertEqual(split_front_matter(markdown), ({}, markdown))
+
+    def test_field_line(self):
+        lines = "---\nlayout: blog\n\ndraft: maybe\n---\ndraft: body".split("\n")
+        self.assertEqual(field_line(lines, "draft"), 4)
+        self.assertIsNone(field_line(lines, "date"))
+        self.assertIsNone(field_line(["# draft: no front matter"], "draft"))
+
+    def test_unclosed(self):
+        markdown = "---\nlayout: blog\n# Hi"
+        self.assertEqual(split_front_matter(markdown), ({}, markdown))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+import os
+import tempfile
+import unittest
+
+from builder import BuildConfig, build
+from filesystem import DiskFileSystem, MemoryFileSystem
+from generations import Generations
+
+
+class TestGenerations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, "docs")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def publish(self, generations, text):
+        generation, staging = generations.new_staging()
+        with open(os.path.join(staging, "index.html"), "w") as f:
+            f.write(text)
+        generations.publish(generation, staging)
+        return generation
+
+    def live(self):
+        with open(os.path.join(self.dest, "index.html")) as f:
+            return f.read()
+
+    def test_symlink_switch(self):
+        generations = Generations(self.dest)
+        self.assertIsNone(generations.current())
+        self.assertEqual(self.publish(generations, "one"), 1)
+        self.assertEqual(self.publish(generations, "two"), 2)
+        self.assertTrue(os.path.islink(self.dest))
+        self.assertEqual(os.readlink(self.dest), os.path.join("docs.generations", "2"))
+        self.assertEqual(generations.current(), 2)
+        self.assertEqual(self.live(), "two")
+        self.assertEqual(generations.ids(), [1, 2])
+
+    def test_existing_directory_becomes_a_generation(self):
+        os.makedirs(self.dest)
+        with open(os.path.join(self.dest, "index.html"), "w") as f:
+            f.write("old")
+        generations = Generations(self.dest)
+        self.publish(generations, "new")
+        self.assertEqual(self.live(), "new")
+        self.assertEqual(generations.rollback(), 0)
+        self.assertEqual(self.live(), "old")
+
+    def test_rename_switch(self):
+        generations = Generations(self.dest, mode="rename")
+        self.publish(generations, "one")
+        self.publish(generations, "two")
+        self.assertFalse(os.path.islink(self.dest))
+        self.assertEqual(self.live(), "two")
+        self.assertEqual(generations.current(), 2)
+        self.assertEqual(generations.rollback(), 1)
+        self.assertEqual(self.live(), "one")
+        self.assertEqual(generations.current(), 1)
+
+    def test_rollback(self):
+        generations = Generations(self.dest)
+        for text in ("one", "two", "three"):
+            self.publish(generations, text)
+        self.assertEqual(generations.rollback(), 2)
+        self.assertEqual(self.live(), "two")
+        self.assertEqual(generations.rollback(), 1)
+        with self.assertRaises(ValueError):
+            generations.rollback()
+        # The next publish comes after every generation kept so far
+        self.assertEqual(self.publish(generations, "four"), 4)
+
+    def test_prune_keeps_the_newest(self):
+        generations = Generations(self.dest, keep=2)
+        for text in ("one", "two", "three", "four", "five"):
+            self.publish(generations, text)
+        self.assertEqual(generations.ids(), [3, 4, 5])
+
+    def test_stale_staging_is_removed(self):
+        generations = Generations(self.dest)
+        _, abandoned = generations.new_staging()
+        with open(os.path.join(abandoned, "half.html"), "w") as f:
+            f.write("")
+        generation, staging = generations.new_staging()
+        self.assertEqual(generation, 1)
+        self.assertEqual(os.listdir(staging), [])
+        self.assertIsNone(generations.current())
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Generations(self.dest, mode="copy")
+
+
+class TestAtomicBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        self.write("content/index.md", "# Home")
+        self.write("static/logo.png", "png")
+        self.write("static/index.css", "body {}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def write(self, name, text):
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        with open(self.path(name), "w") as f:
+            f.write(text)
+
+    def build(self, **options):
+        fs = DiskFileSystem(self.tmp.name)
+        return build(BuildConfig(fs=fs, cache_dir=None, search=False, atomic="symlink", **options))
+
+    def test_builds_are_published_as_generations(self):
+        first = self.build()
+        self.assertEqual(first.stats["generation"], 1)
+        self.assertEqual(first.dest_dir, "docs")
+        self.assertEqual(first.page("content/index.md").dest_path, "docs/index.html")
+        self.assertTrue(os.path.islink(self.path("docs")))
+
+        self.write("content/index.md", "# Changed")
+        second = self.build()
+        self.assertEqual(second.stats["generation"], 2)
+        with open(self.path("docs/index.html")) as f:
+            self.assertIn("Changed", f.read())
+        with open(self.path("docs.generations/1/index.html")) as f:
+            self.assertIn("Home", f.read())
+
+    def test_unchanged_files_are_hardlinked(self):
+        self.build()
+        self.write("static/index.css", "body { color: red; }")
+        result = self.build()
+        self.assertGreaterEqual(result.stats["linked_files"], 1)
+        old, new = self.path("docs.generations/1"), self.path("docs.generations/2")
+        self.assertEqual(os.stat(f"{old}/logo.png").st_ino, os.stat(f"{new}/logo.png").st_ino)
+        # A changed file is a new file; the old generation is untouched
+        self.assertNotEqual(os.stat(f"{old}/index.css").st_ino, os.stat(f"{new}/index.css").st_ino)
+        with open(f"{old}/index.css") as f:
+            self.assertEqual(f.read(), "body {}")
+
+    def test_failed_build_leaves_the_live_site(self):
+        self.build()
+        self.write("content/index.md", "# Broken **bold")
+        with self.assertRaises(ValueError):
+            self.build()
+        with open(self.path("docs/index.html")) as f:
+            self.assertIn("Home", f.read())
+        self.assertEqual(Generations(self.path("docs")).current(), 1)
+
+    def test_keep_going_keeps_the_failed_page(self):
+        self.write("content/about.md", "# About")
+        self.build()
+        self.write("content/about.md", "# About **bold")
+        result = self.build(keep_going=True)
+        self.assertEqual(len(result.errors), 1)
+        with open(self.path("docs/about.html")) as f:
+            self.assertIn("About", f.read())
+
+    def test_in_place_build_after_atomic(self):
+        self.build()
+        build(BuildConfig(fs=DiskFileSystem(self.tmp.name), cache_dir=None, search=False))
+        self.assertFalse(os.path.islink(self.path("docs")))
+        self.assertTrue(os.path.isfile(self.path("docs/index.html")))
+        self.assertTrue(os.path.isfile(self.path("docs.generations/1/index.html")))
+
+    def test_in_place_keep_going_build_after_atomic(self):
+        self.build()
+        self.write("content/index.md", "# Changed")
+        self.build()
+        self.write("docs.generations/2/extra.html", "kept")
+        with open(self.path("docs.generations/2/index.html")) as f:
+            published = f.read()
+        self.write("content/index.md", "# Changed again")
+        build(BuildConfig(fs=DiskFileSystem(self.tmp.name), cache_dir=None, search=False, keep_going=True))
+        # The build went to a copy in the link's place; generation 2 is as it was
+        self.assertFalse(os.path.islink(self.path("docs")))
+        with open(self.path("docs/index.html")) as f:
+            self.assertIn("Changed again", f.read())
+        self.assertFalse(os.path.exists(self.path("docs/extra.html")))
+        self.assertTrue(os.path.isfile(self.path("docs.generations/2/extra.html")))
+        with open(self.path("docs.generations/2/index.html")) as f:
+            self.assertEqual(f.read(), published)
+
+    def test_needs_a_disk_output(self):
+        with self.assertRaises(ValueError):
+            build(BuildConfig(fs=MemoryFileSystem({"template.html": ""}), cache_dir=None, atomic="symlink"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import io
+import json
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+
+from images import read_image_size, build_image_index, ImagesExtension, ImageInfo, PILImage
+from markdown_blocks import MarkdownParser
+
+
+def png_bytes(width, height):
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+    return b"\x89PNG\r\n\x1a\n" + chunk
+
+
+def jpeg_bytes(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    sof = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + app0 + sof + b"\xff\xd9"
+
+
+class TestImageSize(unittest.TestCase):
+    def test_png(self):
+        self.assertEqual(read_image_size(io.BytesIO(png_bytes(640, 480))), (640, 480))
+
+    def test_gif(self):
+        data = b"GIF89a" + struct.pack("<HH", 32, 16) + b"\x00" * 20
+        self.assertEqual(read_image_size(io.BytesIO(data)), (32, 16))
+
+    def test_jpeg_skips_segments(self):
+        self.assertEqual(read_image_size(io.BytesIO(jpeg_bytes(1024, 768))), (1024, 768))
+
+    def test_webp_vp8x(self):
+        data = b"RIFF" + b"\x00" * 4 + b"WEBPVP8X" + b"\x00" * 8 \
+            + (299).to_bytes(3, "little") + (199).to_bytes(3, "little")
+        self.assertEqual(read_image_size(io.BytesIO(data)), (300, 200))
+
+    def test_unknown(self):
+        self.assertIsNone(read_image_size(io.BytesIO(b"not an image at all")))
+
+
+class TestImageIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        os.makedirs(os.path.join(self.static, "images"))
+        with open(os.path.join(self.static, "images", "a.png"), "wb") as f:
+            f.write(png_bytes(800, 600))
+        with open(os.path.join(self.static, "index.css"), "w") as f:
+            f.write("body {}")
+        self.cache = os.path.join(self.tmp.name, "cache")
+        self.dest = os.path.join(self.tmp.name, "docs")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_index_and_cache(self):
+        index = build_image_index(self.static, self.dest, cache_dir=self.cache, jobs=1)
+        self.assertEqual(list(index), ["/images/a.png"])
+        self.assertEqual((index["/images/a.png"].width, index["/images/a.png"].height), (800, 600))
+        self.assertTrue(os.path.exists(os.path.join(self.cache, "images.json")))
+
+        # A second run is served from the cache (keyed by file hash)
+        # instead of reading the file again
+        cache_file = os.path.join(self.cache, "images.json")
+        with open(cache_file) as f:
+            cache = json.load(f)
+        for entry in cache.values():
+            entry["width"] = 999
+        with open(cache_file, "w") as f:
+            json.dump(cache, f)
+        index = build_image_index(self.static, self.dest, cache_dir=self.cache, jobs=1)
+        self.assertEqual(index["/images/a.png"].width, 999)
+
+    @unittest.skipIf(PILImage is None, "Pillow is not installed")
+    def test_variants(self):
+        PILImage.new("RGB", (800, 600)).save(os.path.join(self.static, "images", "b.png"))
+        index = build_image_index(self.static, self.dest, widths=[200], cache_dir=self.cache, jobs=1)
+        self.assertEqual(index["/images/b.png"].variants, [("/images/b-200w.png", 200)])
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "images", "b-200w.png")))
+
+
+class TestImagesExtension(unittest.TestCase):
+    def test_known_image(self):
+        index = {"/images/a.png": ImageInfo(800, 600, [("/images/a-400w.png", 400)])}
+        parser = MarkdownParser([ImagesExtension(index, "/site/")])
+        self.assertEqual(
+            parser.parse("![A](/images/a.png)").to_html(),
+            '<div><p><img src="/images/a.png" alt="A" width="800" height="600" '
+            'srcset="/site/images/a-400w.png 400w, /site/images/a.png 800w" '
+            'sizes="(max-width: 800px) 100vw, 800px" loading="lazy" decoding="async"></img></p></div>',
+        )
+
+    def test_unknown_image(self):
+        parser = MarkdownParser([ImagesExtension({})])
+        self.assertEqual(
+            parser.parse("![B](https://example.com/b.png)").to_html(),
+            '<div><p><img src="https://example.com/b.png" alt="B" loading="lazy" decoding="async"></img></p></div>',
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+from filesystem import MemoryFileSystem
+from layouts import LayoutError, Layouts
+
+BASE = (
+    "<html><title>{% block title %}{{ Title }}{% endblock %}</title>"
+    "{% block body %}<main>{{ Content }}</main>{% endblock %}</html>"
+)
+
+
+def layouts(**files):
+    files = {path.replace("__", "/").replace("_html", ".html"): text for path, text in files.items()}
+    return Layouts("template.html", fs=MemoryFileSystem(files))
+
+
+class TestLayouts(unittest.TestCase):
+    def test_default_template_blocks(self):
+        site = layouts(template_html=BASE)
+        self.assertEqual(
+            site.for_page("content/index.md"),
+            "<html><title>{{ Title }}</title><main>{{ Content }}</main></html>",
+        )
+
+    def test_inheritance(self):
+        site = layouts(
+            template_html=BASE,
+            layouts__blog_html='{% extends "template.html" %}'
+                               '{% block title %}Blog: {{ super }}{% endblock %}'
+                               'ignored text'
+                               '{% block body %}<article>{{ Content }}</article>{% endblock %}',
+            layouts__post_html='{% extends "blog.html" %}{% block body %}<aside>{{ TOC }}</aside>{{ super }}{% endblock %}',
+        )
+        self.assertEqual(
+            site.compile("layouts/post.html"),
+            "<html><title>Blog: {{ Title }}</title><aside>{{ TOC }}</aside><article>{{ Content }}</article></html>",
+        )
+
+    def test_selection(self):
+        site = layouts(
+            template_html="default",
+            layouts__docs_html="docs",
+            layouts__landing_html="landing",
+        )
+        self.assertEqual(site.for_page("content/index.md"), "default")
+        self.assertEqual(site.for_page("content/docs/api/intro.md"), "docs")
+        self.assertEqual(site.for_page("content/blog/post.md"), "default")
+        # Front matter wins over the directory
+        self.assertEqual(site.for_page("content/docs/index.md", {"layout": "landing"}), "landing")
+        with self.assertRaises(LayoutError):
+            site.for_page("content/index.md", {"layout": "missing"})
+
+    def test_compiled_once(self):
+        site = layouts(template_html=BASE, layouts__docs_html='{% extends "template.html" %}')
+        for _ in range(3):
+            site.for_page("content/docs/a.md")
+            site.for_page("content/b.md")
+        self.assertEqual(sorted(site.compiled), ["layouts/docs.html", "template.html"])
+        self.assertEqual(len(site.mtimes), 2)
+        self.assertFalse(site.changed())
+        site.fs.write_text("template.html", "edited")
+        self.assertTrue(site.changed())
+
+    def test_errors(self):
+        broken = {
+            "unclosed_html": "{% block a %}",
+            "stray_html": "{% endblock %}",
+            "twice_html": "{% block a %}{% endblock %}{% block a %}{% endblock %}",
+            "late_html": '<p>{% extends "template.html" %}',
+            "loop_html": '{% extends "loop.html" %}',
+        }
+        site = layouts(template_html=BASE, **broken)
+        for name in broken:
+            with self.assertRaises(LayoutError, msg=name):
+                site.compile(name.replace("_html", ".html"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from filesystem import MemoryFileSystem
+from link_checker import LinkCache, LinkChecker, LinkResult, check_links, collect_links
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    A few canned answers, with every request and connection counted.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_HEAD(self):
+        self.answer(body=False)
+
+    def do_GET(self):
+        self.answer(body=True)
+
+    def answer(self, body):
+        self.body = body
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path, time.monotonic()))
+        if self.path == "/no-head" and self.command == "HEAD":
+            return self.reply(405)
+        if self.path == "/moved":
+            return self.reply(301, {"Location": "/ok"})
+        if self.path == "/loop":
+            return self.reply(302, {"Location": "/loop"})
+        if self.path == "/slow":
+            time.sleep(1)
+        if self.path == "/busy":
+            return self.reply(503)
+        if self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            if body:
+                self.wfile.write(b"5\r\nhello\r\n0\r\n\r\n")
+            return
+        self.reply(200 if self.path in ("/ok", "/no-head", "/slow", "/a", "/b", "/c") else 404)
+
+    def reply(self, status, headers=None):
+        content = b"<p>stub</p>" if self.body else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(b"<p>stub</p>")))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = []
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-answer; that is the point
+        pass
+
+
+class LinkCheckerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def url(self, path):
+        return self.server.url + path
+
+    def check(self, paths, **options):
+        options.setdefault("rate", 0)
+        checker = LinkChecker(**options)
+        return checker, asyncio.run(checker.check_all(self.url(path) for path in paths))
+
+
+class TestLinkChecker(LinkCheckerTestCase):
+    def test_statuses(self):
+        _checker, results = self.check(["/ok", "/missing", "/moved", "/no-head", "/chunked", "/busy"])
+        status = {url[len(self.server.url):]: result.status for url, result in results.items()}
+        self.assertEqual(status, {"/ok": 200, "/missing": 404, "/moved": 200, "/no-head": 200, "/chunked": 200,
+                                  "/busy": 503})
+        self.assertEqual(results[self.url("/moved")].final_url, self.url("/ok"))
+        self.assertTrue(results[self.url("/ok")].ok)
+        self.assertFalse(results[self.url("/missing")].ok or results[self.url("/missing")].transient)
+        self.assertTrue(results[self.url("/busy")].transient)
+        # Only the server that refused HEAD was asked with GET
+        self.assertEqual({path for method, path, _ in self.server.requests if method == "GET"}, {"/no-head"})
+
+    def test_errors(self):
+        _checker, results = self.check(["/loop", "/slow"], timeout=0.2)
+        self.assertIn("redirects", results[self.url("/loop")].error)
+        self.assertIn("timed out", results[self.url("/slow")].error)
+        closed = LinkChecker(rate=0)
+        result = asyncio.run(closed.check_all(["http://127.0.0.1:1/"]))["http://127.0.0.1:1/"]
+        self.assertIsNone(result.status)
+        self.assertTrue(result.transient)
+
+    def test_connections_are_reused(self):
+        checker, results = self.check(["/a", "/b", "/c", "/ok", "/moved"], per_host=1)
+        self.assertTrue(all(result.ok for result in results.values()))
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.requests), 6)
+
+    def test_requests_to_a_host_are_spaced(self):
+        self.check(["/a", "/b", "/c", "/ok"], rate=20, per_host=4)
+        starts = sorted(at for _method, _path, at in self.server.requests)
+        gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+        # 20 requests a second: one every 50 ms, give or take the clock
+        self.assertGreater(min(gaps), 0.04)
+
+    def test_waiting_for_a_turn_is_not_a_timeout(self):
+        # Twelve requests at four a second take three seconds, each well
+        # within its own one second
+        paths = [f"/ok?{i}" for i in range(12)]
+        _checker, results = self.check(paths, rate=4, per_host=2, timeout=1)
+        self.assertEqual([result.error for result in results.values()], [None] * len(paths))
+
+
+class TestLinkCache(LinkCheckerTestCase):
+    def test_only_expired_results_are_checked_again(self):
+        fs = MemoryFileSystem()
+        now = [1000.0]
+        clock = lambda: now[0]
+        urls = [self.url("/ok"), self.url("/missing"), self.url("/busy")]
+
+        first = check_links(urls, LinkCache(".cache", 60, fs, clock), LinkChecker(rate=0, clock=clock))
+        self.assertEqual([first[url].status for url in urls], [200, 404, 503])
+        self.assertEqual(len(self.server.requests), 3)
+
+        # Within the TTL only the transient failure is asked again
+        now[0] += 30
+        second = check_links(urls, LinkCache(".cache", 60, fs, clock), LinkChecker(rate=0, clock=clock))
+        self.assertEqual([path for _method, path, _at in self.server.requests[3:]], ["/busy"])
+        self.assertEqual(second[self.url("/missing")].status, 404)
+
+        now[0] += 31
+        check_links(urls, LinkCache(".cache", 60, fs, clock), LinkChecker(rate=0, clock=clock))
+        self.assertEqual(len(self.server.requests), 7)
+
+    def test_round_trip(self):
+        fs = MemoryFileSystem()
+        cache = LinkCache(".cache", 60, fs, lambda: 10.0)
+        cache.put(LinkResult("https://example.com/", 404, None, "https://example.com/x", 5.0))
+        cache.save()
+        result = LinkCache(".cache", 60, fs, lambda: 10.0).get("https://example.com/")
+        self.assertEqual((result.status, result.final_url), (404, "https://example.com/x"))
+
+
+class TestCollectLinks(unittest.TestCase):
+    def test_external_links_only(self):
+        fs = MemoryFileSystem({
+            "content/index.md": "---\ntitle: Home\n---\n# Home\n\n[a](https://example.com/a#top) [b](/local)\n"
+                                "![logo](http://cdn.example.com/logo.png) `[c](https://example.com/code)`\n\n"
+                                "```\n[d](https://example.com/fenced)\n```",
+            "content/blog/post.md": "[a](https://example.com/a#end) [mail](mailto:me@example.com)",
+        })
+        self.assertEqual(collect_links("content", fs), {
+            "https://example.com/a": ["content/blog/post.md", "content/index.md"],
+            "http://cdn.example.com/logo.png": ["content/index.md"],
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import json
+import unittest
+from unittest import mock
+
+import generate_page
+from builder import BuildConfig, build
+from filesystem import MemoryFileSystem
+from locales import Locales, locale_of
+from markdown_blocks import MarkdownParser
+from sharding import merge_shards
+from test_builder import site
+
+LANGUAGES = ["en", "fr", "de"]
+
+PAGES = {
+    "content/index.md": "# Home\n\nSee [the blog](/blog/) and [about](/about.html).\n\n```\nshared code\n```",
+    "content/index.fr.md": "# Accueil\n\nVoir [le blog](/blog/).\n\n```\nshared code\n```",
+    "content/about.md": "# About\n\nWho we are.",
+    "content/blog/index.md": "# Blog\n\nPosts.",
+    "content/de/blog/index.md": "# Blog\n\nBeiträge.",
+}
+
+
+TEMPLATE = '<html lang="{{ Lang }}"><head>{{ Alternates }}</head>{{ Content }}</html>'
+
+
+class TestLocales(unittest.TestCase):
+    def test_locale_of(self):
+        self.assertEqual(locale_of("fr/blog/post.md", LANGUAGES, "en"), ("fr", "blog/post.md"))
+        self.assertEqual(locale_of("blog/post.fr.md", LANGUAGES, "en"), ("fr", "blog/post.md"))
+        self.assertEqual(locale_of("blog/post.md", LANGUAGES, "en"), ("en", "blog/post.md"))
+        # Not a language of the site: just a dotted name
+        self.assertEqual(locale_of("v1.2.md", LANGUAGES, "en"), ("en", "v1.2.md"))
+        self.assertEqual(locale_of("es/post.md", LANGUAGES, "en"), ("en", "es/post.md"))
+
+    def test_fallbacks(self):
+        locales = Locales(LANGUAGES, fs=site(PAGES, TEMPLATE))
+        pages = {(page.lang, page.key): page for page in locales.all_pages()}
+        self.assertEqual(len(pages), 9)
+        self.assertEqual(pages[("fr", "index.md")].source, "content/index.fr.md")
+        self.assertEqual(pages[("de", "index.md")].source, "content/index.md")
+        self.assertTrue(pages[("de", "index.md")].fallback)
+        self.assertEqual(pages[("de", "blog/index.md")].dest_path, "docs/de/blog/index.html")
+        self.assertEqual(pages[("en", "about.md")].dest_path, "docs/about.html")
+        self.assertEqual(locales.translated(), 5)
+
+    def test_two_sources_for_one_page(self):
+        fs = MemoryFileSystem({"content/fr/a.md": "# A", "content/a.fr.md": "# A"})
+        with self.assertRaises(ValueError):
+            Locales(LANGUAGES, fs=fs)
+
+    def test_links(self):
+        links = Locales(LANGUAGES, fs=site(PAGES, TEMPLATE)).links("fr")
+        self.assertEqual(links["/blog/"], "/fr/blog/")
+        self.assertEqual(links["/blog"], "/fr/blog/")
+        self.assertEqual(links["/about.html"], "/fr/about.html")
+        self.assertEqual(links["/"], "/fr/")
+
+
+class TestMultilingualBuild(unittest.TestCase):
+    def test_trees(self):
+        fs = site(PAGES, TEMPLATE)
+        result = build(BuildConfig(fs=fs, languages=LANGUAGES, cache_dir=None))
+        self.assertEqual(result.stats["locales"], {"languages": 3, "translated": 5, "fallbacks": 4,
+                                                   "shared_parses": 4})
+        self.assertEqual(sorted(page.url for page in result.pages), [
+            "/", "/about.html", "/blog/", "/de/", "/de/about.html", "/de/blog/", "/fr/", "/fr/about.html", "/fr/blog/",
+        ])
+        french = fs.read_text("docs/fr/index.html")
+        self.assertIn('<html lang="fr">', french)
+        self.assertIn('<a href="/fr/blog/">le blog</a>', french)
+        self.assertIn('<link rel="alternate" hreflang="en" href="/" />', french)
+        self.assertIn('<link rel="alternate" hreflang="x-default" href="/" />', french)
+        self.assertNotIn('hreflang="de"', french)
+
+        # A fallback page: the default's text, linking within its language
+        german = fs.read_text("docs/de/index.html")
+        self.assertIn('<html lang="en">', german)
+        self.assertIn('<a href="/de/blog/">the blog</a> and <a href="/de/about.html">about</a>', german)
+        self.assertIn('<a href="/blog/">the blog</a>', fs.read_text("docs/index.html"))
+        self.assertNotIn("hreflang", fs.read_text("docs/de/about.html"))
+
+        # One search index per language
+        for search_dir, count in (("docs/search", 3), ("docs/fr/search", 3), ("docs/de/search", 3)):
+            self.assertEqual(len(json.loads(fs.read_text(f"{search_dir}/pages.json"))["pages"]), count)
+        self.assertEqual(json.loads(fs.read_text("docs/fr/search/pages.json"))["pages"][0][1][:4], "/fr/")
+
+    def test_untranslated_pages_are_parsed_once(self):
+        fs = site(PAGES, TEMPLATE)
+        parse_page = generate_page.parse_page
+        with mock.patch.object(generate_page, "parse_page", side_effect=parse_page) as parsed:
+            build(BuildConfig(fs=fs, languages=LANGUAGES, cache_dir=None))
+        self.assertEqual(parsed.call_count, 5)
+
+    def test_shared_text_is_split_once(self):
+        parser = MarkdownParser()
+        parser.inline_cache = {}
+        english = parser.parse("# Title\n\nSame **words**.\n\nEnglish.").to_html()
+        french = parser.parse("# Titre\n\nSame **words**.\n\nFrançais.").to_html()
+        self.assertIn("<p>Same <b>words</b>.</p>", french)
+        self.assertEqual(english, MarkdownParser().parse("# Title\n\nSame **words**.\n\nEnglish.").to_html())
+        self.assertEqual(len(parser.inline_cache), 5)
+
+    def test_parallel(self):
+        fs = site(PAGES, TEMPLATE)
+        serial = build(BuildConfig(fs=fs, languages=LANGUAGES, cache_dir=None))
+        parallel = build(BuildConfig(fs=fs, languages=LANGUAGES, cache_dir=None, jobs=2))
+        self.assertEqual([(page.url, page.html) for page in parallel.pages],
+                         [(page.url, page.html) for page in serial.pages])
+        self.assertEqual(parallel.stats["locales"]["shared_parses"], 4)
+
+    def test_layouts_look_through_language_dirs(self):
+        fs = site(PAGES, TEMPLATE)
+        fs.write_text("template.html", "{{ Content }}")
+        fs.makedirs("layouts")
+        fs.write_text("layouts/blog.html", "<main>{{ Content }}</main>")
+        build(BuildConfig(fs=fs, languages=LANGUAGES, cache_dir=None))
+        self.assertTrue(fs.read_text("docs/de/blog/index.html").startswith("<main>"))
+
+    def test_shards_merge_every_language(self):
+        fs = site(PAGES, TEMPLATE)
+        full = build(BuildConfig(fs=fs, languages=LANGUAGES, cache_dir=None))
+        for index in (1, 2):
+            build(BuildConfig(fs=fs, dest_dir=f"out/{index}", languages=LANGUAGES, cache_dir=None, shard=(index, 2)))
+        merged = merge_shards(["out/1", "out/2"], "merged", fs)
+        self.assertEqual((merged["pages"], merged["search_pages"]), (len(full.pages), len(full.pages)))
+        for page in full.pages:
+            self.assertEqual(fs.read_text(page.dest_path.replace("docs/", "merged/", 1)), page.html)
+
+    def test_one_language_is_the_plain_build(self):
+        fs = MemoryFileSystem({"template.html": "{{ Content }}", "content/index.md": "# Home"})
+        plain = build(BuildConfig(fs=fs, cache_dir=None))
+        self.assertEqual(build(BuildConfig(fs=fs, cache_dir=None, languages=["en"])).pages[0].html, plain.pages[0].html)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+import mapped_markdown
+from builder import BuildConfig, build
+from extensions import EXTENSIONS, parser_with_extensions
+from filesystem import DiskFileSystem
+from generate_page import parse_page
+from inline_markdown import MarkdownSyntaxError
+from mapped_markdown import MappedMarkdown
+from markdown_blocks import markdown_lines_to_html, markdown_to_html_node
+
+PAGE = """# Reference
+
+Intro with a note[^1] and **bold**.
+
+## compute
+
+```python
+def compute():
+    ...
+```
+
+- one
+- two
+
+[^1]: The note.
+"""
+
+
+class TestMappedMarkdown(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def mapped(self, data: bytes) -> MappedMarkdown:
+        path = os.path.join(self.tmp.name, "page.md")
+        with open(path, "wb") as f:
+            f.write(data)
+        source = MappedMarkdown(path)
+        self.addCleanup(source.close)
+        return source
+
+    def test_lines_match_split(self):
+        for text in ("", "\n", "a", "a\n", "a\n\nb", "é\n\n  x\n", "# T\n" * 3):
+            with self.subTest(text=text):
+                self.assertEqual(list(self.mapped(text.encode()).lines()), text.split("\n"))
+
+    def test_crlf(self):
+        # Both ways of parsing a page read CRLF files as if they were LF
+        page = PAGE + "    indented code\n\n| a | b |\n|---|---|\n| 1 | 2 |\n"
+        parser = parser_with_extensions(list(EXTENSIONS))
+        expected = parse_page(page, parser)
+        crlf = page.replace("\n", "\r\n")
+        self.assertEqual(parse_page(crlf, parser), expected)
+        self.assertEqual(parse_page(self.mapped(crlf.encode()), parser), expected)
+        self.assertEqual(self.mapped(b"---\r\ntitle: T\r\n---\r\n# T").meta, {"title": "T"})
+
+    def test_front_matter_lines_are_blank(self):
+        source = self.mapped(b"---\nlayout: docs\n---\n# Title\nbody")
+        self.assertEqual(source.meta, {"layout": "docs"})
+        self.assertEqual(list(source.lines()), ["", "", "", "# Title", "body"])
+        self.assertEqual(source.title(), "Title")
+
+    def test_title_and_hash(self):
+        source = self.mapped(PAGE.encode())
+        with self.assertRaises(MarkdownSyntaxError):
+            source.title()
+        list(source.lines())
+        self.assertEqual(source.title(), "Reference")
+        self.assertEqual(source.content_hash(), hashlib.sha256(PAGE.encode()).hexdigest())
+
+
+class TestStreamedRendering(unittest.TestCase):
+    def test_same_html_as_the_tree(self):
+        parser = parser_with_extensions(list(EXTENSIONS))
+        self.assertEqual(
+            markdown_lines_to_html(PAGE.split("\n"), parser),
+            markdown_to_html_node(PAGE, parser).to_html(),
+        )
+
+    def test_build_maps_big_pages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "content"))
+            with open(os.path.join(tmp, "template.html"), "w") as f:
+                f.write("<title>{{ Title }}</title>{{ Content }}")
+            with open(os.path.join(tmp, "content", "big.md"), "w") as f:
+                f.write(PAGE)
+            with open(os.path.join(tmp, "content", "bad.md"), "w") as f:
+                f.write("---\ndraft: no\n---\n# Bad\n\nnot **closed\n")
+
+            config = BuildConfig(fs=DiskFileSystem(tmp), cache_dir=None, keep_going=True)
+            expected = build(config)
+            threshold = mapped_markdown.MMAP_THRESHOLD
+            mapped_markdown.MMAP_THRESHOLD = 0
+            self.addCleanup(setattr, mapped_markdown, "MMAP_THRESHOLD", threshold)
+            for jobs in (None, 2):
+                config.jobs = jobs
+                result = build(config)
+                self.assertEqual(result.page("content/big.md").html, expected.page("content/big.md").html)
+                # Errors still point at the line in the file
+                self.assertEqual(str(result.errors[0]), str(expected.errors[0]))
+        self.assertEqual(expected.errors[0].line, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
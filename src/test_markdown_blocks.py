@@ -1,6 +1,10 @@
+import time
 import unittest
 
-from markdown_blocks import markdown_to_blocks, block_to_block_type, BlockType, markdown_to_html_node, extract_title
+from benchmarks import nested_list_markdown
+from inline_markdown import MarkdownSyntaxError
+from markdown_blocks import markdown_to_blocks, block_to_block_type, BlockType, markdown_to_html_node, extract_title, \
+    markdown_to_html_node_legacy
 
 
 class TestMarkdownToBlocks(unittest.TestCase):
@@ -146,5 +150,113 @@ This is another paragraph with _italic_ text and `code` here
             "<div><blockquote>This is a quote block</blockquote></div>",
         )
 
+class TestNestedBlocks(unittest.TestCase):
+    def test_nested_list(self):
+        md = "- a\n  - b\n  - c\n- d"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><ul><li>a<ul><li>b</li><li>c</li></ul></li><li>d</li></ul></div>",
+        )
+
+    def test_loose_list_with_paragraphs(self):
+        md = "- first\n\n  second paragraph\n- next"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><ul><li><p>first</p><p>second paragraph</p></li><li><p>next</p></li></ul></div>",
+        )
+
+    def test_nested_list_blank_line_keeps_outer_tight(self):
+        md = "- a\n  - b\n\n    c\n- d"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><ul><li>a<ul><li><p>b</p><p>c</p></li></ul></li><li>d</li></ul></div>",
+        )
+
+    def test_lazy_continuation(self):
+        md = "- item text\ncontinues here\n\n> quoted\nlazy line"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><ul><li>item text continues here</li></ul><blockquote>quoted lazy line</blockquote></div>",
+        )
+
+    def test_ordered_list_start(self):
+        md = "3. three\n4. four"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            '<div><ol start="3"><li>three</li><li>four</li></ol></div>',
+        )
+
+    def test_ordered_list_cannot_interrupt_paragraph(self):
+        md = "We won in\n1984. Then\n2. more"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><p>We won in 1984. Then 2. more</p></div>",
+        )
+
+    def test_codeblock_in_list_item(self):
+        md = "- a\n  ```\n  raw *text*\n\n  more\n  ```\n- b"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><ul><li>a<pre><code>raw *text*\n\nmore\n</code></pre></li><li>b</li></ul></div>",
+        )
+
+    def test_codeblock(self):
+        md = "```\nThis is text that _should_ remain\nthe **same** even with inline stuff\n```"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><pre><code>This is text that _should_ remain\nthe **same** even with inline stuff\n</code></pre></div>",
+        )
+
+    def test_quote_with_list_and_paragraph(self):
+        md = "> - a\n> - b\n>\n> after"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><blockquote><ul><li>a</li><li>b</li></ul><p>after</p></blockquote></div>",
+        )
+
+    def test_matches_legacy_on_flat_documents(self):
+        md = "# Title\n\nSome **bold** text\nwrapped.\n\n- one\n- two\n\n1. a\n2. b\n\n> quote"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            markdown_to_html_node_legacy(md).to_html(),
+        )
+
+    def test_deep_nesting_is_linear(self):
+        def per_char(depth):
+            md = nested_list_markdown(depth)
+            best = float("inf")
+            for _ in range(3):
+                start = time.perf_counter()
+                markdown_to_html_node(md)
+                best = min(best, time.perf_counter() - start)
+            return best / len(md)
+
+        # Quadratic work per line would make this ratio grow with depth;
+        # the bound is generous to stay stable on slow machines.
+        self.assertLess(per_char(240) / per_char(60), 3)
+
+
+class TestErrorLocations(unittest.TestCase):
+    def locate(self, md):
+        with self.assertRaises(MarkdownSyntaxError) as context:
+            markdown_to_html_node(md)
+        return context.exception.line, context.exception.column
+
+    def test_unclosed_delimiter_in_paragraph(self):
+        self.assertEqual(self.locate("# T\n\nhello\nthere **bold\n\nok"), (4, 7))
+
+    def test_unclosed_delimiter_in_heading(self):
+        self.assertEqual(self.locate("text\n\n## bad `code"), (3, 8))
+
+    def test_unclosed_delimiter_in_list_item(self):
+        # Columns count from the start of the item's content
+        self.assertEqual(self.locate("- a\n- b _x"), (2, 3))
+
+    def test_missing_title(self):
+        with self.assertRaises(MarkdownSyntaxError) as context:
+            extract_title("no title")
+        self.assertEqual((context.exception.line, context.exception.column), (1, 1))
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,225 @@
+import os
+import random
+import time
+import unittest
+
+from extensions import EXTENSIONS, parser_with_extensions
+from inline_markdown import MarkdownSyntaxError
+from markdown_blocks import markdown_lines_to_html, markdown_to_html_node, markdown_to_html_node_legacy
+from toc import Outline
+
+# Random documents are reproducible; FUZZ_SEED and FUZZ_CASES run other
+# or longer campaigns (e.g. FUZZ_CASES=100000 ./test.sh overnight)
+SEED = int(os.environ.get("FUZZ_SEED", "20240611"))
+CASES = int(os.environ.get("FUZZ_CASES", "300"))
+
+PARSER = parser_with_extensions(list(EXTENSIONS))
+
+WORDS = ["alpha", "beta", "gamma", "delta", "code", "x", "42", "naïve", "&", "<tag>", "a-b", "end."]
+
+# Markdown's special characters, overrepresented
+NOISE = "*_`[]()!#>-+.|~^:\\ \n\n1a"
+
+
+def inline_text(rng: random.Random) -> str:
+    """
+    A line of text with well-formed spans, as writers produce them.
+    """
+    parts = []
+    for _ in range(rng.randint(1, 8)):
+        word = rng.choice(WORDS)
+        kind = rng.randrange(10)
+        if kind == 0:
+            word = f"**{word}**"
+        elif kind == 1:
+            word = f"*{word}*"
+        elif kind == 2:
+            word = f"_{word}_"
+        elif kind == 3:
+            word = f"`{word}`"
+        elif kind == 4:
+            word = f"[{word}](/{rng.choice(WORDS)})"
+        elif kind == 5:
+            word = f"![{word}](/img/{rng.randrange(9)}.png)"
+        parts.append(word)
+    return " ".join(parts)
+
+
+def flat_document(rng: random.Random) -> str:
+    """
+    Top-level blocks only: what the legacy parser understands too.
+    """
+    blocks = []
+    previous = None
+    for _ in range(rng.randint(1, 8)):
+        kind = rng.randrange(6)
+        # Two lists of one kind in a row are one (loose) list to the
+        # single-pass parser, but two lists to the legacy one
+        while kind in (2, 3) and kind == previous:
+            kind = rng.randrange(6)
+        previous = kind
+        if kind == 0:
+            blocks.append("#" * rng.randint(1, 6) + " " + inline_text(rng))
+        elif kind == 1:
+            blocks.append("\n".join(inline_text(rng) for _ in range(rng.randint(1, 3))))
+        elif kind == 2:
+            blocks.append("\n".join("- " + inline_text(rng) for _ in range(rng.randint(1, 4))))
+        elif kind == 3:
+            blocks.append("\n".join(f"{i}. " + inline_text(rng) for i in range(1, rng.randint(2, 5))))
+        elif kind == 4:
+            blocks.append("> " + inline_text(rng))
+        else:
+            # No blank lines: the legacy parser would split the block there
+            body = "\n".join(rng.choice(["a *b*", "x = [1](2)", "  indented"]) for _ in range(rng.randint(0, 3)))
+            blocks.append(f"```\n{body}\n```" if body else "```\n```")
+    return "\n\n".join(blocks)
+
+
+def nested_document(rng: random.Random) -> str:
+    """
+    Containers inside containers, tables and footnotes, at random depths.
+    """
+    lines = []
+    for _ in range(rng.randint(1, 30)):
+        prefix = "".join(rng.choice(["> ", "- ", "1. ", "  ", "   ", ""]) for _ in range(rng.randint(0, 6)))
+        kind = rng.randrange(8)
+        if kind == 0:
+            lines.append("")
+        elif kind == 1:
+            lines.append(prefix + "```" + rng.choice(["", "python"]))
+        elif kind == 2:
+            lines.append(prefix + "| a | *b* |\n" + prefix + "| - | :-: |\n" + prefix + "| 1 | 2 |")
+        elif kind == 3:
+            lines.append(prefix + f"note[^{rng.randrange(3)}]\n\n[^{rng.randrange(3)}]: " + inline_text(rng))
+        elif kind == 4:
+            lines.append(prefix + "#" * rng.randint(1, 7) + " " + inline_text(rng))
+        else:
+            lines.append(prefix + inline_text(rng))
+    return "\n".join(lines)
+
+
+def noise(rng: random.Random, size: int) -> str:
+    return "".join(rng.choice(NOISE) for _ in range(size))
+
+
+def render(markdown: str, parser=None) -> str:
+    return markdown_to_html_node(markdown, parser, Outline(), []).to_html()
+
+
+class TestFuzz(unittest.TestCase):
+    """
+    Whatever the input, the parser either renders it or raises a
+    MarkdownSyntaxError that points into the document; nothing else.
+    """
+
+    def check(self, markdown: str) -> None:
+        for parser in (None, PARSER):
+            try:
+                html = render(markdown, parser)
+            except MarkdownSyntaxError as e:
+                self.assertIsNotNone(e.line, markdown)
+                self.assertTrue(1 <= e.line <= markdown.count("\n") + 1, (e.line, markdown))
+                self.assertGreaterEqual(e.column, 1, markdown)
+                # Streaming the lines fails the same way
+                with self.assertRaises(MarkdownSyntaxError) as streamed:
+                    markdown_lines_to_html(markdown.split("\n"), parser, Outline(), [])
+                self.assertEqual((streamed.exception.line, str(streamed.exception)), (e.line, str(e)), markdown)
+            except Exception as e:
+                self.fail(f"{type(e).__name__}: {e} on {markdown!r}")
+            else:
+                self.assertTrue(html.startswith("<div>") and html.endswith("</div>"), markdown)
+                # The two ways of parsing agree
+                streamed = markdown_lines_to_html(markdown.split("\n"), parser, Outline(), [])
+                self.assertEqual(streamed, html, markdown)
+
+    def test_documents(self):
+        rng = random.Random(SEED)
+        for _ in range(CASES):
+            self.check(nested_document(rng))
+
+    def test_noise(self):
+        rng = random.Random(SEED + 1)
+        for _ in range(CASES):
+            self.check(noise(rng, rng.randint(0, 200)))
+
+    def test_noise_in_documents(self):
+        rng = random.Random(SEED + 2)
+        for _ in range(CASES):
+            markdown = flat_document(rng)
+            cut = rng.randint(0, len(markdown))
+            self.check(markdown[:cut] + noise(rng, rng.randint(1, 20)) + markdown[cut:])
+
+    def test_deep_nesting(self):
+        # Far past Python's recursion limit if anything recursed per level
+        depth = 3000
+        for markdown in ("> " * depth + "x", "- " * depth + "x", "\n".join("  " * i + "- x" for i in range(depth // 4))):
+            html = markdown_to_html_node(markdown, PARSER).to_html()
+            self.assertTrue(html.endswith("</div>"))
+
+
+class TestDifferential(unittest.TestCase):
+    """
+    The single-pass parser must keep producing what the original parser
+    did on the documents both understand, so speedups to either cannot
+    silently change a page.
+    """
+
+    def test_matches_legacy(self):
+        rng = random.Random(SEED + 3)
+        for _ in range(CASES):
+            markdown = flat_document(rng)
+            self.assertEqual(
+                markdown_to_html_node(markdown).to_html(),
+                markdown_to_html_node_legacy(markdown).to_html(),
+                markdown,
+            )
+
+
+def _seconds(markdown: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            markdown_to_html_node(markdown, PARSER).to_html()
+        except MarkdownSyntaxError:
+            pass
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Inputs known to make naive parsers superlinear; each takes a size n
+ADVERSARIAL = {
+    "nested brackets": lambda n: "[" * n + "x" + "]" * n,
+    "unclosed links": lambda n: "[a](" * n,
+    "links": lambda n: "[a](b) " * n,
+    "images": lambda n: "![a](b) " * n,
+    "emphasis": lambda n: "*a* _b_ **c** `d` " * n,
+    "unbalanced emphasis": lambda n: "**a " * n + "*",
+    "backtick runs": lambda n: "`" * n,
+    "footnotes": lambda n: "x[^1] " * n + "\n\n[^1]: note",
+    "nested quotes": lambda n: "> " * n + "x",
+    "nested lists": lambda n: "- " * n + "x",
+    "table rows": lambda n: "| a | b |\n| - | - |\n" + "| x | *y* |\n" * n,
+    "same headings": lambda n: "## Same\n\n" * n,
+    "open fences": lambda n: "```\n" * n,
+}
+
+
+class TestLinearTime(unittest.TestCase):
+    """
+    Time budgets that scale with the input: parsing 8x the input may take
+    at most 8x the time (times a margin for noisy machines), whatever
+    the input looks like.
+    """
+
+    def test_adversarial_inputs(self):
+        for name, make in ADVERSARIAL.items():
+            with self.subTest(name):
+                small, large = make(400), make(3200)
+                per_byte_small = _seconds(small, 5) / len(small)
+                per_byte_large = _seconds(large, 3) / len(large)
+                self.assertLess(per_byte_large / per_byte_small, 3, name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import unittest
+
+import mapped_markdown
+from builder import BuildConfig, build
+from filesystem import DiskFileSystem
+from page_diff import block_diff, block_hash, merkle_root
+from test_builder import site
+
+PAGES = {
+    "content/index.md": "# Home\n\nIntro.\n\n## News\n\nNothing yet.\n\n- a\n- b",
+    "content/about.md": "# About\n\nWho we are.",
+    "content/blog/post.md": "# Post\n\nText.",
+}
+
+
+TEMPLATE = "<title>{{ Title }}</title>{{ Content }}"
+
+
+def changes(fs, **options):
+    build(BuildConfig(fs=fs, changes="changes.json", **options))
+    return json.loads(fs.read_text("changes.json"))
+
+
+class TestBlockDiff(unittest.TestCase):
+    def test_ranges(self):
+        self.assertEqual(block_diff(["a", "b", "c"], ["a", "b", "c"]), [])
+        self.assertEqual(block_diff(["a", "b", "c"], ["a", "x", "c"]),
+                         [{"op": "replace", "old": [1, 2], "new": [1, 2]}])
+        self.assertEqual(block_diff(["a", "c"], ["a", "b", "c"]), [{"op": "insert", "old": [1, 1], "new": [1, 2]}])
+        self.assertEqual(block_diff(["a", "b"], ["b"]), [{"op": "delete", "old": [0, 1], "new": [0, 0]}])
+
+    def test_root(self):
+        hashes = [block_hash("<p>a</p>"), block_hash("<p>b</p>")]
+        self.assertEqual(merkle_root(hashes), merkle_root(list(hashes)))
+        self.assertNotEqual(merkle_root(hashes), merkle_root(hashes[::-1]))
+
+
+class TestPageChanges(unittest.TestCase):
+    def test_reports_changed_urls(self):
+        fs = site(PAGES, TEMPLATE)
+        first = changes(fs)
+        self.assertEqual(first["added"], ["/", "/about.html", "/blog/post.html"])
+
+        self.assertEqual(changes(fs)["unchanged"], len(PAGES))
+        fs.write_text("content/about.md", "# About\n\nWho we are now.")
+        fs.write_text("content/new.md", "# New")
+        fs.remove("content/blog/post.md")
+        report = changes(fs)
+        self.assertEqual(
+            (report["changed"], report["added"], report["removed"], report["unchanged"]),
+            (["/about.html"], ["/new.html"], ["/blog/post.html"], 1),
+        )
+
+    def test_touched_but_same_output(self):
+        fs = site(PAGES, TEMPLATE)
+        changes(fs)
+        # A comment-only edit of the front matter renders the same page
+        fs.write_text("content/about.md", "---\n# reviewed\n---\n# About\n\nWho we are.")
+        self.assertEqual(changes(fs)["changed"], [])
+
+    def test_block_diff(self):
+        fs = site(PAGES, TEMPLATE)
+        changes(fs, diff_blocks=True)
+        fs.write_text("content/index.md", PAGES["content/index.md"].replace("Nothing yet.", "Launch!"))
+        report = changes(fs, diff_blocks=True)
+        self.assertEqual(report["changed"], ["/"])
+        # h1, p, h2, p, ul: the fourth block changed
+        self.assertEqual(report["blocks"], {"/": [{"op": "replace", "old": [3, 4], "new": [3, 4]}]})
+
+        # Only the template changed: every page, and no block
+        fs.write_text("template.html", "<title>{{ Title }}</title><main>{{ Content }}</main>")
+        report = changes(fs, diff_blocks=True)
+        self.assertEqual(len(report["changed"]), len(PAGES))
+        self.assertEqual(report["blocks"], {url: [] for url in report["changed"]})
+
+    def test_failed_page_is_not_removed(self):
+        fs = site(PAGES, TEMPLATE)
+        changes(fs)
+        fs.write_text("content/about.md", "# About\n\nnot **closed")
+        report = changes(fs, keep_going=True)
+        self.assertEqual((report["changed"], report["removed"]), ([], []))
+
+    def test_same_hashes_however_pages_are_read(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for path, text in dict(PAGES, **{"template.html": "{{ Content }}"}).items():
+                os.makedirs(os.path.join(tmp, os.path.dirname(path)), exist_ok=True)
+                with open(os.path.join(tmp, path), "w") as f:
+                    f.write(text)
+            config = BuildConfig(fs=DiskFileSystem(tmp), cache_dir=None, diff_blocks=True)
+            expected = {page.source: page.blocks for page in build(config).pages}
+            self.assertEqual(len(expected["content/index.md"]), 5)
+
+            threshold = mapped_markdown.MMAP_THRESHOLD
+            mapped_markdown.MMAP_THRESHOLD = 0
+            self.addCleanup(setattr, mapped_markdown, "MMAP_THRESHOLD", threshold)
+            for jobs in (None, 2):
+                config.jobs = jobs
+                self.assertEqual({page.source: page.blocks for page in build(config).pages}, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
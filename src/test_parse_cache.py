@@ -0,0 +1,126 @@
+import unittest
+from unittest import mock
+
+import generate_page
+from builder import BuildConfig, build
+from filesystem import MemoryFileSystem
+from parse_cache import ParseCache, parser_version, prune
+from test_builder import site
+from toc import Outline
+
+PAGES = {
+    "content/index.md": "# Home\n\n## Intro\n\nWelcome to **the** site.",
+    "content/about.md": "# About\n\nWho we are.",
+    "content/blog/post.md": "# Post\n\n## Part one\n\n```\ncode\n```",
+}
+
+
+TEMPLATE = "<title>{{ Title }}</title>{{ TOC }}{{ Content }}"
+
+
+def no_parsing(*args, **kwargs):
+    raise AssertionError("parsed a page the cache had")
+
+
+class TestParseCache(unittest.TestCase):
+    def test_entry_round_trip(self):
+        fs = MemoryFileSystem()
+        cache = ParseCache(".cache", "v1", fs=fs)
+        outline = Outline()
+        outline.add(2, "Intro")
+        cache.put("abc", "Home", "<div>x</div>", outline, ["Home", "x"], ["0123"])
+        cache.save()
+
+        cache = ParseCache(".cache", "v1", fs=fs)
+        title, html, cached_outline, texts, blocks = cache.get("abc", True, True, True)
+        self.assertEqual((title, html, texts, blocks), ("Home", "<div>x</div>", ["Home", "x"], ["0123"]))
+        self.assertEqual(cached_outline.to_list(), outline.to_list())
+        # Other parsers, other outline settings: other entries
+        self.assertIsNone(cache.get("abc", False, False))
+        self.assertIsNone(ParseCache(".cache", "v2", fs=fs).get("abc", True, False))
+
+    def test_entry_without_texts(self):
+        cache = ParseCache(".cache", "v1", fs=MemoryFileSystem())
+        cache.put("abc", "Home", "<div>x</div>", None, None)
+        self.assertIsNone(cache.get("abc", False, True))
+        self.assertIsNone(cache.get("abc", False, False, True))
+        self.assertEqual(cache.get("abc", False, False)[:2], ("Home", "<div>x</div>"))
+        self.assertEqual((cache.stats["hits"], cache.stats["misses"]), (1, 2))
+
+    def test_least_recently_used_are_evicted(self):
+        fs = MemoryFileSystem()
+        cache = ParseCache(".cache", "v1", fs=fs)
+        for name in ("a", "b", "c"):
+            cache.put(name, name, "x" * 100, None, None)
+        cache.entries[cache.key("a", False)][1] = 1.0
+        cache.entries[cache.key("b", False)][1] = 2.0
+        cache.max_bytes = cache.size() - 1
+        cache.save()
+        self.assertEqual(cache.stats["evicted"], 1)
+        self.assertIsNone(cache.get("a", False, False))
+        self.assertIsNotNone(cache.get("b", False, False))
+
+    def test_prune(self):
+        fs = MemoryFileSystem()
+        cache = ParseCache(".cache", "v1", fs=fs)
+        cache.put("a", "a", "x", None, None)
+        cache.save()
+        # Written by a build that never saved its index
+        cache.put("b", "b", "x", None, None)
+        self.assertEqual(prune(".cache", fs=fs)["orphans"], 1)
+        self.assertEqual(prune(".cache", 0, fs=fs), {"entries": 0, "bytes": 0, "evicted": 1, "orphans": 0})
+        self.assertEqual(fs.listdir(".cache/parse/entries/" + cache.key("a", False)[:2]), [])
+
+    def test_version_follows_the_parser(self):
+        extensions = ["tables"]
+        self.assertEqual(parser_version(extensions), parser_version(extensions))
+        self.assertNotEqual(parser_version(extensions), parser_version(extensions, basepath="/blog/"))
+        self.assertNotEqual(parser_version(extensions), parser_version(["tables", "footnotes"]))
+
+
+class TestBuildWithParseCache(unittest.TestCase):
+    def test_unchanged_pages_are_not_parsed(self):
+        fs = site(PAGES, TEMPLATE)
+        first = build(BuildConfig(fs=fs))
+        self.assertEqual(first.stats["parse_cache"]["stored"], len(PAGES))
+
+        with mock.patch.object(generate_page, "parse_page", no_parsing):
+            second = build(BuildConfig(fs=fs))
+        self.assertEqual(second.stats["parse_cache"]["hits"], len(PAGES))
+        for page in first.pages:
+            self.assertEqual(second.page(page.source).html, page.html)
+        self.assertIn('<li><a href="#intro">Intro</a></li>', second.page("content/index.md").html)
+
+        fs.write_text("content/about.md", "# About\n\nWho we are now.")
+        third = build(BuildConfig(fs=fs))
+        self.assertEqual((third.stats["parse_cache"]["hits"], third.stats["parse_cache"]["misses"]), (2, 1))
+        self.assertIn("now", third.page("content/about.md").html)
+
+    def test_search_texts(self):
+        fs = site(PAGES, TEMPLATE)
+        build(BuildConfig(fs=fs, search=False))
+        # The search index needs every page's texts, which were not kept
+        result = build(BuildConfig(fs=fs))
+        self.assertEqual(result.stats["parse_cache"]["misses"], len(PAGES))
+        fs.rmtree(".cache/search")
+        with mock.patch.object(generate_page, "parse_page", no_parsing):
+            result = build(BuildConfig(fs=fs))
+        self.assertEqual(result.stats["search"]["changed"], len(PAGES))
+
+    def test_parallel(self):
+        fs = site(PAGES, TEMPLATE)
+        first = build(BuildConfig(fs=fs, jobs=2))
+        second = build(BuildConfig(fs=fs, jobs=2))
+        self.assertEqual(second.stats["parse_cache"]["hits"], len(PAGES))
+        self.assertEqual([page.html for page in second.pages], [page.html for page in first.pages])
+        self.assertEqual(second.metrics.value("cache_hits_total", cache="parse"), len(PAGES))
+
+    def test_turned_off(self):
+        fs = site(PAGES, TEMPLATE)
+        result = build(BuildConfig(fs=fs, parse_cache_size=None))
+        self.assertNotIn("parse_cache", result.stats)
+        self.assertFalse(fs.exists(".cache/parse"))
+
+
+if __name__ == "__main__":
+    unittest.main()
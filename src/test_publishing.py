@@ -0,0 +1,129 @@
+import datetime
+import unittest
+from unittest import mock
+
+import generate_page
+from builder import BuildConfig, build
+from filesystem import MemoryFileSystem
+from page_errors import PageFailed
+from publishing import filter_publishable, publish_date, read_header, skip_reason
+
+NOW = datetime.datetime(2026, 10, 19, 12, 0, tzinfo=datetime.timezone.utc)
+
+PAGES = {
+    "template.html": "{{ Content }}",
+    "content/index.md": "# Home",
+    "content/blog/out.md": "---\ndate: 2026-10-01\n---\n# Out",
+    "content/blog/wip.md": "---\ndraft: true\n---\n# Work in progress",
+    "content/blog/soon.md": "---\ndate: 2026-11-02T09:00:00+01:00\n---\n# Soon",
+}
+
+
+class Lines:
+    # A file that counts how many of its lines were read
+    def __init__(self, lines):
+        self.lines = lines
+        self.read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        for line in self.lines:
+            self.read += 1
+            yield line
+
+
+class TestPublishing(unittest.TestCase):
+    def test_reads_only_the_header(self):
+        lines = Lines(["---\n", "draft: yes\n", "---\n"] + ["# Body\n"] * 100)
+        self.assertEqual(read_header("page.md", mock.Mock(open=lambda path, mode: lines)), {"draft": "yes"})
+        self.assertEqual(lines.read, 3)
+        lines = Lines(["# No front matter\n"] * 100)
+        self.assertEqual(read_header("page.md", mock.Mock(open=lambda path, mode: lines)), {})
+        self.assertEqual(lines.read, 1)
+
+    def test_skip_reason(self):
+        self.assertEqual(skip_reason({}, NOW), (None, None))
+        self.assertEqual(skip_reason({"draft": "True"}, NOW), ("draft", None))
+        self.assertEqual(skip_reason({"draft": "no", "date": "2026-10-19T11:59:00Z"}, NOW), (None, None))
+        soon = publish_date("2026-10-19T14:30:00+02:00")
+        self.assertEqual(skip_reason({"date": "2026-10-19T14:30:00+02:00"}, NOW), ("scheduled", soon))
+        self.assertEqual(skip_reason({"draft": "true"}, NOW, drafts=True), (None, None))
+        self.assertEqual(skip_reason({"date": "2099-01-01"}, NOW, future=True), (None, None))
+
+    def test_malformed_fields(self):
+        with self.assertRaises(ValueError):
+            skip_reason({"draft": "maybe"}, NOW)
+        fs = MemoryFileSystem({"content/a.md": "---\ndate: next week\n---\n# A"})
+        with self.assertRaisesRegex(ValueError, "content/a.md"):
+            filter_publishable([("content/a.md", "docs/a.html")], fs, NOW)
+        errors = []
+        kept, skipped = filter_publishable([("content/a.md", "docs/a.html")], fs, NOW, errors=errors)
+        self.assertEqual((kept, skipped), ([], []))
+        self.assertEqual([str(error) for error in errors],
+                         ["content/a.md:2: date: 'next week' is not a date (YYYY-MM-DD) or an ISO 8601 time"])
+
+    def test_filter(self):
+        fs = MemoryFileSystem(PAGES)
+        pages = [(f"content/{name}.md", f"docs/{name}.html") for name in ("index", "blog/out", "blog/wip", "blog/soon")]
+        kept, skipped = filter_publishable(pages, fs, NOW)
+        self.assertEqual(kept, pages[:2])
+        self.assertEqual([(page.source, page.reason) for page in skipped],
+                         [("content/blog/wip.md", "draft"), ("content/blog/soon.md", "scheduled")])
+        self.assertEqual(skipped[1].to_dict()["date"], "2026-11-02T09:00:00+01:00")
+        self.assertEqual(filter_publishable(pages, fs, NOW, drafts=True, future=True), (pages, []))
+
+
+class TestPublishingBuild(unittest.TestCase):
+    def test_skipped_pages_are_never_parsed(self):
+        fs = MemoryFileSystem(PAGES)
+        parse_page = generate_page.parse_page
+        with mock.patch.object(generate_page, "parse_page", side_effect=parse_page) as parsed:
+            result = build(BuildConfig(fs=fs, cache_dir=None, now=NOW))
+        self.assertEqual(parsed.call_count, 2)
+        self.assertEqual(sorted(page.url for page in result.pages), ["/", "/blog/out.html"])
+        self.assertEqual(result.stats["skipped"], {"draft": 1, "scheduled": 1})
+        self.assertEqual([page.source for page in result.skipped], ["content/blog/soon.md", "content/blog/wip.md"])
+        self.assertFalse(fs.exists("docs/blog/wip.html"))
+        self.assertNotIn("Work in progress", fs.read_text("docs/search/pages.json"))
+
+    def test_malformed_fields_with_keep_going(self):
+        fs = MemoryFileSystem(dict(PAGES, **{
+            "content/blog/maybe.md": "---\ntitle: Maybe\ndraft: maybe\n---\n# Maybe",
+            "content/blog/when.md": "---\ndate: notadate\n---\n# When",
+        }))
+        result = build(BuildConfig(fs=fs, cache_dir=None, now=NOW, keep_going=True))
+        self.assertEqual([str(error) for error in result.errors], [
+            "content/blog/maybe.md:3: draft: 'maybe' is neither true nor false",
+            "content/blog/when.md:2: date: 'notadate' is not a date (YYYY-MM-DD) or an ISO 8601 time",
+        ])
+        self.assertEqual(sorted(page.url for page in result.pages), ["/", "/blog/out.html"])
+        self.assertFalse(fs.exists("docs/blog/maybe.html"))
+        self.assertEqual(result.stats["errors"], 2)
+        # Without keep_going the first one stops the build, with where it is
+        with self.assertRaises(PageFailed) as failed:
+            build(BuildConfig(fs=fs, cache_dir=None, now=NOW))
+        self.assertEqual((failed.exception.error.source, failed.exception.error.line), ("content/blog/maybe.md", 3))
+
+    def test_preview(self):
+        fs = MemoryFileSystem(PAGES)
+        result = build(BuildConfig(fs=fs, cache_dir=None, now=NOW, drafts=True, future=True))
+        self.assertEqual(len(result.pages), 4)
+        self.assertEqual(result.skipped, [])
+        # Once published, a page shows up in the next build
+        result = build(BuildConfig(fs=fs, cache_dir=None, now=NOW + datetime.timedelta(days=30)))
+        self.assertEqual([page.source for page in result.skipped], ["content/blog/wip.md"])
+
+    def test_draft_translation_falls_back(self):
+        fs = MemoryFileSystem(dict(PAGES, **{"content/index.fr.md": "---\ndraft: true\n---\n# Accueil"}))
+        result = build(BuildConfig(fs=fs, cache_dir=None, now=NOW, languages=["en", "fr"]))
+        self.assertEqual(fs.read_text("docs/fr/index.html"), fs.read_text("docs/index.html"))
+        self.assertEqual(result.stats["locales"]["translated"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
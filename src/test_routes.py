@@ -0,0 +1,150 @@
+import unittest
+
+from builder import BuildConfig, build
+from filesystem import MemoryFileSystem
+from generate_page import collect_pages
+from page_errors import PageFailed
+from routes import alias_path, link_forms, page_path, route_pages, RouteTable, url_slots
+
+PAGES = {
+    "template.html": '<html><head><link href="/index.css" rel="stylesheet"></head><body>{{ Content }}</body></html>',
+    "static/index.css": "body {}",
+    "content/index.md": "# Home\n\nRead [the post](/blog/post.md#intro), [the blog](/blog/) and "
+                        "[Bread](/blog/2019-04-01-bread.md).",
+    "content/blog/index.md": "# Blog\n\n[Home](/)",
+    "content/blog/post.md": "# Post\n\n![Cover](/images/cover.png)",
+    "content/blog/2019-04-01-bread.md": "---\nslug: bread\naliases: /bread.html, /recipes/bread/\n---\n# Bread",
+}
+
+
+class TestRoutes(unittest.TestCase):
+    def test_url_slots(self):
+        html = '<a href="/a.md">a</a> <a href="https://x.org/">x</a> <img src="/i.png"> <a href="//cdn/x">c</a>'
+        slots = url_slots(html)
+        self.assertEqual(slots[1::2], ["/a.md", "/i.png"])
+        self.assertEqual("".join(slots), html)
+        self.assertEqual(url_slots("<p>no links</p>"), ["<p>no links</p>"])
+
+    def test_page_path(self):
+        self.assertEqual(page_path("blog/post.md", {}), "blog/post.html")
+        self.assertEqual(page_path("blog/post.md", {}, pretty=True), "blog/post/index.html")
+        self.assertEqual(page_path("blog/index.md", {}, pretty=True), "blog/index.html")
+        self.assertEqual(page_path("blog/2019-bread.md", {"slug": "bread"}, pretty=True), "blog/bread/index.html")
+        # Only the .md suffix is ever replaced
+        self.assertEqual(page_path("notes.md.d/a.md", {}), "notes.md.d/a.html")
+        for meta in ({"slug": "a/b"}, {"slug": ""}, {"slug": ".."}):
+            with self.assertRaises(ValueError):
+                page_path("blog/post.md", meta)
+        with self.assertRaises(ValueError):
+            page_path("blog/index.md", {"slug": "b"})
+
+    def test_link_forms_and_aliases(self):
+        self.assertEqual(link_forms("blog/post.md"), ["/blog/post.md", "/blog/post.html"])
+        self.assertEqual(link_forms("blog/index.md"), ["/blog/index.md", "/blog/index.html", "/blog/", "/blog"])
+        self.assertEqual(link_forms("index.md"), ["/index.md", "/index.html", "/"])
+        self.assertEqual(alias_path("/old.html"), "old.html")
+        self.assertEqual(alias_path("/old"), "old/index.html")
+
+    def test_resolve(self):
+        routes = RouteTable("docs", "/site/", {"/index.css": "/index.abc.css"})
+        routes.add("content/blog/post.md", "docs/blog/post/index.html", link_forms("blog/post.md"), ["/old/"])
+        self.assertEqual(routes.resolve("/blog/post.md"), "/site/blog/post/")
+        self.assertEqual(routes.resolve("/blog/post.html?x=1#top"), "/site/blog/post/?x=1#top")
+        self.assertEqual(routes.resolve("/blog/post"), "/site/blog/post/")
+        self.assertEqual(routes.resolve("/old"), "/site/blog/post/")
+        self.assertEqual(routes.resolve("/index.css"), "/site/index.abc.css")
+        self.assertEqual(routes.resolve("/images/a.png"), "/site/images/a.png")
+        self.assertEqual(routes.redirects, {"docs/old/index.html": "/site/blog/post/"})
+
+    def test_conflicts(self):
+        fs = MemoryFileSystem({"content/a.md": "# A", "content/b.md": "---\nslug: a\n---\n# B"})
+        with self.assertRaisesRegex(ValueError, "content/a.md and content/b.md"):
+            route_pages(collect_pages("content", "docs", fs), "content", "docs", fs=fs)
+        fs = MemoryFileSystem({"content/a.md": "# A", "content/b.md": "---\naliases: /a.html\n---\n# B"})
+        with self.assertRaisesRegex(ValueError, "alias of content/b.md"):
+            route_pages(collect_pages("content", "docs", fs), "content", "docs", fs=fs)
+
+
+class TestRoutedBuild(unittest.TestCase):
+    def test_plain_urls(self):
+        fs = MemoryFileSystem(PAGES)
+        result = build(BuildConfig(fs=fs, cache_dir=None, basepath="/site/"))
+        self.assertEqual(sorted(page.url for page in result.pages),
+                         ["/site/", "/site/blog/", "/site/blog/bread.html", "/site/blog/post.html"])
+        home = fs.read_text("docs/index.html")
+        self.assertIn('<a href="/site/blog/post.html#intro">the post</a>', home)
+        self.assertIn('<a href="/site/blog/">the blog</a>', home)
+        self.assertIn('<a href="/site/blog/bread.html">Bread</a>', home)
+        self.assertRegex(home, r'<link href="/site/index\.\w+\.css"')
+        self.assertIn('src="/site/images/cover.png"', fs.read_text("docs/blog/post.html"))
+
+    def test_pretty_urls_and_redirects(self):
+        fs = MemoryFileSystem(PAGES)
+        result = build(BuildConfig(fs=fs, cache_dir=None, basepath="/site/", pretty_urls=True))
+        self.assertEqual(sorted(page.url for page in result.pages),
+                         ["/site/", "/site/blog/", "/site/blog/bread/", "/site/blog/post/"])
+        self.assertTrue(fs.exists("docs/blog/post/index.html"))
+        home = fs.read_text("docs/index.html")
+        self.assertIn('<a href="/site/blog/post/#intro">the post</a>', home)
+        self.assertIn('<a href="/site/blog/bread/">Bread</a>', home)
+        self.assertEqual(result.stats["redirects"], 2)
+        for stub in ("docs/bread.html", "docs/recipes/bread/index.html"):
+            self.assertIn('<meta http-equiv="refresh" content="0; url=/site/blog/bread/">', fs.read_text(stub))
+
+    def test_redirects_are_reported_as_changes(self):
+        fs = MemoryFileSystem(PAGES)
+        build(BuildConfig(fs=fs, cache_dir=".cache", pretty_urls=True))
+        fs.write_text("content/blog/post.md", "---\naliases: /first-post/\n---\n# Post")
+        result = build(BuildConfig(fs=fs, cache_dir=".cache", pretty_urls=True))
+        self.assertEqual(result.stats["changes"], {"changed": 1, "added": 1, "removed": 0})
+
+    def test_languages(self):
+        fs = MemoryFileSystem(dict(PAGES, **{
+            "content/blog/post.md": "---\naliases: /first-post/\n---\n# Post",
+            "content/fr/blog/2019-04-01-bread.md": "---\nslug: pain\n---\n# Pain",
+            "content/fr/index.md": "# Accueil\n\nLire [le pain](/blog/bread/).",
+        }))
+        build(BuildConfig(fs=fs, cache_dir=None, languages=["en", "fr"], pretty_urls=True))
+        self.assertTrue(fs.exists("docs/fr/blog/pain/index.html"))
+        self.assertIn('<a href="/fr/blog/pain/">le pain</a>', fs.read_text("docs/fr/index.html"))
+        # A fallback page's aliases redirect within its language
+        self.assertIn("url=/fr/blog/post/", fs.read_text("docs/fr/first-post/index.html"))
+        self.assertIn("url=/blog/post/", fs.read_text("docs/first-post/index.html"))
+        # The translation has no aliases of its own
+        self.assertTrue(fs.exists("docs/bread.html"))
+        self.assertFalse(fs.exists("docs/fr/bread.html"))
+
+    def test_bad_slugs_and_aliases_with_keep_going(self):
+        fs = MemoryFileSystem(dict(PAGES, **{
+            "content/blog/index.md": "---\nslug: a/b\n---\n# Blog",
+            "content/blog/post.md": "---\ntitle: Post\naliases: http://elsewhere/\n---\n# Post",
+        }))
+        result = build(BuildConfig(fs=fs, cache_dir=None, keep_going=True))
+        self.assertEqual([str(error) for error in result.errors], [
+            "content/blog/index.md:2: slug: an index page is named after its directory",
+            "content/blog/post.md:3: aliases: 'http://elsewhere/' is not a root-relative url",
+        ])
+        self.assertEqual(sorted(page.url for page in result.pages), ["/", "/blog/bread.html"])
+        self.assertTrue(fs.exists("docs/blog/bread.html"))
+        self.assertFalse(fs.exists("docs/blog/index.html"))
+        # The same in a multilingual site
+        result = build(BuildConfig(fs=fs, cache_dir=None, keep_going=True, languages=["en", "fr"]))
+        self.assertEqual([error.source for error in result.errors], ["content/blog/index.md", "content/blog/post.md"])
+        self.assertTrue(fs.exists("docs/fr/blog/bread.html"))
+        with self.assertRaisesRegex(PageFailed, "content/blog/index.md:2: slug"):
+            build(BuildConfig(fs=fs, cache_dir=None))
+
+    def test_parallel(self):
+        fs = MemoryFileSystem(PAGES)
+        serial = build(BuildConfig(fs=fs, cache_dir=None, pretty_urls=True))
+        parallel = build(BuildConfig(fs=fs, cache_dir=None, pretty_urls=True, jobs=2))
+        self.assertEqual([(page.url, page.html) for page in parallel.pages],
+                         [(page.url, page.html) for page in serial.pages])
+
+    def test_dotted_directories(self):
+        fs = MemoryFileSystem({"template.html": "{{ Content }}", "content/notes.md-old/a.md": "# A"})
+        build(BuildConfig(fs=fs, cache_dir=None))
+        self.assertTrue(fs.exists("docs/notes.md-old/a.html"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+
+from markdown_blocks import markdown_to_html_node
+from search_index import SearchIndex, tokenize, shard_key, page_url
+
+
+def read_json(*parts):
+    with open(os.path.join(*parts)) as f:
+        return json.load(f)
+
+
+class TestTokenize(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize(["Tom **Bombadil**", "and a TOM"]),
+            {"tom": [0, 4], "bombadil": [1], "and": [2]},
+        )
+
+    def test_shard_key(self):
+        self.assertEqual(shard_key("tolkien"), "to")
+        self.assertEqual(shard_key("élan"), "_e9l")
+
+    def test_page_url(self):
+        self.assertEqual(page_url("docs", "docs/blog/tom/index.html", "/site/"), "/site/blog/tom/")
+        self.assertEqual(page_url("docs", "docs/index.html"), "/")
+
+    def test_text_sink_collects_spans(self):
+        sink = []
+        markdown_to_html_node("# Title\n\nSome **bold** [link](/x)\n\n```\nno code\n```", text_sink=sink)
+        self.assertEqual(sink, ["Title", "Some ", "bold", " ", "link"])
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.state = os.path.join(self.tmp.name, "cache")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, pages):
+        index = SearchIndex(self.dest, "/", self.state)
+        for source, (content_hash, texts) in pages.items():
+            dest_path = os.path.join(self.dest, source.replace(".md", ".html"))
+            text = texts if index.needs_text(source, content_hash) else None
+            index.add_page(source, dest_path, source, content_hash, text)
+        return index.write()
+
+    def test_index_and_incremental_updates(self):
+        stats = self.build({"a.md": ("1", ["hobbit hole"]), "b.md": ("1", ["hobbit feet feet"])})
+        self.assertEqual(stats["changed"], 2)
+        shard = read_json(self.dest, "search", "shards", "ho.json")
+        self.assertEqual(shard["hobbit"], [[0, [0]], [1, [0]]])
+        self.assertEqual(read_json(self.dest, "search", "shards", "fe.json")["feet"], [[1, [1, 1]]])
+
+        # Nothing changed: no shard is rewritten
+        stats = self.build({"a.md": ("1", ["hobbit hole"]), "b.md": ("1", ["hobbit feet feet"])})
+        self.assertEqual((stats["changed"], stats["shards_written"]), (0, 0))
+
+        # b changes, a is removed: only their shards are touched
+        stats = self.build({"b.md": ("2", ["wizard"])})
+        self.assertEqual((stats["changed"], stats["removed"]), (1, 1))
+        self.assertEqual(stats["shards_written"], 3)
+        self.assertEqual(read_json(self.dest, "search", "shards", "wi.json"), {"wizard": [[1, [0]]]})
+        shard_dir = os.path.join(self.state, "search", "shards")
+        self.assertFalse(os.path.exists(os.path.join(shard_dir, "ho.json")))
+        self.assertEqual(read_json(self.dest, "search", "pages.json")["pages"], [[1, "/b.html", "b.md"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
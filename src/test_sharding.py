@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from builder import BuildConfig, build
+from sharding import merge_shards, parse_shard, shard_of
+from test_builder import site
+
+PAGES = {f"content/{name}.md": f"# Page {name}\n\nWords about {name}." for name in
+         ("index", "about", "blog/one", "blog/two", "blog/three", "docs/a", "docs/b", "docs/c")}
+
+
+TEMPLATE = "<title>{{ Title }}</title>{{ Content }}"
+
+
+def search_by_url(fs, search_dir):
+    # Page ids differ between a full and a merged build; urls do not
+    urls = {page_id: url for page_id, url, _title in json.loads(fs.read_text(f"{search_dir}/pages.json"))["pages"]}
+    terms = {}
+    for name in fs.listdir(f"{search_dir}/shards"):
+        for term, postings in json.loads(fs.read_text(f"{search_dir}/shards/{name}")).items():
+            terms[term] = sorted((urls[page_id], deltas) for page_id, deltas in postings)
+    return sorted(urls.values()), terms
+
+
+class TestShards(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for text in ("0/4", "5/4", "1/0", "2", "a/b"):
+            with self.assertRaises(ValueError, msg=text):
+                parse_shard(text)
+
+    def test_partition(self):
+        sources = list(PAGES)
+        shards = [shard_of(source, "content", 3) for source in sources]
+        self.assertTrue(all(1 <= shard <= 3 for shard in shards))
+        # Stable, and independent of where the content directory is
+        self.assertEqual(shards, [shard_of(source, "content", 3) for source in sources])
+        self.assertEqual(shards, [shard_of("site/" + source, "site/content", 3) for source in sources])
+
+    def test_merge_equals_full_build(self):
+        fs = site(PAGES, TEMPLATE)
+        full = build(BuildConfig(fs=fs, cache_dir=None, page_index=True))
+        built = []
+        for index in (1, 2, 3):
+            dest = f"out/{index}"
+            result = build(BuildConfig(fs=fs, dest_dir=dest, cache_dir=None, page_index=True, shard=(index, 3)))
+            built.extend(page.source for page in result.pages)
+            self.assertTrue(fs.exists(f"{dest}/shard.json"))
+        self.assertEqual(sorted(built), sorted(PAGES))
+
+        merged = merge_shards(["out/3", "out/1", "out/2"], "merged", fs)
+        self.assertEqual(merged["pages"], len(PAGES))
+        self.assertFalse(fs.exists("merged/shard.json"))
+        for page in full.pages:
+            self.assertEqual(fs.read_text(page.dest_path.replace("docs/", "merged/", 1)), page.html)
+        self.assertEqual(fs.read_text("merged/page-index.json"), fs.read_text("docs/page-index.json"))
+        self.assertEqual(fs.read_text("merged/asset-manifest.json"), fs.read_text("docs/asset-manifest.json"))
+        self.assertEqual(search_by_url(fs, "merged/search"), search_by_url(fs, "docs/search"))
+
+    def test_merge_checks_the_shards(self):
+        fs = site(PAGES, TEMPLATE)
+        for index in (1, 2):
+            build(BuildConfig(fs=fs, dest_dir=f"out/{index}", cache_dir=None, shard=(index, 3)))
+        with self.assertRaisesRegex(ValueError, r"missing \[3\]"):
+            merge_shards(["out/1", "out/2"], "merged", fs)
+
+        build(BuildConfig(fs=fs, dest_dir="out/3", cache_dir=None, shard=(3, 3)))
+        fs.write_text("out/3/index.css", "body { color: red }")
+        with self.assertRaisesRegex(ValueError, "disagree about index.css"):
+            merge_shards(["out/1", "out/2", "out/3"], "merged", fs)
+
+
+class TestShardProcesses(unittest.TestCase):
+    def test_command_line(self):
+        main = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+        with tempfile.TemporaryDirectory() as tmp:
+            for path, text in dict(site(PAGES, TEMPLATE).files).items():
+                os.makedirs(os.path.join(tmp, os.path.dirname(path)), exist_ok=True)
+                with open(os.path.join(tmp, path), "wb") as f:
+                    f.write(text)
+            # N processes at once, sharing nothing but the sources
+            processes = [
+                subprocess.Popen([sys.executable, main, "--shard", f"{index}/3"], cwd=tmp,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                for index in (1, 2, 3)
+            ]
+            for process in processes:
+                _, stderr = process.communicate(timeout=60)
+                self.assertEqual(process.returncode, 0, stderr.decode())
+            shard_dirs = [f"docs.shard-{index}-of-3" for index in (1, 2, 3)]
+            subprocess.run([sys.executable, main, "--merge-shards", *shard_dirs], cwd=tmp, check=True,
+                           stdout=subprocess.DEVNULL)
+            with open(os.path.join(tmp, "docs", "search", "pages.json")) as f:
+                self.assertEqual(len(json.load(f)["pages"]), len(PAGES))
+            self.assertTrue(os.path.isfile(os.path.join(tmp, "docs", "blog", "two.html")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from markdown_blocks import markdown_to_html_node, block_to_heading, MarkdownParser
+from extensions import HeadingAnchorsExtension
+from toc import Outline, OutlineEntry, SlugRegistry, slugify
+
+
+class TestSlugs(unittest.TestCase):
+    def test_slugify(self):
+        self.assertEqual(slugify("Why Tom *Bombadil* Was a Mistake!"), "why-tom-bombadil-was-a-mistake")
+
+    def test_unique_slugs(self):
+        slugs = SlugRegistry()
+        self.assertEqual(
+            [slugs.unique(text) for text in ["Intro", "Intro", "Intro 1", "Intro"]],
+            ["intro", "intro-1", "intro-1-1", "intro-2"],
+        )
+
+
+class TestOutline(unittest.TestCase):
+    def test_block_to_heading_records(self):
+        outline = Outline()
+        node = block_to_heading("## Hello **World**", outline=outline)
+        self.assertEqual(node.to_html(), '<h2 id="hello-world">Hello <b>World</b></h2>')
+        self.assertEqual(outline.entries, [OutlineEntry(2, "Hello World", "hello-world")])
+
+    def test_outline_from_document(self):
+        outline = Outline()
+        md = "# Title\n\n## Setup\n\n- item\n\n  ### Nested heading\n\n## Setup"
+        markdown_to_html_node(md, outline=outline)
+        self.assertEqual(
+            [(entry.level, entry.slug) for entry in outline.entries],
+            [(1, "title"), (2, "setup"), (3, "nested-heading"), (2, "setup-1")],
+        )
+
+    def test_no_outline_no_ids(self):
+        self.assertEqual(markdown_to_html_node("## Plain").to_html(), "<div><h2>Plain</h2></div>")
+
+    def test_anchors_share_outline_slugs(self):
+        parser = MarkdownParser([HeadingAnchorsExtension()])
+        outline = Outline()
+        html = parser.parse("## A\n\n## A", outline).to_html()
+        self.assertEqual(html, '<div><h2 id="a">A</h2><h2 id="a-1">A</h2></div>')
+
+    def test_toc_html(self):
+        outline = Outline()
+        markdown_to_html_node("# T\n\n## One\n\n### Sub\n\n## Two", outline=outline)
+        self.assertEqual(
+            outline.to_html(),
+            '<ul><li><a href="#one">One</a><ul><li><a href="#sub">Sub</a></li></ul></li>'
+            '<li><a href="#two">Two</a></li></ul>',
+        )
+
+    def test_empty_toc(self):
+        outline = Outline()
+        markdown_to_html_node("# Only a title", outline=outline)
+        self.assertEqual(outline.to_html(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional
+from typing import Callable, Dict, Optional
 
 from htmlnode import LeafNode
 
@@ -45,26 +45,34 @@ class TextNode:
     def __repr__(self) -> str:
         return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
 
-def text_node_to_html_node(text_node: TextNode) -> LeafNode:
+def _render_image(text_node: TextNode) -> LeafNode:
+    # Architectural Note: Images are "void" elements (no closing tag usually),
+    # but our LeafNode implementation expects a value. We pass an empty string
+    # to satisfy the "value required" contract of LeafNode.
+    return LeafNode("img", "", {"src": text_node.url, "alt": text_node.text})
+
+
+# Dispatch table: one dictionary lookup per span, however many
+# extensions a parser adds on top of a copy of this table.
+TEXT_NODE_RENDERERS: Dict[Enum, Callable[[TextNode], LeafNode]] = {
+    TextType.TEXT: lambda node: LeafNode(None, node.text),
+    TextType.BOLD: lambda node: LeafNode("b", node.text),
+    TextType.ITALIC: lambda node: LeafNode("i", node.text),
+    TextType.CODE: lambda node: LeafNode("code", node.text),
+    TextType.LINK: lambda node: LeafNode("a", node.text, {"href": node.url}),
+    TextType.IMAGE: _render_image,
+}
+
+
+def text_node_to_html_node(
+    text_node: TextNode,
+    renderers: Optional[Dict[Enum, Callable[[TextNode], LeafNode]]] = None
+) -> LeafNode:
     """
     Converts a TextNode into a LeafNode.
+    Parsers with extensions pass their own renderer table.
     """
-    match text_node.text_type:
-        case TextType.TEXT:
-            return LeafNode(None, text_node.text)
-        case TextType.BOLD:
-            return LeafNode("b", text_node.text)
-        case TextType.ITALIC:
-            return LeafNode("i", text_node.text)
-        case TextType.CODE:
-            return LeafNode("code", text_node.text)
-        case TextType.LINK:
-            return LeafNode("a", text_node.text, {"href": text_node.url})
-        case TextType.IMAGE:
-            # Architectural Note: Images are "void" elements (no closing tag usually),
-            # but our LeafNode implementation expects a value. We pass an empty string
-            # to satisfy the "value required" contract of LeafNode.
-            return LeafNode("img", "", {"src": text_node.url, "alt": text_node.text})
-        case _:
-            raise Exception(f"Invalid text type: {text_node.text_type}")
-
+    render = (renderers if renderers is not None else TEXT_NODE_RENDERERS).get(text_node.text_type)
+    if render is None:
+        raise Exception(f"Invalid text type: {text_node.text_type}")
+    return render(text_node)
@@ -0,0 +1,139 @@
+import re
+from typing import Dict, List, Optional
+
+from htmlnode import HTMLNode, LeafNode, ParentNode
+
+
+def node_text(node: HTMLNode) -> str:
+    """
+    The plain text of a node and all of its descendants.
+    """
+    if node.children is None:
+        return node.value or ""
+    return "".join(node_text(child) for child in node.children)
+
+
+_SLUG_DROP = re.compile(r"[^\w\- ]")
+
+
+def slugify(text: str) -> str:
+    """
+    Turns heading text into an anchor id, GitHub style:
+    lowercase, punctuation dropped, spaces become dashes.
+    """
+    slug = _SLUG_DROP.sub("", text.strip().lower()).replace(" ", "-")
+    return slug or "section"
+
+
+class SlugRegistry:
+    """
+    Hands out unique slugs within one page ("intro", "intro-1", ...).
+    Each base slug remembers its next suffix, so deduplicating n headings
+    is linear in n rather than rescanning earlier headings.
+    """
+
+    def __init__(self) -> None:
+        self.next_suffix: Dict[str, int] = {}
+
+    def unique(self, text: str) -> str:
+        base = slugify(text)
+        suffix = self.next_suffix.get(base)
+        if suffix is None:
+            self.next_suffix[base] = 1
+            return base
+        # Skip suffixes that some other heading already took as its base slug
+        candidate = f"{base}-{suffix}"
+        while candidate in self.next_suffix:
+            suffix += 1
+            candidate = f"{base}-{suffix}"
+        self.next_suffix[base] = suffix + 1
+        self.next_suffix[candidate] = 1
+        return candidate
+
+
+class OutlineEntry:
+    """
+    One heading of a page: its level (1-6), plain text and anchor slug.
+    """
+
+    def __init__(self, level: int, text: str, slug: str) -> None:
+        self.level = level
+        self.text = text
+        self.slug = slug
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, OutlineEntry):
+            return False
+        return (self.level, self.text, self.slug) == (other.level, other.text, other.slug)
+
+    def __repr__(self) -> str:
+        return f"OutlineEntry({self.level}, {self.text}, {self.slug})"
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"level": self.level, "text": self.text, "slug": self.slug}
+
+
+class Outline:
+    """
+    The per-page outline, filled in by block_to_heading while the tree is built,
+    so a table of contents never needs a second walk over the page.
+    """
+
+    def __init__(self) -> None:
+        self.entries: List[OutlineEntry] = []
+        self.slugs = SlugRegistry()
+
+    def add(self, level: int, text: str) -> str:
+        """
+        Records a heading and returns its unique slug.
+        """
+        slug = self.slugs.unique(text)
+        self.entries.append(OutlineEntry(level, text, slug))
+        return slug
+
+    def to_list(self) -> List[Dict[str, object]]:
+        return [entry.to_dict() for entry in self.entries]
+
+    @classmethod
+    def from_list(cls, entries: List[Dict[str, object]]) -> "Outline":
+        """
+        An outline recorded earlier (see to_list), e.g. from a cache.
+        """
+        outline = cls()
+        outline.entries = [OutlineEntry(entry["level"], entry["text"], entry["slug"]) for entry in entries]
+        return outline
+
+    def to_html_node(self, min_level: int = 2, max_level: int = 6) -> Optional[ParentNode]:
+        """
+        Renders the outline as nested <ul> lists of anchor links.
+        The page title (h1) is left out by default.
+        Returns None when there are no headings in range.
+        """
+        root = ParentNode("ul", [])
+        # Stack of [level, list node, last item in that list];
+        # a deeper heading opens a nested list inside the last item
+        stack: List[list] = [[min_level, root, None]]
+
+        for entry in self.entries:
+            if entry.level < min_level or entry.level > max_level:
+                continue
+            while len(stack) > 1 and entry.level < stack[-1][0]:
+                stack.pop()
+            top = stack[-1]
+            if entry.level > top[0] and top[2] is not None:
+                nested = ParentNode("ul", [])
+                top[2].children.append(nested)
+                top = [entry.level, nested, None]
+                stack.append(top)
+            link = LeafNode("a", entry.text, {"href": f"#{entry.slug}"})
+            item = ParentNode("li", [link])
+            top[1].children.append(item)
+            top[2] = item
+
+        if not root.children:
+            return None
+        return root
+
+    def to_html(self, min_level: int = 2, max_level: int = 6) -> str:
+        node = self.to_html_node(min_level, max_level)
+        return node.to_html() if node is not None else ""
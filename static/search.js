@@ -0,0 +1,87 @@
+// Client for the search index written by src/search_index.py.
+//
+// Usage:
+//   const search = new SiteSearch("/");          // the site's base path
+//   const results = await search.query("tom bombadil");
+//   // -> [{ url, title, score }, ...] best match first
+//
+// Only pages.json and the shards of the queried terms are downloaded,
+// and every file is fetched at most once per page load.
+class SiteSearch {
+  constructor(basepath = "/") {
+    this.root = basepath.replace(/\/?$/, "/") + "search/";
+    this.pages = null;
+    this.shards = new Map();
+  }
+
+  static tokenize(text) {
+    // Same rule as tokenize() in search_index.py: runs of letters/digits, 2+ chars
+    return (text.toLowerCase().match(/[\p{L}\p{N}]+/gu) || []).filter((t) => t.length > 1);
+  }
+
+  shardKey(term) {
+    // Same rule as shard_key() in search_index.py
+    let key = "";
+    for (const c of Array.from(term).slice(0, this.prefixLength)) {
+      key += /[a-z0-9]/.test(c) ? c : "_" + c.codePointAt(0).toString(16);
+    }
+    return key;
+  }
+
+  async loadPages() {
+    if (this.pages === null) {
+      const response = await fetch(this.root + "pages.json");
+      const data = await response.json();
+      this.prefixLength = data.prefix_length;
+      this.pages = new Map(data.pages.map(([id, url, title]) => [id, { url, title }]));
+    }
+    return this.pages;
+  }
+
+  loadShard(key) {
+    if (!this.shards.has(key)) {
+      const request = fetch(this.root + "shards/" + key + ".json")
+        .then((response) => (response.ok ? response.json() : {}))
+        .catch(() => ({}));
+      this.shards.set(key, request);
+    }
+    return this.shards.get(key);
+  }
+
+  // Pages containing every term of the query, scored by how often
+  // the terms occur (positions are delta-encoded, so their count is enough).
+  async query(text) {
+    const pages = await this.loadPages();
+    const terms = [...new Set(SiteSearch.tokenize(text))];
+    if (terms.length === 0) {
+      return [];
+    }
+    const shards = await Promise.all(terms.map((term) => this.loadShard(this.shardKey(term))));
+
+    let scores = null;
+    terms.forEach((term, i) => {
+      const postings = shards[i][term] || [];
+      const termScores = new Map(postings.map(([id, positions]) => [id, positions.length]));
+      if (scores === null) {
+        scores = termScores;
+      } else {
+        for (const id of [...scores.keys()]) {
+          if (termScores.has(id)) {
+            scores.set(id, scores.get(id) + termScores.get(id));
+          } else {
+            scores.delete(id);
+          }
+        }
+      }
+    });
+
+    return [...scores.entries()]
+      .filter(([id]) => pages.has(id))
+      .map(([id, score]) => ({ ...pages.get(id), score }))
+      .sort((a, b) => b.score - a.score);
+  }
+}
+
+if (typeof module !== "undefined") {
+  module.exports = { SiteSearch };
+}